@@ -0,0 +1,239 @@
+"""
+ActorUnificado.py
+Runtime de actores: un solo proceso suscrito a un conjunto configurable de
+tópicos que despacha cada mensaje al manejador de su operación (ver
+Manejadores.py). Todos los manejadores comparten un contexto ZMQ, un SUB,
+un ClienteGA, un pool de trabajadores y unas mismas métricas, así que la
+capacidad se reparte sola entre préstamos, devoluciones y renovaciones.
+La cola del pool atiende antes las operaciones con más peso (la misma tabla
+PRIORIDADES_POR_DEFECTO que usa el Gestor de Carga) y envejece las demás para que ninguna se quede sin servicio. Las peticiones
+cuyo deadline (fijado por el PS) ya pasó se descartan antes de ir al GA.
+
+Uso: python ActorUnificado.py [sede] [--topicos prestamo,devolucion] [--procesos]
+Sin --topicos atiende las tres operaciones.
+"""
+
+import zmq
+import json
+import logging
+import time
+import sys
+import threading
+from Clases import decodificar_mensaje
+from ControlTrafico import PRIORIDADES_POR_DEFECTO
+from Histograma import Histograma
+from ClienteGA import ClienteGA
+from Manejadores import MANEJADORES
+from PoolTrabajadores import PoolAutoescalable
+from PoolProcesos import PoolProcesos
+
+GC_PUBLICACIONES = "tcp://10.43.102.40:5556"
+# Canal de resultados hacia el GC (préstamos síncronos)
+GC_RESULTADOS = "tcp://10.43.102.40:5561"
+
+GESTORES = [
+    {"ip": "localhost", "puerto": 5557, "nombre": "GA-SedeA", "sede": "SedeA"},
+    {"ip": "localhost", "puerto": 5559, "nombre": "GA-SedeB", "sede": "SedeB"}
+]
+
+INTERVALO_METRICAS = 10  # segundos
+# Peso de cada operación en la cola del pool: los préstamos interactivos
+# adelantan a las renovaciones masivas
+PRIORIDADES = PRIORIDADES_POR_DEFECTO
+ALFA = 0.2  # peso de la última muestra en la EWMA de servicio
+
+
+class RuntimeActores:
+    def __init__(self, operaciones, sede_local=None, modo_procesos=False, manejadores=MANEJADORES):
+        desconocidas = [op for op in operaciones if op not in manejadores]
+        if desconocidas:
+            raise ValueError(f"Operaciones sin manejador: {desconocidas}")
+
+        self.operaciones = operaciones
+        self.sede_local = sede_local
+        self.modo_procesos = modo_procesos
+        self.manejadores = manejadores
+        self.nombre = "-".join(operaciones)
+
+        self.context = zmq.Context()
+        self.sub_socket = self.context.socket(zmq.SUB)
+        self.sub_socket.connect(GC_PUBLICACIONES)
+        # Sede local opcional (p. ej. SedeB): solo se atienden sus operaciones
+        for op in operaciones:
+            topico = f"{op}.{sede_local}" if sede_local else op
+            self.sub_socket.setsockopt_string(zmq.SUBSCRIBE, topico)
+            logging.info(f"Suscrito al tópico '{topico}'")
+
+        # Una conexión DEALER por GA compartida por todos los manejadores
+        # (en modo procesos cada proceso abre la suya en preparar_proceso)
+        self.cliente_ga = None if modo_procesos else ClienteGA(self.context, GESTORES)
+        self._locales = threading.local()
+
+        self._metricas_lock = threading.Lock()
+        self.metricas = {op: {'recibidas': 0, 'exitos': 0, 'fallos': 0, 'vencidas': 0, 'servicio_ms': 0.0}
+                         for op in operaciones}
+        # Distribución del tiempo de servicio (la EWMA solo da la tendencia)
+        self.histogramas = {op: Histograma() for op in operaciones}
+
+        if modo_procesos:
+            self.pool = PoolProcesos(self.nombre, self.procesar_mensaje, preparar=self.preparar_proceso,
+                                     prioridades=PRIORIDADES)
+        else:
+            self.pool = PoolAutoescalable(self.nombre, self.procesar_mensaje,
+                                          latencia_ga=self.cliente_ga.latencia_ms, prioridades=PRIORIDADES)
+
+    def indice_gestor(self, sede, por_defecto=0):
+        """Índice del GA dueño de la sede"""
+        for i, ga in enumerate(GESTORES):
+            if ga["sede"] == sede:
+                return i
+        return por_defecto
+
+    def preparar_proceso(self):
+        """Recrea en el proceso hijo el contexto ZMQ, las conexiones al GA y las métricas"""
+        self.context = zmq.Context()
+        self.cliente_ga = ClienteGA(self.context, GESTORES)
+        self._locales = threading.local()
+        threading.Thread(target=self._registrar_metricas, daemon=True).start()
+        return self.cliente_ga.latencia_ms
+
+    def reportar_resultado(self, peticion, exito, mensaje):
+        """Reporta al GC el resultado si la operación es síncrona"""
+        if not peticion.get('correlation_id'):
+            return
+        # Los sockets ZMQ no son thread-safe: un PUSH de resultados por trabajador
+        if not hasattr(self._locales, 'socket_resultados'):
+            self._locales.socket_resultados = self.context.socket(zmq.PUSH)
+            self._locales.socket_resultados.connect(GC_RESULTADOS)
+        self._locales.socket_resultados.send_string(json.dumps({
+            "correlation_id": peticion['correlation_id'],
+            "exito": exito,
+            "mensaje": mensaje
+        }))
+
+    def procesar_mensaje(self, mensaje, id_trabajador):
+        """Punto de entrada de los trabajadores (hilos o procesos): b'<tópico> <carga>'"""
+        parts = mensaje.split(b" ", 1)
+        if len(parts) < 2:
+            logging.warning(f"[T-{id_trabajador}] ⚠ Mensaje malformado (sin carga)")
+            return
+
+        topico, cuerpo = parts
+        topico = topico.decode("utf-8")
+        operacion = topico.split(".", 1)[0]
+        manejador = self.manejadores.get(operacion)
+        if manejador is None:
+            logging.warning(f"[T-{id_trabajador}] ⚠ Sin manejador para '{topico}'")
+            return
+
+        # El GC publica en JSON o en el codec binario de Clases.py
+        data = decodificar_mensaje(cuerpo, objetos=True)
+        peticion = {
+            'operacion': operacion,
+            'libro_usuario': data["libro_usuario"],
+            'correlation_id': data.get("correlation_id"),
+            'sede': data.get("sede"),
+            'deadline': data.get("deadline")
+        }
+
+        if self.vencida(peticion):
+            self.descartar_vencida(peticion, id_trabajador)
+            return
+
+        inicio = time.time()
+        exito = False
+        try:
+            exito = manejador(self, peticion, id_trabajador)
+        finally:
+            ms = (time.time() - inicio) * 1000
+            with self._metricas_lock:
+                m = self.metricas[operacion]
+                m['recibidas'] += 1
+                m['exitos' if exito else 'fallos'] += 1
+                m['servicio_ms'] = (1 - ALFA) * m['servicio_ms'] + ALFA * ms
+                self.histogramas[operacion].registrar(ms / 1000)
+
+    def vencida(self, peticion):
+        """True si pasó el deadline del PS (las peticiones sin deadline no vencen)"""
+        return peticion.get('deadline') is not None and time.time() > peticion['deadline']
+
+    def descartar_vencida(self, peticion, id_trabajador):
+        """Cuenta y descarta una petición que el PS ya dejó de esperar"""
+        with self._metricas_lock:
+            self.metricas[peticion['operacion']]['vencidas'] += 1
+        logging.warning(f"[T-{id_trabajador}] ⌛ {peticion['operacion']} vencido descartado: "
+                        f"{peticion['libro_usuario'].codigo}")
+        self.reportar_resultado(peticion, False, "Petición vencida")
+
+    def resumen(self):
+        with self._metricas_lock:
+            operaciones = {op: dict(m, servicio_ms=round(m['servicio_ms'], 2),
+                                    servicio_p99_ms=round(self.histogramas[op].percentil(99) * 1000, 2))
+                           for op, m in self.metricas.items()}
+        resumen = {'operaciones': operaciones, 'pool': self.pool.resumen()}
+        if self.cliente_ga is not None:
+            resumen['coalescencia_ga'] = dict(self.cliente_ga.metricas_coalescencia)
+        return resumen
+
+    def _registrar_metricas(self):
+        while True:
+            time.sleep(INTERVALO_METRICAS)
+            logging.info(f"📊 {self.resumen()}")
+
+    def receptor_mensajes(self):
+        """Reenvía los mensajes crudos al pool; la decodificación la hacen los trabajadores"""
+        logging.info("Receptor iniciado")
+        while True:
+            try:
+                mensaje = self.sub_socket.recv()
+                # La clase de prioridad es la operación del tópico ('prestamo.SedeA')
+                self.pool.enviar(mensaje, mensaje.split(b" ", 1)[0].split(b".", 1)[0].decode("utf-8"))
+            except Exception as e:
+                logging.error(f"Error receptor: {e}")
+                time.sleep(0.5)
+
+    def ejecutar(self):
+        logging.info("=" * 60)
+        if self.modo_procesos:
+            logging.info(f"Runtime de actores [{self.nombre}] MULTIPROCESO - {self.pool.num_procesos} procesos")
+            # Los procesos se crean con fork: antes que el hilo receptor
+            self.pool.iniciar(self.context)
+        else:
+            logging.info(f"Runtime de actores [{self.nombre}] MULTIHILO - "
+                         f"pool de {self.pool.min_hilos} a {self.pool.max_hilos} hilos")
+            self.pool.iniciar()
+            threading.Thread(target=self._registrar_metricas, daemon=True).start()
+        logging.info("=" * 60)
+
+        threading.Thread(target=self.receptor_mensajes, daemon=True).start()
+
+        try:
+            while True:
+                time.sleep(INTERVALO_METRICAS)
+                if self.modo_procesos:
+                    logging.info(f"📊 Pool: {self.pool.resumen()}")
+        except KeyboardInterrupt:
+            logging.info("Deteniendo...")
+
+
+def argumentos_actor(argv):
+    """(sede, modo_procesos, operaciones) a partir de [sede] [--topicos a,b] [--procesos]"""
+    operaciones = None
+    posicionales = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--topicos" and i + 1 < len(argv):
+            operaciones = [op for op in argv[i + 1].split(",") if op]
+            i += 2
+            continue
+        if not argv[i].startswith("--"):
+            posicionales.append(argv[i])
+        i += 1
+    sede = posicionales[0] if posicionales else None
+    return sede, "--procesos" in argv, operaciones
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] Actor_Unificado: %(message)s")
+    sede, modo_procesos, operaciones = argumentos_actor(sys.argv[1:])
+    RuntimeActores(operaciones or list(MANEJADORES), sede, modo_procesos).ejecutar()
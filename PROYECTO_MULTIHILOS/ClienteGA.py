@@ -0,0 +1,250 @@
+"""
+ClienteGA.py
+Cliente compartido hacia los Gestores de Almacenamiento para los actores
+multihilo. Mantiene UN socket DEALER por GA para todos los trabajadores:
+cada petición lleva un id propio y la respuesta se entrega al hilo que la
+pidió a través de un Future, así que puede haber muchas peticiones en
+vuelo por conexión en vez del lockstep estricto de REQ/REP.
+
+Las lecturas idénticas concurrentes (mismo GA, operación y código) se
+coalescen: comparten una sola petición en vuelo y todas reciben su
+respuesta, así un título popular genera una consulta por ida y vuelta.
+
+Sobre que viaja (compatible con los GA ROUTER/REP sin cambios):
+    DEALER -> GA : [request_id, b"", petición]
+    GA -> DEALER : [request_id, b"", json]
+
+La petición va en JSON hasta que el GA responde a la operación "codecs"
+anunciando el codec binario de Clases.py; un GA que no la entiende sigue
+recibiendo JSON.
+"""
+
+import zmq
+import logging
+import itertools
+import threading
+import time
+import json
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from Clases import LibroUsuario, codificar_mensaje, mensaje_json
+
+TIMEOUT_POR_DEFECTO = 5.0  # segundos
+ALFA_LATENCIA = 0.1  # peso de la última muestra en la EWMA de latencia
+# Operaciones de solo lectura que se pueden compartir entre peticiones
+OPERACIONES_LECTURA = {"verificar_disponibilidad"}
+
+
+class ClienteGA:
+    def __init__(self, context, gestores, timeout=TIMEOUT_POR_DEFECTO):
+        self.context = context
+        self.gestores = gestores
+        self.timeout = timeout
+        self.endpoint = f"inproc://cliente-ga-{id(self)}"
+
+        self._ids = itertools.count(1)
+        self._pendientes = {}  # request_id -> (Future, vencimiento, instante de envío)
+        self._latencia_ewma = None
+        self._pendientes_lock = threading.Lock()
+        self._lecturas_en_curso = {}  # (indice GA, operación, código) -> Future
+        self._lecturas_lock = threading.Lock()
+        self.metricas_coalescencia = {'lecturas': 0, 'compartidas': 0}
+        self._codecs = [None] * len(gestores)  # "json"/"binario"; None = sin negociar
+        self._negociando = set()
+        self._codecs_lock = threading.Lock()
+        self._local = threading.local()
+
+        # Los sockets DEALER solo los usa el hilo de E/S (ZMQ no es thread-safe);
+        # los trabajadores le pasan las peticiones por inproc.
+        self._entrada = context.socket(zmq.PULL)
+        self._entrada.bind(self.endpoint)
+
+        self._dealers = []
+        for ga in gestores:
+            sock = context.socket(zmq.DEALER)
+            sock.setsockopt(zmq.LINGER, 0)
+            # Sin GA conectado el envío falla en vez de encolar peticiones viejas
+            sock.setsockopt(zmq.IMMEDIATE, 1)
+            sock.connect(f"tcp://{ga['ip']}:{ga['puerto']}")
+            self._dealers.append(sock)
+            logging.info(f"ClienteGA: DEALER compartido hacia {ga['nombre']} en tcp://{ga['ip']}:{ga['puerto']}")
+
+        threading.Thread(target=self._bucle_es, daemon=True).start()
+
+    def _socket_hilo(self):
+        """Socket PUSH propio del hilo que llama, para hablar con el hilo de E/S"""
+        sock = getattr(self._local, "push", None)
+        if sock is None:
+            sock = self.context.socket(zmq.PUSH)
+            sock.connect(self.endpoint)
+            self._local.push = sock
+        return sock
+
+    def enviar(self, indice_ga, mensaje, timeout=None):
+        """Envía sin bloquear; devuelve un Future con la respuesta (str)"""
+        if isinstance(mensaje, dict) and mensaje.get("operacion") in OPERACIONES_LECTURA:
+            return self._enviar_lectura(indice_ga, mensaje, timeout)
+        return self._enviar(indice_ga, mensaje, timeout)
+
+    def _enviar_lectura(self, indice_ga, mensaje, timeout):
+        """Single-flight: si ya hay una lectura igual en vuelo se comparte su Future"""
+        libro = mensaje.get("libro_usuario")
+        codigo = libro.codigo if isinstance(libro, LibroUsuario) else (libro or {}).get("codigo")
+        clave = (indice_ga, mensaje["operacion"], codigo)
+        with self._lecturas_lock:
+            self.metricas_coalescencia['lecturas'] += 1
+            futuro = self._lecturas_en_curso.get(clave)
+            if futuro is not None:
+                self.metricas_coalescencia['compartidas'] += 1
+                return futuro
+
+            # La respuesta la comparten peticiones con deadlines distintos:
+            # el GA no debe descartarla por el deadline de la primera
+            compartido = {k: v for k, v in mensaje.items() if k != "deadline"}
+            futuro = self._enviar(indice_ga, compartido, timeout)
+            self._lecturas_en_curso[clave] = futuro
+
+        futuro.add_done_callback(lambda f: self._fin_lectura(clave, f))
+        return futuro
+
+    def _fin_lectura(self, clave, futuro):
+        with self._lecturas_lock:
+            if self._lecturas_en_curso.get(clave) is futuro:
+                del self._lecturas_en_curso[clave]
+
+    def _enviar(self, indice_ga, mensaje, timeout=None):
+        request_id = str(next(self._ids)).encode()
+        futuro = Future()
+        vencimiento = time.time() + (timeout or self.timeout)
+
+        with self._pendientes_lock:
+            self._pendientes[request_id] = (futuro, vencimiento, time.time())
+
+        if isinstance(mensaje, str):
+            cuerpo = mensaje.encode("utf-8")
+        elif self._codecs[indice_ga] == "binario":
+            cuerpo = codificar_mensaje(mensaje)
+        else:
+            cuerpo = mensaje_json(mensaje).encode("utf-8")
+            if self._codecs[indice_ga] is None:
+                self._negociar_codec(indice_ga)
+        self._socket_hilo().send_multipart([str(indice_ga).encode(), request_id, cuerpo])
+        return futuro
+
+    def _negociar_codec(self, indice_ga):
+        """Pregunta (una vez en vuelo) al GA qué formatos entiende; mientras tanto, JSON"""
+        with self._codecs_lock:
+            if indice_ga in self._negociando:
+                return
+            self._negociando.add(indice_ga)
+        futuro = self._enviar(indice_ga, json.dumps({"operacion": "codecs"}))
+        futuro.add_done_callback(lambda f: self._fijar_codec(indice_ga, f.result()))
+
+    def _fijar_codec(self, indice_ga, respuesta):
+        with self._codecs_lock:
+            self._negociando.discard(indice_ga)
+            if respuesta is None:
+                return  # GA sin respuesta: se vuelve a preguntar en el próximo envío
+            try:
+                codecs = json.loads(respuesta).get("codecs", [])
+            except (ValueError, AttributeError):
+                codecs = []
+            self._codecs[indice_ga] = "binario" if "binario" in codecs else "json"
+        logging.info(f"ClienteGA: {self.gestores[indice_ga]['nombre']} usa {self._codecs[indice_ga]}")
+
+    def solicitar(self, indice_ga, mensaje, timeout=None):
+        """Envía y espera la respuesta; devuelve None si vence el timeout"""
+        timeout = timeout or self.timeout
+        try:
+            return self.enviar(indice_ga, mensaje, timeout).result(timeout)
+        except FutureTimeout:
+            return None
+
+    def solicitar_con_failover(self, mensaje, indice_inicial=0, timeout=None):
+        """
+        Prueba los GA empezando por indice_inicial.
+        Devuelve (respuesta, indice_ga) o (None, indice_inicial) si todos fallan.
+        """
+        for i in range(len(self.gestores)):
+            indice = (indice_inicial + i) % len(self.gestores)
+            respuesta = self.solicitar(indice, mensaje, timeout)
+            if respuesta is not None:
+                return respuesta, indice
+            logging.warning(f"ClienteGA: {self.gestores[indice]['nombre']} no responde, cambiando a failover")
+        return None, indice_inicial
+
+    def latencia_ms(self):
+        """EWMA de la latencia de las respuestas de los GA (None sin muestras)"""
+        return self._latencia_ewma
+
+    def en_vuelo(self):
+        with self._pendientes_lock:
+            return len(self._pendientes)
+
+    def _bucle_es(self):
+        """Hilo de E/S: envía lo que llega por inproc y resuelve los Futures"""
+        ultima_expiracion = time.time()
+        poller = zmq.Poller()
+        poller.register(self._entrada, zmq.POLLIN)
+        for sock in self._dealers:
+            poller.register(sock, zmq.POLLIN)
+
+        while True:
+            try:
+                socks = dict(poller.poll(100))
+
+                if self._entrada in socks:
+                    self._despachar_salientes()
+
+                for sock in self._dealers:
+                    if sock in socks:
+                        self._recibir_respuestas(sock)
+
+                if time.time() - ultima_expiracion > 0.1:
+                    self._expirar()
+                    ultima_expiracion = time.time()
+            except Exception as e:
+                logging.error(f"ClienteGA: error en hilo de E/S: {e}")
+
+    def _despachar_salientes(self):
+        while True:
+            try:
+                indice, request_id, cuerpo = self._entrada.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            try:
+                self._dealers[int(indice)].send_multipart([request_id, b"", cuerpo], zmq.NOBLOCK)
+            except zmq.Again:
+                # GA desconectado: fallar ya para que el trabajador haga failover
+                self._resolver(request_id, None)
+
+    def _recibir_respuestas(self, sock):
+        while True:
+            try:
+                partes = sock.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            self._resolver(partes[0], partes[-1].decode("utf-8"))
+
+    def _resolver(self, request_id, respuesta):
+        with self._pendientes_lock:
+            pendiente = self._pendientes.pop(request_id, None)
+        if pendiente is None:
+            return
+        if respuesta is not None:
+            ms = (time.time() - pendiente[2]) * 1000
+            if self._latencia_ewma is None:
+                self._latencia_ewma = ms
+            else:
+                self._latencia_ewma = (1 - ALFA_LATENCIA) * self._latencia_ewma + ALFA_LATENCIA * ms
+        if not pendiente[0].done():
+            pendiente[0].set_result(respuesta)
+
+    def _expirar(self):
+        """Descarta peticiones vencidas; una respuesta tardía se ignora"""
+        ahora = time.time()
+        with self._pendientes_lock:
+            vencidos = [rid for rid, (_, venc, _) in self._pendientes.items() if venc < ahora]
+            for rid in vencidos:
+                futuro = self._pendientes.pop(rid)[0]
+                if not futuro.done():
+                    futuro.set_result(None)
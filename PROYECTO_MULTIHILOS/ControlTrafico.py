@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+ControlTrafico.py
+Limitación de tasa por cliente (token bucket), cola justa ponderada (WFQ)
+entre clientes y prioridad por tipo de operación (dentro de cada cliente y
+entre clientes) para el Gestor de Carga. Los límites se leen de un archivo
+JSON que se recarga en caliente cuando cambia, por ejemplo:
+
+{
+    "por_defecto": {"tasa": 100000, "rafaga": 100000, "peso": 1, "max_cola": 100000},
+    "clientes": {
+        "ps-masivo": {"tasa": 10, "rafaga": 20, "peso": 1, "max_cola": 1000},
+        "ps-interactivo": {"tasa": 100, "rafaga": 200, "peso": 4, "max_cola": 1000}
+    },
+    "prioridades": {"prestamo": 4, "devolucion": 2, "renovacion": 1},
+    "envejecimiento": 2.0
+}
+
+La misma ColaPrioridad, envuelta en ColaPrioridadBloqueante, es la cola de
+los pools de trabajadores del actor multihilo (PoolTrabajadores.py).
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from Histograma import Histograma
+
+# Sin límite práctico: un PS sin id_cliente (los experimentos) no se frena;
+# solo los clientes con nombre en el archivo tienen límites propios
+LIMITES_POR_DEFECTO = {"tasa": 100000, "rafaga": 100000, "peso": 1, "max_cola": 100000}
+# Peso de cada operación; las que no aparecen valen 1
+PRIORIDADES_POR_DEFECTO = {"prestamo": 4, "devolucion": 2, "renovacion": 1}
+# Puntos de prioridad que gana una petición por cada segundo en cola
+ENVEJECIMIENTO_POR_DEFECTO = 2.0
+
+
+class CubetaTokens:
+    """Token bucket: 'tasa' tokens por segundo con capacidad 'rafaga'"""
+
+    def __init__(self, tasa, rafaga):
+        self.tasa = float(tasa)
+        self.rafaga = float(rafaga)
+        self.tokens = float(rafaga)
+        self.ultima_recarga = time.monotonic()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.rafaga, self.tokens + (ahora - self.ultima_recarga) * self.tasa)
+        self.ultima_recarga = ahora
+
+    def disponible(self):
+        self._recargar()
+        return self.tokens >= 1
+
+    def consumir(self):
+        self._recargar()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def segundos_hasta_token(self):
+        self._recargar()
+        if self.tokens >= 1 or self.tasa <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+    def actualizar(self, tasa, rafaga):
+        """Aplica nuevos límites conservando los tokens acumulados"""
+        self._recargar()
+        self.tasa = float(tasa)
+        self.rafaga = float(rafaga)
+        self.tokens = min(self.tokens, self.rafaga)
+
+
+class MetricasEspera:
+    """Tiempo de espera en cola por clase, acumulado desde el último resumen"""
+
+    def __init__(self):
+        self.clases = {}
+
+    def registrar(self, clase, espera_s):
+        m = self.clases.setdefault(clase, {'atendidas': 0, 'espera_total': 0.0, 'espera_max': 0.0,
+                                           'histograma': Histograma()})
+        m['atendidas'] += 1
+        m['espera_total'] += espera_s
+        m['espera_max'] = max(m['espera_max'], espera_s)
+        m['histograma'].registrar(espera_s)
+
+    def resumen(self, reiniciar=True):
+        resumen = {
+            clase: {
+                'atendidas': m['atendidas'],
+                'espera_media_ms': round(m['espera_total'] / m['atendidas'] * 1000, 2) if m['atendidas'] else 0.0,
+                'espera_p99_ms': round(m['histograma'].percentil(99) * 1000, 2),
+                'espera_max_ms': round(m['espera_max'] * 1000, 2)
+            }
+            for clase, m in self.clases.items()
+        }
+        if reiniciar:
+            self.clases = {}
+        return resumen
+
+
+class ColaPrioridad:
+    """
+    Cola FIFO por clase (operación) que atiende primero la cabeza con mayor
+    peso + envejecimiento × segundos en cola. Los préstamos adelantan a las
+    renovaciones, pero una renovación que espera lo bastante acaba ganando,
+    así que ninguna clase se queda sin servicio.
+    """
+
+    def __init__(self, prioridades=None, envejecimiento=ENVEJECIMIENTO_POR_DEFECTO, metricas=None):
+        self.prioridades = prioridades if prioridades is not None else dict(PRIORIDADES_POR_DEFECTO)
+        self.envejecimiento = envejecimiento
+        self.metricas = metricas
+        self.clases = {}  # clase -> deque de (instante de llegada, item)
+        self.tamano = 0
+
+    def __len__(self):
+        return self.tamano
+
+    def append(self, clase, item):
+        self.clases.setdefault(clase, deque()).append((time.monotonic(), item))
+        self.tamano += 1
+
+    def cabeza(self, ahora=None):
+        """(clase, prioridad con envejecimiento) de la petición que saldría ahora"""
+        ahora = time.monotonic() if ahora is None else ahora
+        elegida, mejor = None, None
+        for clase, cola in self.clases.items():
+            if not cola:
+                continue
+            prioridad = self.prioridades.get(clase, 1) + self.envejecimiento * (ahora - cola[0][0])
+            if mejor is None or prioridad > mejor:
+                elegida, mejor = clase, prioridad
+        return elegida, mejor
+
+    def popleft(self, ahora=None):
+        return self.extraer(ahora)[1]
+
+    def extraer(self, ahora=None):
+        """Como popleft, pero devuelve (instante de llegada, item)"""
+        if not self.tamano:
+            raise IndexError("cola vacía")
+        ahora = time.monotonic() if ahora is None else ahora
+        elegida, _ = self.cabeza(ahora)  # la clase puede ser None (sin operación)
+        llegada, item = self.clases[elegida].popleft()
+        self.tamano -= 1
+        if self.metricas is not None:
+            self.metricas.registrar(elegida, ahora - llegada)
+        return llegada, item
+
+
+class ColaPrioridadBloqueante:
+    """ColaPrioridad thread-safe con get() bloqueante, para pools de hilos"""
+
+    def __init__(self, prioridades=None, envejecimiento=ENVEJECIMIENTO_POR_DEFECTO):
+        self.metricas = MetricasEspera()
+        self._cola = ColaPrioridad(prioridades, envejecimiento, self.metricas)
+        self._condicion = threading.Condition()
+
+    def put(self, item, clase=None):
+        with self._condicion:
+            self._cola.append(clase, item)
+            self._condicion.notify()
+
+    def get(self, timeout=None):
+        """Devuelve (instante de llegada en time.monotonic, item); queue.Empty si vence el timeout"""
+        with self._condicion:
+            if not self._condicion.wait_for(lambda: len(self._cola) > 0, timeout):
+                raise queue.Empty
+            return self._cola.extraer()
+
+    def qsize(self):
+        return len(self._cola)
+
+    def esperas_por_clase(self, reiniciar=True):
+        """Espera media, p99 y máxima (ms) por clase desde el último resumen"""
+        with self._condicion:
+            return self.metricas.resumen(reiniciar)
+
+
+class PlanificadorJusto:
+    """
+    Cola justa ponderada entre clientes (identidades del ROUTER).
+    Cada cliente tiene su cola FIFO y su cubeta de tokens; se atiende siempre
+    la petición elegible con menor etiqueta de finalización virtual, de modo
+    que un cliente con peso 4 recibe 4 veces más servicio que uno con peso 1.
+    Las etiquetas se reparten en orden de llegada, pero dentro de cada cliente
+    la petición que se atiende la decide su ColaPrioridad por operación.
+
+    La prioridad de clase también cuenta entre clientes: al comparar, lo que
+    a cada cliente le falta para su etiqueta se divide por la prioridad (con
+    envejecimiento) de su próxima petición. Un préstamo de un cliente pasa
+    delante de la renovación de otro con la misma etiqueta, y una renovación
+    que espera lo bastante acaba ganando igual que dentro de un cliente.
+    """
+
+    def __init__(self, archivo_limites=None):
+        self.archivo_limites = archivo_limites
+        self.mtime_limites = None
+        self.config = {"por_defecto": dict(LIMITES_POR_DEFECTO), "clientes": {}}
+        self.clientes = {}  # identidad -> estado del cliente
+        self.tiempo_virtual = 0.0
+        self.rechazadas = 0
+        self.metricas_espera = MetricasEspera()
+        self.recargar_si_cambio()
+
+    def _limites(self, identidad):
+        nombre = identidad.decode("utf-8", "replace") if isinstance(identidad, bytes) else str(identidad)
+        limites = dict(LIMITES_POR_DEFECTO)
+        limites.update(self.config.get("por_defecto", {}))
+        limites.update(self.config.get("clientes", {}).get(nombre, {}))
+        return limites
+
+    def _cliente(self, identidad):
+        cliente = self.clientes.get(identidad)
+        if cliente is None:
+            limites = self._limites(identidad)
+            cliente = {
+                'cola': ColaPrioridad(self._prioridades(), self._envejecimiento(), self.metricas_espera),
+                'etiquetas': deque(),
+                'cubeta': CubetaTokens(limites['tasa'], limites['rafaga']),
+                'peso': float(limites['peso']),
+                'max_cola': int(limites['max_cola']),
+                'ultima_etiqueta': 0.0
+            }
+            self.clientes[identidad] = cliente
+        return cliente
+
+    def _prioridades(self):
+        prioridades = dict(PRIORIDADES_POR_DEFECTO)
+        prioridades.update(self.config.get("prioridades", {}))
+        return prioridades
+
+    def _envejecimiento(self):
+        return float(self.config.get("envejecimiento", ENVEJECIMIENTO_POR_DEFECTO))
+
+    def recargar_si_cambio(self):
+        """Relee el archivo de límites si cambió y actualiza los clientes conocidos"""
+        if not self.archivo_limites or not os.path.exists(self.archivo_limites):
+            return False
+
+        try:
+            mtime = os.path.getmtime(self.archivo_limites)
+            if mtime == self.mtime_limites:
+                return False
+
+            with open(self.archivo_limites, 'r', encoding='utf-8') as f:
+                self.config = json.load(f)
+            self.mtime_limites = mtime
+
+            for identidad, cliente in self.clientes.items():
+                limites = self._limites(identidad)
+                cliente['cubeta'].actualizar(limites['tasa'], limites['rafaga'])
+                cliente['peso'] = float(limites['peso'])
+                cliente['max_cola'] = int(limites['max_cola'])
+                cliente['cola'].prioridades = self._prioridades()
+                cliente['cola'].envejecimiento = self._envejecimiento()
+
+            logging.info("Límites por cliente recargados desde %s", self.archivo_limites)
+            return True
+        except (OSError, ValueError) as e:
+            logging.error("Error recargando límites de %s: %s", self.archivo_limites, e)
+            return False
+
+    def encolar(self, identidad, peticion, clase=None):
+        """Encola la petición del cliente en su clase. Devuelve False si su cola está llena."""
+        cliente = self._cliente(identidad)
+        if len(cliente['cola']) >= cliente['max_cola']:
+            self.rechazadas += 1
+            return False
+
+        # Etiqueta de finalización virtual (WFQ)
+        inicio = max(self.tiempo_virtual, cliente['ultima_etiqueta'])
+        etiqueta = inicio + 1.0 / max(cliente['peso'], 0.001)
+        cliente['ultima_etiqueta'] = etiqueta
+        cliente['etiquetas'].append(etiqueta)
+        cliente['cola'].append(clase, peticion)
+        return True
+
+    def siguiente(self):
+        """
+        Devuelve (identidad, peticion) de la siguiente petición a atender o None
+        si ningún cliente con peticiones tiene tokens disponibles.
+        """
+        ahora = time.monotonic()
+        elegido = None
+        for identidad, cliente in self.clientes.items():
+            if not cliente['cola'] or not cliente['cubeta'].disponible():
+                continue
+            _, prioridad = cliente['cola'].cabeza(ahora)
+            etiqueta = cliente['etiquetas'][0]
+            efectiva = self.tiempo_virtual + (etiqueta - self.tiempo_virtual) / max(prioridad, 0.001)
+            if elegido is None or efectiva < elegido[0]:
+                elegido = (efectiva, identidad)
+
+        if elegido is None:
+            return None
+
+        identidad = elegido[1]
+        cliente = self.clientes[identidad]
+        cliente['cubeta'].consumir()
+        etiqueta = cliente['etiquetas'].popleft()
+        peticion = cliente['cola'].popleft(ahora)
+        self.tiempo_virtual = max(self.tiempo_virtual, etiqueta - 1.0 / max(cliente['peso'], 0.001))
+        return identidad, peticion
+
+    def espera_ms(self, maximo_ms):
+        """Milisegundos hasta que alguna petición encolada tenga token"""
+        esperas = [c['cubeta'].segundos_hasta_token() for c in self.clientes.values() if c['cola']]
+        if not esperas:
+            return maximo_ms
+        return max(1, min(maximo_ms, int(min(esperas) * 1000) + 1))
+
+    def pendientes(self):
+        return sum(len(c['cola']) for c in self.clientes.values())
+
+    def limpiar_inactivos(self):
+        """Olvida clientes sin peticiones y con la cubeta llena (ya no deben nada)"""
+        for identidad in [i for i, c in self.clientes.items()
+                          if not c['cola'] and c['cubeta'].disponible()
+                          and c['cubeta'].tokens >= c['cubeta'].rafaga]:
+            del self.clientes[identidad]
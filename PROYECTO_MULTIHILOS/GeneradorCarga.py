@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+GeneradorCarga.py
+Generador de carga de lazo abierto para el GC. A diferencia de PSM.py (un
+hilo por petición, todos esperando un mismo lock y un solo REQ), las
+peticiones salen según un calendario a la tasa objetivo aunque las
+anteriores no hayan respondido:
+
+- Llegadas "constante" (cada 1/tasa s) o "poisson" (espaciado exponencial).
+- Un pool de conexiones REQ atendido por un solo hilo con zmq.Poller: cada
+  conexión lleva una petición en vuelo, así que hay hasta CONEXIONES a la vez.
+  Si no queda ninguna libre la petición espera en una cola (acotada por
+  MAX_PENDIENTES; lo que no cabe se cuenta como descartado).
+- Rampa de tasas: cada escalón dura --duracion segundos y la rampa se
+  detiene en el primer escalón saturado (se logra menos del 90% de la tasa,
+  hay timeouts o descartes).
+- Dos latencias por petición: la cruda (desde que sale por el socket) y la
+  corregida por omisión coordinada (desde el instante en que el calendario
+  decía que debía salir). Si el sistema se atasca, las peticiones esperan
+  conexión libre y esa espera solo aparece en la corregida, que es la que
+  vería un usuario real llegando a esa tasa.
+
+Las peticiones se toman del mismo formato que peticiones.txt
+(TIPO,ISBN,titulo,autor,sede), repitiéndolas en ciclo. Cada respuesta se
+guarda con las columnas de PSM.py (tiempo_respuesta_ms es la cruda) más la
+corregida y la tasa del escalón (ARCHIVO_TIEMPOS, legible por
+analizar_Resultados.py), el resumen de la rampa en ARCHIVO_RAMPA y los
+histogramas de cada escalón en histograma_carga_<tasa>[_corregido].json.
+
+Uso: python GeneradorCarga.py peticiones.txt [--tasas 20,50,100,200]
+     [--duracion 10] [--llegadas constante|poisson] [--conexiones 64]
+"""
+
+import csv
+import itertools
+import json
+import random
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+import zmq
+
+from Clases import LibroUsuario, codificar_mensaje, respuesta_fallida
+from Histograma import Histograma
+
+GC_ADDRESS = "tcp://localhost:5555"
+
+TASAS = [20, 50, 100, 200, 400]  # peticiones/segundo por escalón
+DURACION_ESCALON = 10  # segundos
+LLEGADAS = "constante"  # "constante" o "poisson"
+CONEXIONES = 64
+MAX_PENDIENTES = 10000  # peticiones que esperan conexión libre
+TIMEOUT_RESPUESTA = 15  # segundos; viaja como "deadline" igual que en PSM.py
+USAR_CODEC_BINARIO = True
+# Un escalón está saturado si logra menos de esta fracción de la tasa objetivo
+UMBRAL_SATURACION = 0.9
+
+ARCHIVO_TIEMPOS = "resultados_carga.csv"
+ARCHIVO_RAMPA = "resultados_rampa.csv"
+
+OPERACIONES = {"PRESTAMO": "prestamo", "DEVOLUCION": "devolucion", "RENOVACION": "renovacion"}
+
+def leer_peticiones(nombre_archivo):
+    """(operacion, codigo, titulo, autor, sede) de cada línea válida"""
+    peticiones = []
+    with open(nombre_archivo, "r", encoding="utf-8") as f:
+        for linea in f:
+            partes = linea.strip().split(",")
+            if len(partes) != 5 or partes[0].upper() not in OPERACIONES:
+                continue
+            tipo, codigo, titulo, autor, sede = partes
+            peticiones.append((OPERACIONES[tipo.upper()], codigo, titulo, autor, sede))
+    return peticiones
+
+
+def instantes_llegada(tasa, duracion, llegadas):
+    """Segundos desde el inicio del escalón en que debe salir cada petición"""
+    t = 0.0
+    while True:
+        t += random.expovariate(tasa) if llegadas == "poisson" else 1.0 / tasa
+        if t >= duracion:
+            return
+        yield t
+
+
+class GeneradorCarga:
+    def __init__(self, peticiones, conexiones=CONEXIONES, llegadas=LLEGADAS):
+        self.peticiones = itertools.cycle(peticiones)
+        self.llegadas = llegadas
+        self.context = zmq.Context()
+        self.poller = zmq.Poller()
+        self.libres = [self._crear_socket() for _ in range(conexiones)]
+        self.en_vuelo = {}  # socket -> (peticion, inicio perf_counter)
+        self.codec = self._negociar_codec()
+
+        self._archivo = open(ARCHIVO_TIEMPOS, "w", newline="", encoding="utf-8")
+        self._escritor = csv.writer(self._archivo)
+        self._escritor.writerow(['timestamp', 'operacion', 'codigo', 'titulo', 'sede',
+                                 'tiempo_respuesta_ms', 'exito', 'tasa_objetivo', 'tiempo_corregido_ms'])
+
+    def _crear_socket(self):
+        sock = self.context.socket(zmq.REQ)
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.connect(GC_ADDRESS)
+        self.poller.register(sock, zmq.POLLIN)
+        return sock
+
+    def _reemplazar_socket(self, sock):
+        """Un REQ sin respuesta no puede volver a enviar: se cierra y se abre otro"""
+        self.poller.unregister(sock)
+        sock.close()
+        return self._crear_socket()
+
+    def _negociar_codec(self):
+        """Igual que PSM.negociar_codec, con una de las conexiones del pool"""
+        if not USAR_CODEC_BINARIO:
+            return "json"
+        sock = self.libres.pop()
+        sock.send_string(json.dumps({"operacion": "codecs"}))
+        codecs = []
+        if sock.poll(TIMEOUT_RESPUESTA * 1000):
+            try:
+                codecs = json.loads(sock.recv_string()).get("codecs", [])
+            except (ValueError, AttributeError):
+                pass
+        else:
+            sock = self._reemplazar_socket(sock)
+        self.libres.append(sock)
+        codec = "binario" if "binario" in codecs else "json"
+        print(f"[Carga] Formato de peticiones: {codec}")
+        return codec
+
+    def _enviar(self, peticion, intencion):
+        """Envía por una conexión libre; 'intencion' es el instante (perf_counter) del calendario"""
+        operacion, codigo, titulo, autor, sede = peticion
+        ahora = time.time()
+        mensaje = {
+            "operacion": operacion,
+            "libro_usuario": LibroUsuario(codigo).to_dict(compacto=True),
+            "sede": sede,
+            "timestamp": ahora,
+            "deadline": ahora + TIMEOUT_RESPUESTA
+        }
+        sock = self.libres.pop()
+        if self.codec == "binario":
+            sock.send(codificar_mensaje(mensaje))
+        else:
+            sock.send_string(json.dumps(mensaje))
+        self.en_vuelo[sock] = (peticion, time.perf_counter(), intencion)
+
+    def _registrar(self, escalon, peticion, segundos, corregidos, exito, tasa):
+        operacion, codigo, titulo, _, sede = peticion
+        self._escritor.writerow([datetime.now().isoformat(), operacion, codigo, titulo, sede,
+                                 f"{segundos * 1000:.2f}", exito, tasa, f"{corregidos * 1000:.2f}"])
+        if exito:
+            escalon['latencias'].registrar(segundos)
+            escalon['latencias_corregidas'].registrar(corregidos)
+            escalon['exitosas'] += 1
+        else:
+            escalon['fallidas'] += 1
+
+    def ejecutar_escalon(self, tasa, duracion):
+        """Envía a 'tasa' peticiones/s durante 'duracion' s y espera las respuestas en vuelo"""
+        escalon = {'enviadas': 0, 'exitosas': 0, 'fallidas': 0, 'descartadas': 0,
+                   'latencias': Histograma(), 'latencias_corregidas': Histograma(), 'max_pendientes': 0}
+        llegadas = instantes_llegada(tasa, duracion, self.llegadas)
+        pendientes = deque()
+        inicio = time.perf_counter()
+        proxima = next(llegadas, None)
+
+        while proxima is not None or pendientes or self.en_vuelo:
+            ahora = time.perf_counter()
+
+            # Las llegadas vencidas entran a la cola aunque no haya conexión libre
+            while proxima is not None and inicio + proxima <= ahora:
+                if len(pendientes) < MAX_PENDIENTES:
+                    pendientes.append((next(self.peticiones), inicio + proxima))
+                else:
+                    escalon['descartadas'] += 1
+                proxima = next(llegadas, None)
+            escalon['max_pendientes'] = max(escalon['max_pendientes'], len(pendientes))
+
+            while pendientes and self.libres:
+                self._enviar(*pendientes.popleft())
+                escalon['enviadas'] += 1
+
+            # Esperar respuestas hasta la próxima llegada (o un tope corto)
+            espera_ms = 100
+            if proxima is not None:
+                espera_ms = max(0, int((inicio + proxima - time.perf_counter()) * 1000))
+            for sock, _ in self.poller.poll(espera_ms):
+                if sock not in self.en_vuelo:
+                    continue
+                respuesta = sock.recv_string()
+                peticion, enviado, intencion = self.en_vuelo.pop(sock)
+                exito = not respuesta_fallida(respuesta)
+                ahora = time.perf_counter()
+                self._registrar(escalon, peticion, ahora - enviado, ahora - intencion, exito, tasa)
+                self.libres.append(sock)
+
+            ahora = time.perf_counter()
+            for sock, (peticion, enviado, intencion) in list(self.en_vuelo.items()):
+                if ahora - enviado > TIMEOUT_RESPUESTA:
+                    del self.en_vuelo[sock]
+                    self._registrar(escalon, peticion, ahora - enviado, ahora - intencion, False, tasa)
+                    self.libres.append(self._reemplazar_socket(sock))
+
+        segundos = time.perf_counter() - inicio
+        resultado = dict(tasa_objetivo=tasa, tasa_lograda=round(escalon['exitosas'] / segundos, 1),
+                         segundos=round(segundos, 2))
+        # Crudas y corregidas lado a lado: p99_ms / p99_corregido_ms, ...
+        for clave, sufijo in (('latencias', ''), ('latencias_corregidas', '_corregido')):
+            latencias = escalon.pop(clave)
+            latencias.guardar(f"histograma_carga_{tasa:g}{sufijo}.json")
+            for p in (50, 90, 99):
+                resultado[f"p{p}{sufijo}_ms"] = round(latencias.percentil(p) * 1000, 2)
+            resultado[f"max{sufijo}_ms"] = round((latencias.maximo or 0.0) * 1000, 2)
+        return dict(escalon, **resultado)
+
+    def rampa(self, tasas, duracion):
+        """Sube la tasa escalón a escalón hasta el primero saturado"""
+        resultados = []
+        print(f"{'':>44} | {'crudas (desde el envío)':^35} | {'corregidas (desde el calendario)':^35}")
+        print(f"{'objetivo':>8} | {'lograda':>8} | {'ok':>6} | {'fallos':>6} | {'descart':>7} | "
+              f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} | "
+              f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for tasa in tasas:
+            r = self.ejecutar_escalon(tasa, duracion)
+            r['saturado'] = (r['tasa_lograda'] < UMBRAL_SATURACION * tasa
+                             or r['fallidas'] > 0 or r['descartadas'] > 0)
+            resultados.append(r)
+            print(f"{tasa:>8g} | {r['tasa_lograda']:>8} | {r['exitosas']:>6} | {r['fallidas']:>6} | "
+                  f"{r['descartadas']:>7} | {r['p50_ms']:>8} {r['p90_ms']:>8} {r['p99_ms']:>8} {r['max_ms']:>8} | "
+                  f"{r['p50_corregido_ms']:>8} {r['p90_corregido_ms']:>8} {r['p99_corregido_ms']:>8} "
+                  f"{r['max_corregido_ms']:>8}")
+            self._archivo.flush()
+            if r['saturado']:
+                print(f"[Carga] Saturación a {tasa:g} pet/s (lograda {r['tasa_lograda']} pet/s)")
+                break
+        else:
+            print(f"[Carga] Sin saturación hasta {tasas[-1]:g} pet/s")
+        return resultados
+
+    def cerrar(self):
+        self._archivo.close()
+        for sock in self.libres + list(self.en_vuelo):
+            sock.close()
+        self.context.term()
+
+
+def argumentos_carga(argv):
+    """(archivo, tasas, duracion, llegadas, conexiones) a partir de la línea de comandos"""
+    opciones = {"--tasas": ",".join(map(str, TASAS)), "--duracion": DURACION_ESCALON,
+                "--llegadas": LLEGADAS, "--conexiones": CONEXIONES}
+    posicionales = []
+    i = 0
+    while i < len(argv):
+        if argv[i] in opciones and i + 1 < len(argv):
+            opciones[argv[i]] = argv[i + 1]
+            i += 2
+            continue
+        posicionales.append(argv[i])
+        i += 1
+    if not posicionales or opciones["--llegadas"] not in ("constante", "poisson"):
+        return None
+    tasas = [float(t) for t in str(opciones["--tasas"]).split(",") if t]
+    return posicionales[0], tasas, float(opciones["--duracion"]), opciones["--llegadas"], int(opciones["--conexiones"])
+
+
+if __name__ == "__main__":
+    argumentos = argumentos_carga(sys.argv[1:])
+    if argumentos is None:
+        print(__doc__.strip().splitlines()[-2])
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    nombre_archivo, tasas, duracion, llegadas, conexiones = argumentos
+
+    try:
+        peticiones = leer_peticiones(nombre_archivo)
+    except FileNotFoundError:
+        print(f"[Carga] Archivo {nombre_archivo} no encontrado")
+        sys.exit(1)
+    if not peticiones:
+        print(f"[Carga] {nombre_archivo} no tiene peticiones válidas")
+        sys.exit(1)
+
+    print(f"[Carga] {len(peticiones)} peticiones distintas | llegadas {llegadas} | "
+          f"{conexiones} conexiones | escalones de {duracion:g}s: {tasas}")
+    generador = GeneradorCarga(peticiones, conexiones, llegadas)
+    try:
+        resultados = generador.rampa(tasas, duracion)
+    finally:
+        generador.cerrar()
+
+    with open(ARCHIVO_RAMPA, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(resultados[0].keys()))
+        writer.writeheader()
+        writer.writerows(resultados)
+    print(f"Resultados guardados en {ARCHIVO_TIEMPOS} y {ARCHIVO_RAMPA}")
@@ -1,6 +1,8 @@
 """
 GestorAlmacenamiento.py
-Gestor con patrón ROUTER-DEALER para concurrencia
+Gestor con patrón ROUTER-DEALER para concurrencia.
+Acepta peticiones en JSON o en el codec binario de Clases.py; la operación
+"codecs" responde qué formatos entiende (la usa ClienteGA para negociar).
 """
 
 import zmq
@@ -12,7 +14,7 @@ import shutil
 import os
 import sys
 from datetime import datetime
-from Clases import LibroBiblioteca, LibroUsuario
+from Clases import LibroBiblioteca, CODECS_SOPORTADOS, ErrorCodec, decodificar_mensaje
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] GA-%(sede)s: %(message)s")
 
@@ -43,6 +45,10 @@ PUERTO_BACKEND = PUERTO_FRONTEND + 1000  # 6557 o 6559
 bd_lock = threading.Lock()
 context = zmq.Context()
 
+# Peticiones cuyo "deadline" ya pasó y se respondieron sin tocar la BD
+metricas = {'vencidas_descartadas': 0}
+metricas_lock = threading.Lock()
+
 def cargar_bd():
     """Carga la BD en memoria"""
     libros = {}
@@ -83,9 +89,17 @@ def guardar_bd(libros):
     except Exception as e:
         logger.error(f"Error guardando BD: {e}")
 
-def registrar_prestamo(libro_usuario):
+def completar_desde_catalogo(libro_usuario, libros):
+    """Los mensajes compactos solo traen el código: título y autor salen del catálogo"""
+    info = libros.get(libro_usuario.codigo)
+    if info is not None:
+        libro_usuario.titulo = libro_usuario.titulo or info['titulo']
+        libro_usuario.autor = libro_usuario.autor or info['autor']
+
+def registrar_prestamo(libro_usuario, libros):
     """Registra préstamo"""
     try:
+        completar_desde_catalogo(libro_usuario, libros)
         with open(BD_PRESTAMOS, 'a', encoding='utf-8') as f:
             f.write(f"{libro_usuario.codigo}|{libro_usuario.titulo}|{libro_usuario.autor}|"
                    f"{libro_usuario.fecha_prestamo}|{libro_usuario.fecha_devolucion}|{datetime.now().isoformat()}\n")
@@ -128,7 +142,7 @@ def procesar_prestamo(libro_usuario, libros):
     if codigo in libros and libros[codigo]['ejemplares'] > 0:
         libros[codigo]['ejemplares'] -= 1
         guardar_bd(libros)
-        registrar_prestamo(libro_usuario)
+        registrar_prestamo(libro_usuario, libros)
         return {"exito": True, "mensaje": f"Préstamo en {SEDE}. Ejemplares: {libros[codigo]['ejemplares']}"}
     else:
         return {"exito": False, "mensaje": "No disponible"}
@@ -143,12 +157,25 @@ def worker_thread(worker_id, libros):
     while True:
         try:
             # Recibir petición (socket REP recibe directamente)
-            mensaje = worker_socket.recv_string()
-            data = json.loads(mensaje)
+            mensaje = worker_socket.recv()
+            data = decodificar_mensaje(mensaje, objetos=True)
             
             operacion = data.get("operacion")
-            libro_usuario_dict = data.get("libro_usuario", {})
-            libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
+
+            if operacion == "codecs":
+                worker_socket.send_string(json.dumps({"exito": True, "codecs": CODECS_SOPORTADOS}))
+                continue
+
+            # El cliente ya no espera el resultado: no gastar lock ni disco
+            if data.get("deadline") is not None and time.time() > data["deadline"]:
+                with metricas_lock:
+                    metricas['vencidas_descartadas'] += 1
+                    total = metricas['vencidas_descartadas']
+                logger.warning(f"[WORKER-{worker_id}] Petición vencida descartada: {operacion} (total: {total})")
+                worker_socket.send_string(json.dumps({"exito": False, "vencida": True, "mensaje": "Petición vencida"}))
+                continue
+
+            libro_usuario = data["libro_usuario"]
 
             logger.info(f"[WORKER-{worker_id}] Procesando {operacion}: {libro_usuario.codigo}")
 
@@ -168,9 +195,9 @@ def worker_thread(worker_id, libros):
             worker_socket.send_string(json.dumps(respuesta))
             logger.info(f"[WORKER-{worker_id}] ✓ Procesado")
 
-        except json.JSONDecodeError as e:
-            logger.error(f"[WORKER-{worker_id}] Error JSON: {e}")
-            worker_socket.send_string(json.dumps({"exito": False, "mensaje": "JSON inválido"}))
+        except (json.JSONDecodeError, UnicodeDecodeError, ErrorCodec) as e:
+            logger.error(f"[WORKER-{worker_id}] Error decodificando: {e}")
+            worker_socket.send_string(json.dumps({"exito": False, "mensaje": "Mensaje inválido"}))
         except Exception as e:
             logger.error(f"[WORKER-{worker_id}] Error: {e}")
             try:
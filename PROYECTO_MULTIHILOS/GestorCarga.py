@@ -2,65 +2,198 @@
 """
 GestorCarga.py
 Gestor de Carga que recibe peticiones de PS y:
-- Publica en tópicos (PUB/SUB) las operaciones.
+- Publica en tópicos (PUB/SUB) las operaciones, un tópico por sede.
+- En préstamos síncronos espera el resultado del Actor antes de responder.
+- Descarta las peticiones cuyo "deadline" (fijado por el PS) ya pasó.
+- Acepta JSON o el codec binario de Clases.py y publica en CODEC_PUBLICACION.
+- Responde con el mismo sobre que recibió, así un cliente DEALER (PSAsync.py)
+  puede poner un id de petición antes del delimitador y emparejar respuestas.
+- Limita la tasa de cada cliente (identidad del ROUTER, el id_cliente de
+  PSM.py y PSAsync.py) y reparte el servicio con la cola justa ponderada de
+  ControlTrafico.py. En limites_clientes.json el límite por defecto es alto
+  para no frenar los experimentos de carga; solo los clientes con nombre
+  tienen límites propios.
 """
 
 import zmq
 import json
 import logging
-from Clases import LibroUsuario
+import time
+import uuid
+from Clases import LibroUsuario, CODECS_SOPORTADOS, ErrorCodec, codificar_mensaje, decodificar_mensaje
+from ControlTrafico import PlanificadorJusto
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] GC: %(message)s")
 
+PRESTAMO_SINCRONO = True
+TIMEOUT_PRESTAMO = 10  # segundos
+CODEC_PUBLICACION = "binario"  # formato hacia los actores: "binario" o "json"
+ARCHIVO_LIMITES = "limites_clientes.json"  # se recarga si cambia
+INTERVALO_RECARGA = 2  # segundos
+INTERVALO_METRICAS = 10  # segundos entre resúmenes de espera por operación
+
 context = zmq.Context()
 
-# Socket REP para PS -> GC
-rep_socket = context.socket(zmq.REP)
-rep_socket.bind("tcp://*:5555")
-logging.info("Socket REP escuchando en tcp://*:5555")
+# Socket ROUTER para PS -> GC
+router_socket = context.socket(zmq.ROUTER)
+router_socket.bind("tcp://*:5555")
+logging.info("Socket ROUTER escuchando en tcp://*:5555")
 
 # Socket PUB para GC -> Actores
 pub_socket = context.socket(zmq.PUB)
 pub_socket.bind("tcp://*:5556")
 logging.info("Socket PUB escuchando en tcp://*:5556")
 
+# Socket PULL para Actores -> GC (resultados de préstamos)
+resultados_socket = context.socket(zmq.PULL)
+resultados_socket.bind("tcp://*:5561")
+logging.info("Socket PULL de resultados en tcp://*:5561")
+
+prestamos_pendientes = {}
+metricas = {'vencidas_descartadas': 0}
+
+def topico(operacion, data):
+    sede = data.get("sede")
+    return f"{operacion}.{sede}" if sede else operacion
+
+def clase_operacion(data):
+    """Clase de prioridad de la petición: su operación si es un texto"""
+    operacion = data.get("operacion")
+    return operacion if isinstance(operacion, str) else None
+
+def responder(sobre, texto):
+    """Responde por el sobre completo: [identidad, b""] de un REQ o
+    [identidad, id_peticion, b""] de un DEALER con varias peticiones en vuelo"""
+    router_socket.send_multipart(sobre + [texto.encode("utf-8")])
+
+def publicar(operacion, data):
+    if CODEC_PUBLICACION == "binario":
+        pub_socket.send(f"{topico(operacion, data)} ".encode("utf-8") + codificar_mensaje(data))
+    else:
+        pub_socket.send_string(f"{topico(operacion, data)} {json.dumps(data)}")
+
+def procesar_peticion(sobre, data):
+    # El PS ya no espera esta petición: no gastar actores ni GA en ella
+    deadline = data.get("deadline")
+    if deadline is not None and time.time() > deadline:
+        metricas['vencidas_descartadas'] += 1
+        logging.warning(f"Petición vencida descartada (total: {metricas['vencidas_descartadas']})")
+        responder(sobre, "Error: petición vencida")
+        return
+
+    operacion = data.get("operacion")
+    libro_usuario_dict = data.get("libro_usuario", {})
+
+    if operacion == "devolucion":
+        logging.info(f"Devolución: {libro_usuario_dict.get('codigo')}")
+        # Ya confirmada al PS: el actor debe hacerla aunque venza
+        responder(sobre, "Devolución enviada al Actor")
+        data.pop("deadline", None)
+        publicar(operacion, data)
+
+    elif operacion == "renovacion":
+        logging.info(f"Renovación: {libro_usuario_dict.get('codigo')}")
+        responder(sobre, "Renovación enviada al Actor")
+        data.pop("deadline", None)
+        publicar(operacion, data)
+
+    elif operacion == "prestamo":
+        logging.info(f"Préstamo: {libro_usuario_dict.get('codigo')}")
+        if PRESTAMO_SINCRONO:
+            correlation_id = uuid.uuid4().hex
+            data["correlation_id"] = correlation_id
+            prestamos_pendientes[correlation_id] = {
+                'sobre': sobre,
+                'vence': min(time.time() + TIMEOUT_PRESTAMO, deadline or float("inf"))
+            }
+        else:
+            responder(sobre, "Préstamo procesado en el GC")
+        publicar(operacion, data)
+    elif operacion == "codecs":
+        responder(sobre, json.dumps({"codecs": CODECS_SOPORTADOS}))
+    else:
+        logging.warning(f"Operación desconocida: {operacion}")
+        responder(sobre, "Operación desconocida")
+
+def procesar_resultado(mensaje):
+    data = json.loads(mensaje)
+    pendiente = prestamos_pendientes.pop(data.get("correlation_id"), None)
+    if pendiente is None:
+        return
+
+    if data.get("exito"):
+        responder(pendiente['sobre'], f"Préstamo exitoso: {data.get('mensaje')}")
+    else:
+        responder(pendiente['sobre'], f"Préstamo rechazado: {data.get('mensaje')}")
+
+def expirar_prestamos_pendientes():
+    ahora = time.time()
+    for correlation_id in [c for c, p in prestamos_pendientes.items() if ahora > p['vence']]:
+        pendiente = prestamos_pendientes.pop(correlation_id)
+        logging.warning(f"Préstamo {correlation_id} sin resultado (timeout)")
+        responder(pendiente['sobre'], "Préstamo sin respuesta del Actor (timeout)")
+
 if __name__ == "__main__":
     logging.info("Gestor de Carga iniciado")
 
+    planificador = PlanificadorJusto(ARCHIVO_LIMITES)
+    ultima_recarga = time.time()
+    ultimas_metricas = time.time()
+
+    poller = zmq.Poller()
+    poller.register(router_socket, zmq.POLLIN)
+    poller.register(resultados_socket, zmq.POLLIN)
+
     while True:
         try:
-            mensaje = rep_socket.recv_string()
-            
-            try:
-                data = json.loads(mensaje)
-                operacion = data.get("operacion")
-                libro_usuario_dict = data.get("libro_usuario", {})
-
-                if operacion == "devolucion":
-                    logging.info(f"Devolución: {libro_usuario_dict.get('codigo')}")
-                    rep_socket.send_string("Devolución enviada al Actor")
-                    pub_socket.send_string(f"devolucion {json.dumps(data)}")
-
-                elif operacion == "renovacion":
-                    logging.info(f"Renovación: {libro_usuario_dict.get('codigo')}")
-                    rep_socket.send_string("Renovación enviada al Actor")
-                    pub_socket.send_string(f"renovacion {json.dumps(data)}")
-                    
-                elif operacion == "prestamo":
-                    logging.info(f"Préstamo: {libro_usuario_dict.get('codigo')}")
-                    rep_socket.send_string("Préstamo procesado en el GC")
-                    pub_socket.send_string(f"prestamo {json.dumps(data)}")
-                else:
-                    logging.warning(f"Operación desconocida: {operacion}")
-                    rep_socket.send_string("Operación desconocida")
-
-            except json.JSONDecodeError as e:
-                logging.error(f"Error parseando JSON: {e}")
-                rep_socket.send_string("Error: mensaje no es JSON válido")
+            socks = dict(poller.poll(planificador.espera_ms(500)))
+
+            if router_socket in socks:
+                *sobre, cuerpo = router_socket.recv_multipart()
+                try:
+                    data = decodificar_mensaje(cuerpo)
+                    if not isinstance(data, dict):
+                        raise ErrorCodec(f"La petición no es un objeto ({type(data).__name__})")
+                except (json.JSONDecodeError, UnicodeDecodeError, ErrorCodec) as e:
+                    logging.error(f"Error decodificando mensaje: {e}")
+                    responder(sobre, "Error: formato de mensaje no soportado")
+                    data = None
+
+                # La identidad del ROUTER es el cliente; la operación, su clase
+                if data is not None and not planificador.encolar(sobre[0], (sobre, data), clase_operacion(data)):
+                    logging.warning(f"Cola del cliente {sobre[0]} llena, petición rechazada")
+                    responder(sobre, "Error: límite de peticiones del cliente excedido")
+
+            siguiente = planificador.siguiente()
+            while siguiente is not None:
+                _, (sobre, data) = siguiente
+                try:
+                    procesar_peticion(sobre, data)
+                except Exception as e:
+                    logging.error(f"Error: {e}")
+                    try:
+                        responder(sobre, "Error interno en el GC")
+                    except:
+                        pass
+                siguiente = planificador.siguiente()
+
+            if resultados_socket in socks:
+                try:
+                    procesar_resultado(resultados_socket.recv_string())
+                except Exception as e:
+                    logging.error(f"Error resultado: {e}")
+
+            expirar_prestamos_pendientes()
+
+            if time.time() - ultima_recarga > INTERVALO_RECARGA:
+                planificador.recargar_si_cambio()
+                planificador.limpiar_inactivos()
+                ultima_recarga = time.time()
+
+            if time.time() - ultimas_metricas > INTERVALO_METRICAS:
+                logging.info(f"Espera en cola por operación: {planificador.metricas_espera.resumen()} | "
+                             f"Vencidas descartadas: {metricas['vencidas_descartadas']}")
+                ultimas_metricas = time.time()
 
         except Exception as e:
             logging.error(f"Error: {e}")
-            try:
-                rep_socket.send_string("Error interno en el GC")
-            except:
-                pass
\ No newline at end of file
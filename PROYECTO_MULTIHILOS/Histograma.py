@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Histograma.py
+Histograma de latencias de memoria fija con cubetas logarítmicas (al estilo
+HdrHistogram). Los valores se guardan en microsegundos: hasta 127 µs cada
+valor tiene su cubeta y desde ahí cada potencia de 2 se parte en 64 cubetas,
+así que cualquier percentil sale con error relativo menor a 1/64 (~1.6%)
+sin guardar las muestras. Hasta MAXIMO_US son menos de 1800 contadores.
+
+Media, desviación, mínimo y máximo son exactos (sumas acumuladas). Dos
+histogramas se combinan sumando contadores, y se guardan y cargan como JSON,
+así que cada proceso (PS, GC, actores, GA) puede llevar el suyo y juntarlos
+después:
+
+Uso: python Histograma.py histograma1.json [histograma2.json ...]
+
+No es thread-safe: quien lo comparta entre hilos lo protege con su lock.
+"""
+
+import json
+import math
+import sys
+
+BITS_SUBCUBETA = 7
+SUBCUBETAS = 1 << BITS_SUBCUBETA  # 128 valores exactos
+MITAD = SUBCUBETAS >> 1  # 64 cubetas por potencia de 2
+MAXIMO_US = 3600 * 1000 * 1000  # una hora; lo que pase se cuenta en la última
+
+
+def indice(valor_us):
+    """Cubeta de un valor entero en µs"""
+    if valor_us < SUBCUBETAS:
+        return valor_us
+    desplazamiento = valor_us.bit_length() - BITS_SUBCUBETA
+    return SUBCUBETAS + (desplazamiento - 1) * MITAD + (valor_us >> desplazamiento) - MITAD
+
+
+def limites(i):
+    """(menor, mayor] aproximado: menor valor de la cubeta y ancho en µs"""
+    if i < SUBCUBETAS:
+        return i, 1
+    desplazamiento = (i - SUBCUBETAS) // MITAD + 1
+    superior = (i - SUBCUBETAS) % MITAD + MITAD
+    return superior << desplazamiento, 1 << desplazamiento
+
+
+class Histograma:
+    """Latencias en segundos; internamente contadores por cubeta de µs"""
+
+    def __init__(self, maximo_us=MAXIMO_US):
+        self.maximo_us = maximo_us
+        self.conteos = [0] * (indice(maximo_us) + 1)
+        self.total = 0
+        self.suma = 0.0
+        self.suma_cuadrados = 0.0
+        self.minimo = None
+        self.maximo = None
+
+    def registrar(self, segundos, veces=1):
+        """Cuenta 'veces' muestras de 'segundos'"""
+        valor_us = min(self.maximo_us, max(0, int(segundos * 1e6)))
+        self.conteos[indice(valor_us)] += veces
+        self.total += veces
+        self.suma += segundos * veces
+        self.suma_cuadrados += segundos * segundos * veces
+        self.minimo = segundos if self.minimo is None else min(self.minimo, segundos)
+        self.maximo = segundos if self.maximo is None else max(self.maximo, segundos)
+
+    def combinar(self, otro):
+        """Suma al histograma las muestras de otro (de otro hilo, proceso o archivo)"""
+        if otro.maximo_us != self.maximo_us:
+            raise ValueError("Histogramas con rangos distintos")
+        for i, n in enumerate(otro.conteos):
+            if n:
+                self.conteos[i] += n
+        self.total += otro.total
+        self.suma += otro.suma
+        self.suma_cuadrados += otro.suma_cuadrados
+        for extremo in (otro.minimo, otro.maximo):
+            if extremo is not None:
+                self.minimo = extremo if self.minimo is None else min(self.minimo, extremo)
+                self.maximo = extremo if self.maximo is None else max(self.maximo, extremo)
+        return self
+
+    def percentil(self, p):
+        """Valor en segundos por debajo del cual queda el p% de las muestras"""
+        if not self.total:
+            return 0.0
+        objetivo = max(1, math.ceil(p / 100 * self.total))
+        acumulado = 0
+        for i, n in enumerate(self.conteos):
+            acumulado += n
+            if acumulado >= objetivo:
+                menor, ancho = limites(i)
+                # Punto medio de la cubeta, sin salirse de los extremos exactos
+                valor = (menor + (ancho - 1) / 2) / 1e6
+                return min(max(valor, self.minimo), self.maximo)
+        return self.maximo
+
+    def media(self):
+        return self.suma / self.total if self.total else 0.0
+
+    def desviacion(self):
+        if not self.total:
+            return 0.0
+        media = self.media()
+        return max(0.0, self.suma_cuadrados / self.total - media * media) ** 0.5
+
+    def resumen_ms(self, percentiles=(50, 90, 99, 99.9)):
+        """Muestras, media, desviación, extremos y percentiles en milisegundos"""
+        resumen = {
+            'muestras': self.total,
+            'media_ms': round(self.media() * 1000, 3),
+            'desv_ms': round(self.desviacion() * 1000, 3),
+            'min_ms': round((self.minimo or 0.0) * 1000, 3),
+            'max_ms': round((self.maximo or 0.0) * 1000, 3),
+        }
+        for p in percentiles:
+            resumen[f"p{p:g}_ms"] = round(self.percentil(p) * 1000, 3)
+        return resumen
+
+    def to_dict(self):
+        """Forma dispersa: solo las cubetas con muestras"""
+        usadas = [i for i, n in enumerate(self.conteos) if n]
+        return {
+            'maximo_us': self.maximo_us,
+            'indices': usadas,
+            'conteos': [self.conteos[i] for i in usadas],
+            'total': self.total,
+            'suma': self.suma,
+            'suma_cuadrados': self.suma_cuadrados,
+            'minimo': self.minimo,
+            'maximo': self.maximo
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histograma = cls(data.get('maximo_us', MAXIMO_US))
+        for i, n in zip(data['indices'], data['conteos']):
+            histograma.conteos[i] = n
+        histograma.total = data['total']
+        histograma.suma = data['suma']
+        histograma.suma_cuadrados = data['suma_cuadrados']
+        histograma.minimo = data['minimo']
+        histograma.maximo = data['maximo']
+        return histograma
+
+    def guardar(self, archivo):
+        with open(archivo, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def cargar(cls, archivo):
+        with open(archivo, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python Histograma.py histograma1.json [histograma2.json ...]")
+        sys.exit(1)
+
+    combinado = Histograma()
+    for archivo in sys.argv[1:]:
+        combinado.combinar(Histograma.cargar(archivo))
+    for clave, valor in combinado.resumen_ms().items():
+        print(f"{clave:>10}: {valor}")
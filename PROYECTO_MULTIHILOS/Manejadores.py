@@ -0,0 +1,122 @@
+"""
+Manejadores.py
+Lógica de cada tipo de operación para el runtime de actores
+(ActorUnificado.py). Un manejador recibe el runtime (cliente GA compartido,
+socket de resultados), la petición decodificada y el id del trabajador, y
+devuelve True si la operación se completó. El deadline de la petición viaja
+al GA para que descarte el trabajo que ya nadie espera.
+
+Para añadir una operación basta con escribir su función y registrarla en
+MANEJADORES con el nombre del tópico.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+
+
+def manejar_prestamo(runtime, peticion, id_trabajador):
+    libro_usuario = peticion['libro_usuario']
+    gestor_local = runtime.indice_gestor(peticion.get('sede'))
+    logging.info(f"[T-{id_trabajador}] Procesando préstamo: {libro_usuario.codigo}")
+
+    # Verificar disponibilidad
+    msg_verificar = {
+        "operacion": "verificar_disponibilidad",
+        "libro_usuario": libro_usuario
+    }
+    if peticion.get('deadline') is not None:
+        msg_verificar["deadline"] = peticion['deadline']
+
+    respuesta_disp, gestor_local = runtime.cliente_ga.solicitar_con_failover(msg_verificar, gestor_local)
+
+    if not respuesta_disp:
+        logging.error(f"[T-{id_trabajador}] Fallo verificación")
+        runtime.reportar_resultado(peticion, False, "No se pudo verificar disponibilidad")
+        return False
+
+    resp_data = json.loads(respuesta_disp)
+    if resp_data.get("vencida"):
+        runtime.descartar_vencida(peticion, id_trabajador)
+        return False
+
+    if not resp_data.get("disponible", False):
+        logging.warning(f"[T-{id_trabajador}] No disponible")
+        runtime.reportar_resultado(peticion, False, resp_data.get("mensaje", "No disponible"))
+        return False
+
+    # Registrar préstamo (si el PS aún lo espera)
+    if runtime.vencida(peticion):
+        runtime.descartar_vencida(peticion, id_trabajador)
+        return False
+
+    msg_prestamo = {
+        "operacion": "prestamo",
+        "libro_usuario": libro_usuario
+    }
+    if peticion.get('deadline') is not None:
+        msg_prestamo["deadline"] = peticion['deadline']
+
+    respuesta_prestamo, gestor_local = runtime.cliente_ga.solicitar_con_failover(msg_prestamo, gestor_local)
+
+    if not respuesta_prestamo:
+        logging.error(f"[T-{id_trabajador}] ✗ Fallo préstamo")
+        runtime.reportar_resultado(peticion, False, "No se pudo registrar el préstamo")
+        return False
+
+    resp_prestamo = json.loads(respuesta_prestamo)
+    if resp_prestamo.get("vencida"):
+        runtime.descartar_vencida(peticion, id_trabajador)
+        return False
+
+    logging.info(f"[T-{id_trabajador}] ✓ Préstamo registrado")
+    runtime.reportar_resultado(peticion, resp_prestamo.get("exito", False), resp_prestamo.get("mensaje", ""))
+    return resp_prestamo.get("exito", False)
+
+
+def manejar_devolucion(runtime, peticion, id_trabajador):
+    libro_usuario = peticion['libro_usuario']
+
+    mensaje_ga = {
+        "operacion": "devolucion",
+        "libro_usuario": libro_usuario
+    }
+
+    respuesta, _ = runtime.cliente_ga.solicitar_con_failover(mensaje_ga, runtime.indice_gestor(peticion.get('sede')))
+    if respuesta:
+        logging.info(f"[T-{id_trabajador}] ✓ Devolución procesada")
+        return True
+    logging.error(f"[T-{id_trabajador}] ✗ Fallo devolución")
+    return False
+
+
+def manejar_renovacion(runtime, peticion, id_trabajador):
+    libro_usuario = peticion['libro_usuario']
+
+    # Calcular nueva fecha
+    try:
+        fecha_actual = datetime.fromisoformat(libro_usuario.fecha_devolucion)
+    except:
+        fecha_actual = datetime.now()
+
+    nueva_fecha = (fecha_actual + timedelta(weeks=1)).isoformat()
+    libro_usuario.fecha_devolucion = nueva_fecha
+
+    mensaje_ga = {
+        "operacion": "renovacion",
+        "libro_usuario": libro_usuario
+    }
+
+    respuesta, _ = runtime.cliente_ga.solicitar_con_failover(mensaje_ga, runtime.indice_gestor(peticion.get('sede')))
+    if respuesta:
+        logging.info(f"[T-{id_trabajador}] ✓ Renovación procesada")
+        return True
+    logging.error(f"[T-{id_trabajador}] ✗ Fallo renovación")
+    return False
+
+
+MANEJADORES = {
+    "prestamo": manejar_prestamo,
+    "devolucion": manejar_devolucion,
+    "renovacion": manejar_renovacion,
+}
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+PSAsync.py
+Proceso Solicitante asíncrono: MAX_EN_VUELO corrutinas trabajadoras sobre un
+único DEALER de zmq.asyncio, en vez de un hilo por petición y un REQ con lock
+(PSM.py). Cada petición lleva un id en el sobre ([id, b"", carga]); el GC
+responde con el mismo sobre y una tarea receptora entrega cada respuesta a
+la petición que la espera. Así puede haber miles de peticiones en vuelo,
+cada una con su propio timeout.
+
+Las trabajadoras toman las peticiones de un único iterador sobre el archivo,
+que se lee a medida que avanzan: la memoria no crece con el tamaño del
+archivo. Lee el mismo formato que peticiones.txt (TIPO,ISBN,titulo,autor,sede),
+también comprimido con gzip como PSM.py, y escribe las mismas columnas en
+ARCHIVO_TIEMPOS, así analizar_Resultados.py sirve igual.
+
+Uso: python PSAsync.py archivo.txt[.gz] [id_cliente]
+"""
+
+import asyncio
+import csv
+import gzip
+import itertools
+import json
+import sys
+import time
+from datetime import datetime
+
+import zmq
+import zmq.asyncio
+
+from Clases import LibroUsuario, codificar_mensaje, respuesta_fallida
+from Histograma import Histograma
+
+GC_ADDRESS = "tcp://localhost:5555"
+
+ID_CLIENTE = sys.argv[2] if len(sys.argv) > 2 else None
+
+USAR_CODEC_BINARIO = True
+TIMEOUT_RESPUESTA = 15  # segundos; viaja como "deadline" igual que en PSM.py
+MAX_EN_VUELO = 5000  # corrutinas trabajadoras, una petición en vuelo cada una
+
+ARCHIVO_TIEMPOS = "resultados_tiempos.csv"
+ARCHIVO_HISTOGRAMA = "histograma_tiempos.json"
+
+# Igual que en PSM.py: solo el código viaja, los nombres salen del catálogo
+MODO_COMPACTO = True
+ARCHIVO_CATALOGO = "BD_SedeA.txt"
+
+OPERACIONES = {"PRESTAMO": "prestamo", "DEVOLUCION": "devolucion", "RENOVACION": "renovacion"}
+
+
+def cargar_catalogo():
+    catalogo = {}
+    try:
+        with open(ARCHIVO_CATALOGO, "r", encoding="utf-8") as f:
+            for linea in f:
+                partes = linea.strip().split("|")
+                if len(partes) >= 3:
+                    catalogo[partes[0]] = (partes[1], partes[2])
+    except FileNotFoundError:
+        print(f"[PS] Catálogo {ARCHIVO_CATALOGO} no encontrado")
+    return catalogo
+
+
+def abrir_peticiones(nombre_archivo):
+    """Abre el archivo de peticiones como texto, descomprimiendo si es gzip"""
+    with open(nombre_archivo, "rb") as f:
+        comprimido = f.read(2) == b"\x1f\x8b"
+    if comprimido:
+        return gzip.open(nombre_archivo, "rt", encoding="utf-8")
+    return open(nombre_archivo, "r", encoding="utf-8")
+
+
+def leer_peticiones(lineas, catalogo):
+    """Genera (operacion, isbn, titulo, autor, sede) a medida que se leen las líneas"""
+    for line in lineas:
+        parts = line.strip().split(",")
+        if len(parts) != 5:
+            print(f"[PS] Línea malformada: {line}")
+            continue
+        tipo, isbn, titulo, autor, sede = parts
+        if tipo.upper() not in OPERACIONES:
+            print(f"[PS] Tipo desconocido: {tipo}")
+            continue
+        titulo_cat, autor_cat = catalogo.get(isbn, ("", ""))
+        yield OPERACIONES[tipo.upper()], isbn, titulo or titulo_cat, autor or autor_cat, sede
+
+
+class ClienteAsync:
+    def __init__(self):
+        self.context = zmq.asyncio.Context()
+        self.socket = self.context.socket(zmq.DEALER)
+        if ID_CLIENTE:
+            self.socket.setsockopt_string(zmq.IDENTITY, ID_CLIENTE)
+        # Sin tope de cola: el límite de peticiones en vuelo lo ponen las trabajadoras
+        self.socket.setsockopt(zmq.SNDHWM, 0)
+        self.socket.setsockopt(zmq.RCVHWM, 0)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(GC_ADDRESS)
+
+        self.esperando = {}  # id de petición -> Future
+        self._ids = itertools.count(1)
+        self.codec = "json"
+        self.metricas = {'total_peticiones': 0, 'peticiones_exitosas': 0, 'peticiones_fallidas': 0,
+                         'tiempos_respuesta': Histograma(), 'respuestas_tardias': 0}
+
+        self._archivo = open(ARCHIVO_TIEMPOS, "w", newline="", encoding="utf-8")
+        self._escritor = csv.writer(self._archivo)
+        self._escritor.writerow(['timestamp', 'operacion', 'codigo', 'titulo', 'sede', 'tiempo_respuesta_ms', 'exito'])
+
+    async def receptor(self):
+        """Entrega cada respuesta [id, b"", texto] a la petición que la espera"""
+        while True:
+            id_peticion, _, texto = await self.socket.recv_multipart()
+            futuro = self.esperando.pop(id_peticion, None)
+            if futuro is None or futuro.done():
+                # Llegó después de su timeout
+                self.metricas['respuestas_tardias'] += 1
+                continue
+            futuro.set_result(texto.decode("utf-8"))
+
+    async def solicitar(self, carga):
+        """Envía una carga y espera su respuesta; None si vence TIMEOUT_RESPUESTA"""
+        id_peticion = format(next(self._ids), "x").encode()
+        futuro = asyncio.get_running_loop().create_future()
+        self.esperando[id_peticion] = futuro
+        await self.socket.send_multipart([id_peticion, b"", carga])
+        try:
+            return await asyncio.wait_for(futuro, TIMEOUT_RESPUESTA)
+        except asyncio.TimeoutError:
+            self.esperando.pop(id_peticion, None)
+            return None
+
+    async def negociar_codec(self):
+        """Como PSM.negociar_codec: binario solo si el GC lo anuncia"""
+        if not USAR_CODEC_BINARIO:
+            return
+        respuesta = await self.solicitar(json.dumps({"operacion": "codecs"}).encode("utf-8"))
+        try:
+            codecs = json.loads(respuesta).get("codecs", []) if respuesta else []
+        except (ValueError, AttributeError):
+            codecs = []
+        if "binario" in codecs:
+            self.codec = "binario"
+        print(f"[PS] Formato de peticiones: {self.codec}")
+
+    async def enviar_peticion(self, operacion, codigo, titulo, autor, sede):
+        libro_usuario = LibroUsuario(codigo) if MODO_COMPACTO else LibroUsuario(codigo, titulo, autor)
+        ahora = time.time()
+        mensaje = {
+            "operacion": operacion,
+            "libro_usuario": libro_usuario.to_dict(compacto=MODO_COMPACTO),
+            "sede": sede,
+            "timestamp": ahora,
+            "deadline": ahora + TIMEOUT_RESPUESTA
+        }
+        carga = codificar_mensaje(mensaje) if self.codec == "binario" else json.dumps(mensaje).encode("utf-8")
+
+        tiempo_inicio = time.time()
+        respuesta = await self.solicitar(carga)
+        tiempo_respuesta = time.time() - tiempo_inicio
+
+        exito = not respuesta_fallida(respuesta)
+        self.metricas['total_peticiones'] += 1
+        if exito:
+            self.metricas['peticiones_exitosas'] += 1
+            self.metricas['tiempos_respuesta'].registrar(tiempo_respuesta)
+        else:
+            self.metricas['peticiones_fallidas'] += 1
+            motivo = "Timeout" if respuesta is None else respuesta
+            print(f"[PS] ✗ {operacion.upper()} -> {codigo}: {motivo} ({tiempo_respuesta:.2f}s)")
+        self._escritor.writerow([datetime.now().isoformat(), operacion, codigo, titulo, sede,
+                                 f"{tiempo_respuesta * 1000:.2f}", exito])
+
+    def cerrar(self):
+        self._archivo.close()
+        self.socket.close()
+        self.context.term()
+
+
+def calcular_estadisticas(metricas, duracion_total):
+    """Mismo resumen que PSM.calcular_estadisticas"""
+    print("\n" + "=" * 60)
+    print("ESTADÍSTICAS DEL EXPERIMENTO")
+    print("=" * 60)
+    total = metricas['total_peticiones']
+    tiempos = metricas['tiempos_respuesta']
+    print(f"Total de peticiones: {total}")
+    print(f"Peticiones exitosas: {metricas['peticiones_exitosas']}")
+    print(f"Peticiones fallidas: {metricas['peticiones_fallidas']}")
+    if metricas['respuestas_tardias']:
+        print(f"Respuestas llegadas tras su timeout: {metricas['respuestas_tardias']}")
+
+    if tiempos.total:
+        print(f"\nTIEMPOS DE RESPUESTA:")
+        print(f"  - Promedio: {tiempos.media() * 1000:.2f} ms")
+        print(f"  - Desv. Estándar: {tiempos.desviacion() * 1000:.2f} ms")
+        print(f"  - Mínimo: {tiempos.minimo * 1000:.2f} ms")
+        print(f"  - Máximo: {tiempos.maximo * 1000:.2f} ms")
+        for p in (50, 90, 99, 99.9):
+            print(f"  - p{p:g}: {tiempos.percentil(p) * 1000:.2f} ms")
+        tiempos.guardar(ARCHIVO_HISTOGRAMA)
+
+    print(f"\nDuración total del experimento: {duracion_total:.2f} segundos")
+    if duracion_total > 0:
+        print(f"Throughput: {total / duracion_total:.2f} peticiones/segundo")
+    print("=" * 60)
+    print(f"Resultados guardados en: {ARCHIVO_TIEMPOS} y {ARCHIVO_HISTOGRAMA}")
+    print("=" * 60 + "\n")
+
+
+async def trabajador(cliente, peticiones):
+    """Envía peticiones de uno en uno hasta agotar el iterador compartido"""
+    # next() no cede el control al bucle: dos trabajadoras nunca leen la misma línea
+    for peticion in peticiones:
+        await cliente.enviar_peticion(*peticion)
+
+
+async def main(nombre_archivo):
+    try:
+        archivo = abrir_peticiones(nombre_archivo)
+    except FileNotFoundError:
+        print(f"[PS] Archivo {nombre_archivo} no encontrado")
+        return
+
+    cliente = ClienteAsync()
+    receptor = asyncio.create_task(cliente.receptor())
+    catalogo = cargar_catalogo()
+    try:
+        await cliente.negociar_codec()
+
+        print(f"[PS] Procesando peticiones con {MAX_EN_VUELO} trabajadoras")
+        print("[PS] Iniciando experimento...\n")
+        inicio = time.time()
+
+        peticiones = leer_peticiones(archivo, catalogo)
+        await asyncio.gather(*(trabajador(cliente, peticiones) for _ in range(MAX_EN_VUELO)))
+        duracion_total = time.time() - inicio
+        print("\n[PS] Todas las peticiones procesadas")
+        calcular_estadisticas(cliente.metricas, duracion_total)
+    finally:
+        archivo.close()
+        receptor.cancel()
+        cliente.cerrar()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python PSAsync.py archivo.txt[.gz] [id_cliente]")
+        sys.exit(1)
+    print(f"[PS] Archivo de peticiones: {sys.argv[1]}")
+    asyncio.run(main(sys.argv[1]))
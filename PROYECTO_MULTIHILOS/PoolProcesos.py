@@ -0,0 +1,106 @@
+"""
+PoolProcesos.py
+Modo de actor por procesos: el receptor SUB reenvía los mensajes crudos
+por un socket PUSH ipc:// a NUM_PROCESOS procesos trabajadores (PULL).
+Cada proceso decodifica la carga, arma los objetos y habla con el GA por
+su cuenta, así que el trabajo de CPU no compite por un único GIL.
+
+Los procesos se crean con fork: heredan el código del actor, pero no
+pueden usar su contexto ZMQ, por eso preparar() recrea en el hijo el
+contexto y el ClienteGA (y devuelve la función de latencia del GA para el
+pool de hilos de ese proceso).
+"""
+
+import multiprocessing
+import logging
+import os
+import zmq
+from PoolTrabajadores import PoolAutoescalable
+
+NUM_PROCESOS = os.cpu_count() or 2
+HILOS_POR_PROCESO = (2, 8)  # mínimo y máximo de hilos de cada proceso
+
+
+class PoolProcesos:
+    def __init__(self, nombre, procesar, preparar=None, num_procesos=NUM_PROCESOS,
+                 hilos_por_proceso=HILOS_POR_PROCESO, prioridades=None):
+        """
+        procesar(mensaje, id_trabajador) atiende un mensaje crudo del tópico.
+        preparar() se ejecuta en cada proceso hijo antes de atender mensajes.
+        prioridades: peso por clase para la cola de cada proceso.
+        """
+        self.nombre = nombre
+        self.procesar = procesar
+        self.preparar = preparar
+        self.num_procesos = num_procesos
+        self.hilos_por_proceso = hilos_por_proceso
+        self.prioridades = prioridades
+        self.endpoint = f"ipc:///tmp/actor-{nombre}-{os.getpid()}.ipc"
+        self.procesos = []
+        self.enviados = 0
+        self._push = None
+        self.pool_local = None  # pool de hilos del proceso hijo (solo en los hijos)
+
+    def iniciar(self, context):
+        # Crear los hijos antes de abrir el PUSH para que no lo hereden
+        mp = multiprocessing.get_context("fork")
+        for indice in range(self.num_procesos):
+            proceso = mp.Process(target=self._proceso_trabajador, args=(indice,), daemon=True)
+            proceso.start()
+            self.procesos.append(proceso)
+
+        self._push = context.socket(zmq.PUSH)
+        self._push.setsockopt(zmq.LINGER, 0)
+        self._push.bind(self.endpoint)
+        logging.info(f"[POOL-{self.nombre}] Iniciado con {self.num_procesos} procesos en {self.endpoint}")
+
+    def enviar(self, mensaje, clase=None):
+        """Reparte un mensaje crudo (bytes); llamar siempre desde el mismo hilo (el receptor)"""
+        self._push.send_multipart([(clase or "").encode(), mensaje])
+        self.enviados += 1
+
+    def resumen(self):
+        if self.pool_local is not None:
+            return self.pool_local.resumen()
+        return {
+            'procesos_vivos': sum(1 for p in self.procesos if p.is_alive()),
+            'enviados': self.enviados
+        }
+
+    def cerrar(self):
+        """Termina los procesos hijos, cierra el PUSH y borra el archivo ipc"""
+        for proceso in self.procesos:
+            proceso.terminate()
+        for proceso in self.procesos:
+            proceso.join()
+        if self._push is not None:
+            self._push.close(linger=0)
+        try:
+            os.unlink(self.endpoint[len("ipc://"):])
+        except FileNotFoundError:
+            pass
+
+    def _proceso_trabajador(self, indice):
+        """Cuerpo de cada proceso hijo: PULL -> pool de hilos local"""
+        min_hilos, max_hilos = self.hilos_por_proceso
+        self.pool_local = PoolAutoescalable(f"{self.nombre}-p{indice}", self.procesar,
+                                            min_hilos=min_hilos, max_hilos=max_hilos,
+                                            prioridades=self.prioridades)
+        if self.preparar:
+            self.pool_local.latencia_ga = self.preparar() or self.pool_local.latencia_ga
+
+        context = zmq.Context()
+        pull = context.socket(zmq.PULL)
+        pull.connect(self.endpoint)
+
+        self.pool_local.iniciar()
+        logging.info(f"[PROCESO-{indice}] Atendiendo {self.endpoint} (pid {os.getpid()})")
+
+        while True:
+            try:
+                clase, mensaje = pull.recv_multipart()
+                self.pool_local.enviar(mensaje, clase.decode() or None)
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                logging.error(f"[PROCESO-{indice}] Error: {e}")
@@ -0,0 +1,185 @@
+"""
+PoolTrabajadores.py
+Pool de hilos trabajadores que crece y se reduce entre MIN_HILOS y MAX_HILOS
+según la profundidad de la cola, el tiempo de espera en cola y la latencia
+del GA. Los trabajadores ociosos se retiran solos y cada decisión de
+escalado se registra en el log y en escalado_<nombre>.csv.
+
+La cola es la ColaPrioridad del Gestor de Carga (ControlTrafico.py), por
+clase (operación) con pesos y envejecimiento, y el resumen incluye la espera
+media, p99 y máxima de cada clase.
+"""
+
+import csv
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from ControlTrafico import ColaPrioridadBloqueante
+
+MIN_HILOS = 2
+MAX_HILOS = 32
+INTERVALO_ESCALADO = 2.0   # segundos entre decisiones
+TIEMPO_INACTIVO = 10.0     # segundos sin trabajo antes de retirar un hilo
+UMBRAL_ESPERA_MS = 50      # espera en cola a partir de la cual se crece
+ALFA = 0.2                 # peso de la última muestra en las EWMA
+
+
+class PoolAutoescalable:
+    def __init__(self, nombre, procesar, min_hilos=MIN_HILOS, max_hilos=MAX_HILOS,
+                 latencia_ga=None, archivo_metricas=None, prioridades=None):
+        """
+        procesar(peticion, id_trabajador) atiende una petición.
+        latencia_ga() devuelve la latencia actual del GA en ms (o None).
+        prioridades: peso por clase de petición (ver enviar); por defecto
+        PRIORIDADES_POR_DEFECTO de ControlTrafico.py.
+        """
+        self.nombre = nombre
+        self.procesar = procesar
+        self.min_hilos = min_hilos
+        self.max_hilos = max_hilos
+        self.latencia_ga = latencia_ga or (lambda: None)
+        self.archivo_metricas = archivo_metricas or f"escalado_{nombre}.csv"
+
+        self.cola = ColaPrioridadBloqueante(prioridades)
+        self._lock = threading.Lock()
+        self._lock_metricas = threading.Lock()
+        self._ids = 0
+        self.hilos = 0
+
+        # Métricas (EWMA en ms)
+        self.espera_ms = 0.0
+        self.servicio_ms = 0.0
+        self.llegadas = 0
+        self.procesadas = 0
+
+    def iniciar(self):
+        for _ in range(self.min_hilos):
+            self._agregar_hilo()
+        threading.Thread(target=self._monitor, daemon=True).start()
+        logging.info(f"[POOL-{self.nombre}] Iniciado con {self.hilos} hilos (min={self.min_hilos}, max={self.max_hilos})")
+
+    def enviar(self, peticion, clase=None):
+        with self._lock:
+            self.llegadas += 1
+        self.cola.put(peticion, clase)
+
+    def resumen(self):
+        return {
+            'hilos': self.hilos,
+            'cola': self.cola.qsize(),
+            'espera_ms': round(self.espera_ms, 2),
+            'servicio_ms': round(self.servicio_ms, 2),
+            'latencia_ga_ms': self.latencia_ga(),
+            'procesadas': self.procesadas,
+            'espera_por_clase': self.cola.esperas_por_clase()
+        }
+
+    def _agregar_hilo(self):
+        with self._lock:
+            if self.hilos >= self.max_hilos:
+                return False
+            self.hilos += 1
+            self._ids += 1
+            id_trabajador = self._ids
+        threading.Thread(target=self._trabajador, args=(id_trabajador,), daemon=True).start()
+        return True
+
+    def _trabajador(self, id_trabajador):
+        logging.info(f"[TRABAJADOR-{id_trabajador}] Iniciado")
+
+        while True:
+            try:
+                encolado, peticion = self.cola.get(timeout=TIEMPO_INACTIVO)
+            except queue.Empty:
+                # Ocioso: retirarse si sobra capacidad
+                with self._lock:
+                    antes = self.hilos
+                    retirar = antes > self.min_hilos
+                    if retirar:
+                        self.hilos -= 1
+                if retirar:
+                    self._registrar_decision("retirar_ocioso", antes, antes - 1, self.cola.qsize(), self.latencia_ga())
+                    return
+                continue
+
+            inicio = time.monotonic()
+            espera = (inicio - encolado) * 1000
+            try:
+                self.procesar(peticion, id_trabajador)
+            except Exception as e:
+                logging.error(f"[T-{id_trabajador}] Error: {e}")
+            finally:
+                servicio = (time.monotonic() - inicio) * 1000
+                with self._lock:
+                    self.espera_ms = (1 - ALFA) * self.espera_ms + ALFA * espera
+                    self.servicio_ms = (1 - ALFA) * self.servicio_ms + ALFA * servicio
+                    self.procesadas += 1
+
+    def _objetivo(self, profundidad, llegadas_por_s):
+        """
+        Hilos necesarios por la ley de Little (llegadas × tiempo de servicio)
+        más los necesarios para vaciar la cola acumulada en un intervalo.
+        Si el GA está saturado (su latencia explica casi todo el servicio
+        y sigue creciendo), más hilos solo alargarían su cola: no se crece.
+        """
+        servicio_s = max(self.servicio_ms, 1.0) / 1000
+        necesarios = llegadas_por_s * servicio_s
+        if profundidad and self.espera_ms > UMBRAL_ESPERA_MS:
+            necesarios += profundidad * servicio_s / INTERVALO_ESCALADO
+        return max(self.min_hilos, min(self.max_hilos, int(necesarios * 1.2) + 1))
+
+    def _monitor(self):
+        llegadas_previas = 0
+        latencia_previa = None
+
+        while True:
+            time.sleep(INTERVALO_ESCALADO)
+            try:
+                with self._lock:
+                    llegadas = self.llegadas - llegadas_previas
+                    llegadas_previas = self.llegadas
+
+                profundidad = self.cola.qsize()
+                latencia = self.latencia_ga()
+                objetivo = self._objetivo(profundidad, llegadas / INTERVALO_ESCALADO)
+                antes = self.hilos
+
+                ga_saturado = (latencia is not None and latencia_previa is not None
+                               and latencia > 2 * latencia_previa and latencia > 0.8 * self.servicio_ms)
+                latencia_previa = latencia
+
+                if objetivo > antes and not ga_saturado:
+                    for _ in range(objetivo - antes):
+                        if not self._agregar_hilo():
+                            break
+                    self._registrar_decision("crecer", antes, self.hilos, profundidad, latencia)
+                elif objetivo > antes and ga_saturado:
+                    self._registrar_decision("retener_ga_saturado", antes, antes, profundidad, latencia)
+                # Reducir lo hacen los propios hilos al quedar ociosos (TIEMPO_INACTIVO)
+            except Exception as e:
+                logging.error(f"[POOL-{self.nombre}] Error en monitor: {e}")
+
+    def _registrar_decision(self, decision, antes, despues, profundidad, latencia):
+        logging.info(f"📈 [POOL-{self.nombre}] {decision}: {antes} -> {despues} hilos "
+                     f"(cola={profundidad}, espera={self.espera_ms:.1f}ms, "
+                     f"servicio={self.servicio_ms:.1f}ms, latencia_ga={latencia})")
+        try:
+            with self._lock_metricas:
+                self._escribir_decision(decision, antes, despues, profundidad, latencia)
+        except Exception as e:
+            logging.error(f"[POOL-{self.nombre}] Error guardando métrica de escalado: {e}")
+
+    def _escribir_decision(self, decision, antes, despues, profundidad, latencia):
+        nuevo = not os.path.exists(self.archivo_metricas)
+        with open(self.archivo_metricas, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if nuevo:
+                writer.writerow(['timestamp', 'decision', 'hilos_antes', 'hilos_despues', 'cola',
+                                 'espera_ms', 'servicio_ms', 'latencia_ga_ms'])
+            writer.writerow([datetime.now().isoformat(), decision, antes, despues, profundidad,
+                             f"{self.espera_ms:.2f}", f"{self.servicio_ms:.2f}",
+                             f"{latencia:.2f}" if latencia is not None else ""])
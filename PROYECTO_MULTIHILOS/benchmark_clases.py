@@ -0,0 +1,138 @@
+"""
+benchmark_clases.py
+Mide lo que cuesta por mensaje el manejo de LibroUsuario en los bucles
+calientes del actor y del GA, comparando la versión anterior (clase con
+__dict__, fechas por defecto calculadas en __init__, paso por dict en
+from_dict/to_dict) con la actual (__slots__, fechas perezosas y codec que
+lee/escribe los objetos directamente):
+
+- actor: decodificar la publicación del GC, armar la petición al GA y
+  codificarla (Manejadores.manejar_prestamo).
+- GA: decodificar la petición del actor hasta tener el LibroUsuario.
+
+Para cada caso: µs por mensaje, pico de memoria asignada durante un mensaje
+y bytes retenidos por cada LibroUsuario vivo (lotes, cachés).
+
+Uso: python benchmark_clases.py [mensajes]
+"""
+
+import json
+import sys
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+from Clases import LibroUsuario, codificar_mensaje, decodificar_mensaje, mensaje_json
+
+
+class LibroUsuarioAnterior:
+    """LibroUsuario tal como era antes de __slots__ y las fechas perezosas"""
+
+    def __init__(self, codigo, titulo="", autor="", fecha_prestamo=None, fecha_devolucion=None):
+        self.codigo = codigo
+        self.titulo = titulo
+        self.autor = autor
+        self.fecha_prestamo = fecha_prestamo or datetime.now().isoformat()
+        self.fecha_devolucion = fecha_devolucion or (datetime.now() + timedelta(weeks=2)).isoformat()
+
+    def to_dict(self):
+        return {
+            'codigo': self.codigo,
+            'titulo': self.titulo,
+            'autor': self.autor,
+            'fecha_prestamo': self.fecha_prestamo,
+            'fecha_devolucion': self.fecha_devolucion
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            codigo=data['codigo'],
+            titulo=data.get('titulo', ''),
+            autor=data.get('autor', ''),
+            fecha_prestamo=data.get('fecha_prestamo'),
+            fecha_devolucion=data.get('fecha_devolucion')
+        )
+
+
+def publicacion(binario):
+    """Carga de una publicación de préstamo del GC"""
+    ahora = time.time()
+    data = {
+        "operacion": "prestamo",
+        "libro_usuario": LibroUsuario("LIB0003", "El amor en los tiempos del cólera",
+                                      "Gabriel García Márquez").to_dict(),
+        "sede": "SedeA",
+        "timestamp": ahora,
+        "deadline": ahora + 3600,
+        "correlation_id": "9f1c2e4b7a0d4c55b1f8e2a3c6d7e8f9"
+    }
+    return codificar_mensaje(data) if binario else json.dumps(data).encode("utf-8")
+
+
+def actor_anterior(cuerpo, binario):
+    data = decodificar_mensaje(cuerpo)
+    libro_usuario = LibroUsuarioAnterior.from_dict(data.get("libro_usuario", {}))
+    mensaje = {"operacion": "verificar_disponibilidad", "libro_usuario": libro_usuario.to_dict(),
+               "deadline": data.get("deadline")}
+    return codificar_mensaje(mensaje) if binario else json.dumps(mensaje).encode("utf-8")
+
+
+def actor_actual(cuerpo, binario):
+    data = decodificar_mensaje(cuerpo, objetos=True)
+    mensaje = {"operacion": "verificar_disponibilidad", "libro_usuario": data["libro_usuario"],
+               "deadline": data.get("deadline")}
+    return codificar_mensaje(mensaje) if binario else mensaje_json(mensaje).encode("utf-8")
+
+
+def ga_anterior(cuerpo, binario):
+    return LibroUsuarioAnterior.from_dict(decodificar_mensaje(cuerpo).get("libro_usuario", {}))
+
+
+def ga_actual(cuerpo, binario):
+    return decodificar_mensaje(cuerpo, objetos=True)["libro_usuario"]
+
+
+def medir(funcion, cuerpo, binario, mensajes):
+    tiempo = min(timeit.repeat(lambda: funcion(cuerpo, binario), number=mensajes, repeat=3))
+
+    tracemalloc.start()
+    picos = 0
+    for _ in range(200):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        funcion(cuerpo, binario)
+        picos += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return tiempo / mensajes * 1e6, picos / 200
+
+
+def retenido_por_objeto(funcion, cuerpo, binario, n=5000):
+    """Bytes que ocupa cada LibroUsuario decodificado mientras sigue vivo"""
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    vivos = [funcion(cuerpo, binario) for _ in range(n)]
+    retenido = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del vivos
+    return retenido / n
+
+
+if __name__ == "__main__":
+    mensajes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(f"{'bucle':<6} {'formato':<8} | {'antes µs':>9} | {'ahora µs':>9} | "
+          f"{'pico antes B':>12} | {'pico ahora B':>12}")
+    for binario in (True, False):
+        cuerpo = publicacion(binario)
+        formato = "binario" if binario else "json"
+        for nombre, anterior, actual in (("actor", actor_anterior, actor_actual), ("GA", ga_anterior, ga_actual)):
+            us_antes, pico_antes = medir(anterior, cuerpo, binario, mensajes)
+            us_ahora, pico_ahora = medir(actual, cuerpo, binario, mensajes)
+            print(f"{nombre:<6} {formato:<8} | {us_antes:>9.2f} | {us_ahora:>9.2f} | "
+                  f"{pico_antes:>12.0f} | {pico_ahora:>12.0f}")
+
+    cuerpo = publicacion(True)
+    print(f"\nBytes retenidos por LibroUsuario vivo: antes {retenido_por_objeto(ga_anterior, cuerpo, True):.0f}, "
+          f"ahora {retenido_por_objeto(ga_actual, cuerpo, True):.0f}")
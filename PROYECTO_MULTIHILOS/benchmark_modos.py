@@ -0,0 +1,182 @@
+"""
+benchmark_modos.py
+Compara el actor en modo hilos (PoolAutoescalable, un GIL) con el modo
+procesos (PoolProcesos) restringiendo el benchmark a 4, 8 y 16 núcleos
+con sched_setaffinity. El trabajo por mensaje es el de ActorRenovacion:
+decodificar JSON, LibroUsuario.from_dict, aritmética de fechas, logging
+y una petición al GA (un GA de prueba que responde al instante).
+
+Uso: python benchmark_modos.py [mensajes] [--nucleos 4 8 16]
+Los núcleos que la máquina no tenga se omiten. Resultados en
+benchmark_modos.csv.
+"""
+
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import zmq
+
+from Clases import LibroUsuario
+from ClienteGA import ClienteGA
+from PoolProcesos import PoolProcesos
+from PoolTrabajadores import PoolAutoescalable
+
+PUERTO_GA = 5657
+GESTORES = [{"ip": "127.0.0.1", "puerto": PUERTO_GA, "nombre": "GA-Prueba", "sede": "SedeA"}]
+ENDPOINT_FIN = f"ipc:///tmp/benchmark-modos-{os.getpid()}.ipc"
+HILOS = 16
+ESPERA_CIERRE = 10  # segundos para que cada medición termine sola
+ARCHIVO_RESULTADOS = "benchmark_modos.csv"
+
+# Estado por proceso: en modo procesos preparar() lo recrea tras el fork
+context = zmq.Context()
+cliente_ga = None
+locales = threading.local()
+
+
+def ga_de_prueba():
+    """GA mínimo: responde OK a cada petición ROUTER"""
+    ctx = zmq.Context()
+    router = ctx.socket(zmq.ROUTER)
+    router.bind(f"tcp://127.0.0.1:{PUERTO_GA}")
+    respuesta = json.dumps({"exito": True, "mensaje": "Renovación registrada"}).encode()
+    while True:
+        identidad, request_id, _, _ = router.recv_multipart()
+        router.send_multipart([identidad, request_id, b"", respuesta])
+
+
+def preparar():
+    global context, cliente_ga, locales
+    context = zmq.Context()
+    cliente_ga = ClienteGA(context, GESTORES)
+    locales = threading.local()
+    return cliente_ga.latencia_ms
+
+
+def procesar_mensaje(mensaje, id_trabajador):
+    """Mismo trabajo que ActorRenovacion por mensaje"""
+    _, json_data = mensaje.split(b" ", 1)
+    data = json.loads(json_data)
+    libro_usuario = LibroUsuario.from_dict(data.get("libro_usuario", {}))
+
+    fecha_actual = datetime.fromisoformat(libro_usuario.fecha_devolucion)
+    libro_usuario.fecha_devolucion = (fecha_actual + timedelta(weeks=1)).isoformat()
+
+    mensaje_ga = {"operacion": "renovacion", "libro_usuario": libro_usuario.to_dict()}
+    respuesta, _ = cliente_ga.solicitar_con_failover(mensaje_ga, 0)
+    logging.info(f"[T-{id_trabajador}] ✓ Renovación procesada: {libro_usuario.codigo}")
+
+    if not hasattr(locales, "fin"):
+        locales.fin = context.socket(zmq.PUSH)
+        locales.fin.connect(ENDPOINT_FIN)
+    locales.fin.send(b"1" if respuesta else b"0")
+
+
+def generar_mensajes(n):
+    ahora = datetime.now()
+    for i in range(n):
+        libro = LibroUsuario(f"L{i % 1000:04d}", f"Libro {i}", "Autor", ahora.isoformat(),
+                             (ahora + timedelta(weeks=2)).isoformat())
+        yield ("renovacion.SedeA " + json.dumps({"operacion": "renovacion", "sede": "SedeA",
+                                                 "libro_usuario": libro.to_dict()})).encode("utf-8")
+
+
+def medir(modo, nucleos, mensajes):
+    """Lanza el modo en un proceso aparte limitado a `nucleos` CPUs"""
+    cola = multiprocessing.get_context("fork").Queue()
+    proceso = multiprocessing.get_context("fork").Process(target=_ejecutar, args=(modo, nucleos, mensajes, cola))
+    proceso.start()
+    resultado = cola.get()
+    # _ejecutar detiene sus procesos y cierra sus sockets antes de salir;
+    # terminate() solo si se quedó colgado
+    proceso.join(ESPERA_CIERRE)
+    if proceso.is_alive():
+        proceso.terminate()
+        proceso.join()
+    return resultado
+
+
+def _ejecutar(modo, nucleos, mensajes, cola):
+    os.sched_setaffinity(0, range(nucleos))
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"), force=True)
+
+    ctx = zmq.Context()
+    fin = ctx.socket(zmq.PULL)
+    fin.bind(ENDPOINT_FIN)
+
+    if modo == "procesos":
+        pool = PoolProcesos("bench", procesar_mensaje, preparar=preparar, num_procesos=nucleos,
+                            hilos_por_proceso=(HILOS // nucleos + 1, HILOS // nucleos + 1))
+        pool.iniciar(ctx)
+        time.sleep(0.5)  # dar tiempo a que los procesos conecten su PULL
+    else:
+        latencia = preparar()
+        pool = PoolAutoescalable("bench", procesar_mensaje, min_hilos=HILOS, max_hilos=HILOS,
+                                 latencia_ga=latencia, archivo_metricas=os.devnull)
+        pool.iniciar()
+
+    lote = list(generar_mensajes(mensajes))
+    inicio = time.time()
+    for mensaje in lote:
+        pool.enviar(mensaje)
+
+    ok = 0
+    for _ in range(mensajes):
+        if not fin.poll(10000):
+            break
+        ok += fin.recv() == b"1"
+    segundos = time.time() - inicio
+    cola.put({"modo": modo, "nucleos": nucleos, "mensajes": mensajes, "ok": ok,
+              "segundos": round(segundos, 3), "mensajes_por_s": round(ok / segundos, 1)})
+
+    # Sin esto los procesos del pool quedan huérfanos con stdout abierto
+    # (un "| tail" no termina nunca) y los .ipc se quedan en /tmp
+    if modo == "procesos":
+        pool.cerrar()
+    fin.close(linger=0)
+    ctx.term()
+    try:
+        os.unlink(ENDPOINT_FIN[len("ipc://"):])
+    except FileNotFoundError:
+        pass
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    nucleos = [4, 8, 16]
+    if "--nucleos" in argumentos:
+        i = argumentos.index("--nucleos")
+        nucleos = [int(n) for n in argumentos[i + 1:]]
+        argumentos = argumentos[:i]
+    mensajes = int(argumentos[0]) if argumentos else 5000
+
+    disponibles = len(os.sched_getaffinity(0))
+    ga = multiprocessing.get_context("fork").Process(target=ga_de_prueba, daemon=True)
+    ga.start()
+    time.sleep(0.3)
+
+    resultados = []
+    for n in nucleos:
+        if n > disponibles:
+            print(f"⚠ {n} núcleos: omitido (esta máquina tiene {disponibles})")
+            continue
+        for modo in ("hilos", "procesos"):
+            r = medir(modo, n, mensajes)
+            resultados.append(r)
+            print(f"{modo:>9} | {n:>2} núcleos | {r['ok']}/{mensajes} ok | "
+                  f"{r['segundos']:>7.3f} s | {r['mensajes_por_s']:>9.1f} msg/s")
+
+    ga.kill()
+    if resultados:
+        with open(ARCHIVO_RESULTADOS, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(resultados[0].keys()))
+            writer.writeheader()
+            writer.writerows(resultados)
+        print(f"Resultados guardados en {ARCHIVO_RESULTADOS}")
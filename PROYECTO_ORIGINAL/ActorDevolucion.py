@@ -7,7 +7,11 @@ import zmq
 import json
 import logging
 import time
-from clases import LibroUsuario
+import sys
+from datetime import datetime
+from clases import decodificar_mensaje
+from FailoverGA import ClienteFailover
+from Lotes import AcumuladorLotes
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] Actor_Devolucion: %(message)s")
 
@@ -17,86 +21,87 @@ context = zmq.Context()
 sub_socket = context.socket(zmq.SUB)
 #sub_socket.connect("tcp://10.43.102.40:5556")
 sub_socket.connect("tcp://localhost:5556")
-sub_socket.setsockopt_string(zmq.SUBSCRIBE, "devolucion")
-logging.info("Suscrito al tópico 'devolucion'")
+# Sede local opcional: el actor solo atiende las operaciones de esa sede
+SEDE_LOCAL = sys.argv[1] if len(sys.argv) > 1 else None
+TOPICO = f"devolucion.{SEDE_LOCAL}" if SEDE_LOCAL else "devolucion"
+sub_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICO)
+logging.info(f"Suscrito al tópico '{TOPICO}'")
 
 # Configuración de GAs (ambas sedes)
 GESTORES = [
-    #{"ip": "10.43.102.40", "puerto": 5557, "nombre": "GA-SedeA"},
-   # {"ip": "10.43.102.41", "puerto": 5559, "nombre": "GA-SedeB"}
-   {"ip": "localhost", "puerto": 5557, "nombre": "GA-SedeA"},
-    {"ip": "localhost", "puerto": 5559, "nombre": "GA-SedeB"}
+    #{"ip": "10.43.102.40", "puerto": 5557, "nombre": "GA-SedeA", "sede": "SedeA", "puerto_heartbeat": 5558},
+   # {"ip": "10.43.102.41", "puerto": 5559, "nombre": "GA-SedeB", "sede": "SedeB", "puerto_heartbeat": 5560}
+   {"ip": "localhost", "puerto": 5557, "nombre": "GA-SedeA", "sede": "SedeA", "puerto_heartbeat": 5558},
+    {"ip": "localhost", "puerto": 5559, "nombre": "GA-SedeB", "sede": "SedeB", "puerto_heartbeat": 5560}
 ]
 
-gestor_actual = 0
-req_sockets = []
-
-# Crear sockets REQ para cada GA
+# Cliente Lazy Pirate compartido por los actores (ver FailoverGA.py)
+cliente_ga = ClienteFailover(context, GESTORES)
 for ga in GESTORES:
-    sock = context.socket(zmq.REQ)
-    sock.connect(f"tcp://{ga['ip']}:{ga['puerto']}")
-    sock.setsockopt(zmq.RCVTIMEO, 5000)  # Timeout 5 segundos
-    req_sockets.append(sock)
     logging.info(f"Conectado a {ga['nombre']} en tcp://{ga['ip']}:{ga['puerto']}")
 
-def enviar_con_failover(mensaje_ga):
-    """Intenta enviar a GA primario, si falla usa el secundario"""
-    global gestor_actual
-    
-    intentos = len(GESTORES)
-    
-    for _ in range(intentos):
-        try:
-            logging.info(f"Intentando con {GESTORES[gestor_actual]['nombre']}")
-            
-            req_sockets[gestor_actual].send_string(json.dumps(mensaje_ga))
-            respuesta = req_sockets[gestor_actual].recv_string()
-            
-            logging.info(f"Respuesta de {GESTORES[gestor_actual]['nombre']}: {respuesta}")
-            return respuesta
-            
-        except zmq.Again:
-            logging.warning(f"{GESTORES[gestor_actual]['nombre']} no responde, cambiando a failover")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)
-            
-        except Exception as e:
-            logging.error(f"Error con {GESTORES[gestor_actual]['nombre']}: {e}")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)
-    
-    logging.error("Todos los gestores fallaron")
-    return None
+def guardar_operacion_fallida(libro_usuario, motivo):
+    """Guarda devoluciones que no pudieron procesarse para reintentar después"""
+    try:
+        with open("devoluciones_fallidas.log", "a", encoding="utf-8") as f:
+            log_entry = {
+                "timestamp": datetime.now().isoformat(),
+                "libro_usuario": libro_usuario.to_dict(),
+                "motivo": motivo
+            }
+            f.write(json.dumps(log_entry) + "\n")
+    except Exception as e:
+        logging.error(f"Error guardando devolución fallida: {e}")
+
+def enviar_lote(sede, lote):
+    """Envía un lote de devoluciones al GA"""
+    mensaje_ga = {
+        "operacion": "devolucion_lote",
+        "libros_usuario": lote
+    }
+
+    respuesta = cliente_ga.enviar_con_failover(mensaje_ga, sede)
+
+    if not respuesta:
+        logging.error(f"Fallo al procesar lote de {len(lote)} devoluciones; guardadas en devoluciones_fallidas.log")
+        for libro_usuario in lote:
+            guardar_operacion_fallida(libro_usuario, "Sin respuesta de ningún GA")
+        return
+
+    resp_data = json.loads(respuesta)
+    logging.info(f"Lote procesado: {resp_data.get('mensaje')}")
+    rechazos = {r.get("codigo"): r.get("mensaje") for r in resp_data.get("resultados", []) if not r.get("exito")}
+    for libro_usuario in lote:
+        if libro_usuario.codigo in rechazos:
+            logging.warning(f"Devolución rechazada {libro_usuario.codigo}: {rechazos[libro_usuario.codigo]}")
+            guardar_operacion_fallida(libro_usuario, rechazos[libro_usuario.codigo])
 
 if __name__ == "__main__":
     logging.info("Actor de Devolución iniciado con tolerancia a fallos")
 
+    # Las devoluciones se agrupan por sede y se envían en lotes al GA
+    lotes = AcumuladorLotes()
+
     while True:
         try:
-            mensaje = sub_socket.recv_string()
-            parts = mensaje.split(" ", 1)
+            for sede, lote in lotes.listos():
+                enviar_lote(sede, lote)
+
+            if not sub_socket.poll(lotes.espera_ms(1000)):
+                continue
+            mensaje = sub_socket.recv()
+            parts = mensaje.split(b" ", 1)
             if len(parts) < 2:
                 continue
 
-            topico, json_data = parts
-            data = json.loads(json_data)
-
-            libro_usuario_dict = data.get("libro_usuario", {})
-            libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
+            # El GC publica en JSON o en el codec binario de clases.py
+            topico, cuerpo = parts
+            data = decodificar_mensaje(cuerpo, objetos=True)
+            libro_usuario = data["libro_usuario"]
 
             logging.info(f"Procesando devolución: {libro_usuario.codigo}")
 
-            mensaje_ga = {
-                "operacion": "devolucion",
-                "libro_usuario": libro_usuario.to_dict()
-            }
-
-            respuesta = enviar_con_failover(mensaje_ga)
-            
-            if respuesta:
-                logging.info("Devolución procesada exitosamente")
-            else:
-                logging.error("Fallo al procesar devolución")
+            lotes.agregar(data.get("sede"), libro_usuario)
 
         except Exception as e:
             logging.error(f"Error: {e}")
\ No newline at end of file
@@ -9,7 +9,10 @@ import zmq
 import json
 import logging
 import time
-from clases import LibroUsuario
+import sys
+from clases import decodificar_mensaje
+from FailoverGA import ClienteFailover
+from CacheDisponibilidad import CacheDisponibilidad
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] Actor_Prestamo: %(message)s")
 
@@ -19,68 +22,36 @@ context = zmq.Context()
 sub_socket = context.socket(zmq.SUB)
 #sub_socket.connect("tcp://10.43.102.40:5556")  # Cambiar según IP del GC
 sub_socket.connect("tcp://localhost:5556")
-sub_socket.setsockopt_string(zmq.SUBSCRIBE, "prestamo")
-logging.info("Suscrito al tópico 'prestamo'")
+# Sede local opcional: el actor solo atiende las operaciones de esa sede
+SEDE_LOCAL = sys.argv[1] if len(sys.argv) > 1 else None
+TOPICO = f"prestamo.{SEDE_LOCAL}" if SEDE_LOCAL else "prestamo"
+sub_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICO)
+logging.info(f"Suscrito al tópico '{TOPICO}'")
+
+# Socket PUSH para reportar al GC el resultado real de cada préstamo
+resultados_socket = context.socket(zmq.PUSH)
+#resultados_socket.connect("tcp://10.43.102.40:5561")  # Cambiar según IP del GC
+resultados_socket.connect("tcp://localhost:5561")
 
 # Configuración de GAs (ambas sedes)
 GESTORES = [
-    #{"ip": "10.43.102.40", "puerto": 5557, "nombre": "GA-SedeA"},
-   # {"ip": "10.43.102.41", "puerto": 5559, "nombre": "GA-SedeB"}
-   {"ip": "localhost", "puerto": 5557, "nombre": "GA-SedeA"},
-    {"ip": "localhost", "puerto": 5559, "nombre": "GA-SedeB"}
+    #{"ip": "10.43.102.40", "puerto": 5557, "nombre": "GA-SedeA", "sede": "SedeA", "puerto_heartbeat": 5558, "puerto_cambios": 5562},
+   # {"ip": "10.43.102.41", "puerto": 5559, "nombre": "GA-SedeB", "sede": "SedeB", "puerto_heartbeat": 5560, "puerto_cambios": 5563}
+   {"ip": "localhost", "puerto": 5557, "nombre": "GA-SedeA", "sede": "SedeA", "puerto_heartbeat": 5558, "puerto_cambios": 5562},
+    {"ip": "localhost", "puerto": 5559, "nombre": "GA-SedeB", "sede": "SedeB", "puerto_heartbeat": 5560, "puerto_cambios": 5563}
 ]
 
-gestor_actual = 0
-req_sockets = []
+# Cubrir (hedging) las verificaciones de disponibilidad con el segundo GA
+COBERTURA_DISPONIBILIDAD = True
+
+# Caché de disponibilidad alimentada por el feed de cambios de los GA
+cache_disponibilidad = CacheDisponibilidad(context, GESTORES)
 
-# Crear sockets REQ para cada GA
+# Cliente Lazy Pirate compartido por los actores (ver FailoverGA.py)
+cliente_ga = ClienteFailover(context, GESTORES)
 for ga in GESTORES:
-    sock = context.socket(zmq.REQ)
-    sock.connect(f"tcp://{ga['ip']}:{ga['puerto']}")
-    sock.setsockopt(zmq.RCVTIMEO, 5000)  # Timeout 5 segundos
-    req_sockets.append(sock)
     logging.info(f"Conectado a {ga['nombre']} en tcp://{ga['ip']}:{ga['puerto']}")
 
-def enviar_con_failover(mensaje_ga):
-    """
-    Intenta enviar a GA primario, si falla usa el secundario.
-    Implementa failover automático con reintentos.
-    """
-    global gestor_actual
-    
-    intentos = len(GESTORES)
-    
-    for intento in range(intentos):
-        try:
-            logging.info(f"Intento {intento + 1}/{intentos} con {GESTORES[gestor_actual]['nombre']}")
-            
-            # Enviar mensaje
-            req_sockets[gestor_actual].send_string(json.dumps(mensaje_ga))
-            
-            # Esperar respuesta con timeout
-            respuesta = req_sockets[gestor_actual].recv_string()
-            
-            logging.info(f"✓ Respuesta de {GESTORES[gestor_actual]['nombre']}: {respuesta}")
-            return respuesta
-            
-        except zmq.Again:
-            logging.warning(f"✗ {GESTORES[gestor_actual]['nombre']} no responde (timeout), cambiando a failover...")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)
-            
-        except zmq.ZMQError as e:
-            logging.error(f"✗ Error ZMQ con {GESTORES[gestor_actual]['nombre']}: {e}")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)
-            
-        except Exception as e:
-            logging.error(f"✗ Error general con {GESTORES[gestor_actual]['nombre']}: {e}")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)
-    
-    logging.error("✗✗✗ FALLO TOTAL: Todos los gestores de almacenamiento no responden")
-    return None
-
 def guardar_operacion_fallida(libro_usuario, tipo_operacion):
     """Guarda operaciones que no pudieron procesarse"""
     try:
@@ -95,6 +66,35 @@ def guardar_operacion_fallida(libro_usuario, tipo_operacion):
     except Exception as e:
         logging.error(f"Error guardando operación fallida: {e}")
 
+# Préstamos descartados porque el PS ya dejó de esperarlos
+metricas = {'vencidas_descartadas': 0}
+
+def vencida(data):
+    """True si pasó el deadline fijado por el PS (los mensajes sin deadline no vencen)"""
+    deadline = data.get("deadline")
+    return deadline is not None and time.time() > deadline
+
+def descartar_vencida(data, libro_usuario):
+    metricas['vencidas_descartadas'] += 1
+    logging.warning(f"⌛ Préstamo vencido descartado: {libro_usuario.codigo} "
+                    f"(total: {metricas['vencidas_descartadas']})")
+    reportar_resultado(data, False, "Petición vencida")
+
+def reportar_resultado(data, exito, mensaje):
+    """Reporta al GC el resultado del préstamo si el PS lo espera de forma síncrona"""
+    correlation_id = data.get("correlation_id")
+    if not correlation_id:
+        return
+
+    try:
+        resultados_socket.send_string(json.dumps({
+            "correlation_id": correlation_id,
+            "exito": exito,
+            "mensaje": mensaje
+        }))
+    except Exception as e:
+        logging.error(f"Error reportando resultado al GC: {e}")
+
 if __name__ == "__main__":
     logging.info("=" * 60)
     logging.info("Actor de Préstamo iniciado con TOLERANCIA A FALLOS")
@@ -106,67 +106,104 @@ if __name__ == "__main__":
     while True:
         try:
             # Recibir mensaje del tópico
-            mensaje = sub_socket.recv_string()
-            logging.info(f"📨 Mensaje recibido: {mensaje[:100]}...")
+            mensaje = sub_socket.recv()
+            logging.info(f"📨 Mensaje recibido: {mensaje[:100]!r}...")
 
             # Parsear mensaje
-            parts = mensaje.split(" ", 1)
+            parts = mensaje.split(b" ", 1)
             if len(parts) < 2:
-                logging.warning("⚠ Mensaje malformado (sin JSON)")
+                logging.warning("⚠ Mensaje malformado (sin carga)")
                 continue
 
-            topico, json_data = parts
-            data = json.loads(json_data)
-
-            libro_usuario_dict = data.get("libro_usuario", {})
-            libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
+            # El GC publica en JSON o en el codec binario de clases.py
+            topico, cuerpo = parts
+            data = decodificar_mensaje(cuerpo, objetos=True)
+            libro_usuario = data["libro_usuario"]
 
             logging.info(f"📖 Procesando préstamo: [{libro_usuario.codigo}] {libro_usuario.titulo}")
 
+            if vencida(data):
+                descartar_vencida(data, libro_usuario)
+                continue
+
+            # PASO 0: Rechazar sin ir al GA si la caché sabe que está agotado
+            if cache_disponibilidad.agotado(data.get("sede"), libro_usuario.codigo):
+                logging.warning(f"⚠ Libro NO disponible (caché): {libro_usuario.codigo} en {data.get('sede')}")
+                reportar_resultado(data, False, "No hay ejemplares disponibles")
+                continue
+
             # PASO 1: Verificar disponibilidad
             mensaje_verificar = {
                 "operacion": "verificar_disponibilidad",
-                "libro_usuario": libro_usuario.to_dict(),
+                "libro_usuario": libro_usuario,
                 "timestamp": time.time()
             }
+            if data.get("deadline") is not None:
+                mensaje_verificar["deadline"] = data["deadline"]
 
             logging.info("🔍 Verificando disponibilidad...")
-            respuesta_verificar = enviar_con_failover(mensaje_verificar)
+            if COBERTURA_DISPONIBILIDAD:
+                respuesta_verificar = cliente_ga.enviar_con_cobertura(mensaje_verificar, data.get("sede"))
+                metricas_cobertura = cliente_ga.metricas_cobertura
+                if metricas_cobertura['peticiones'] % 100 == 0:
+                    logging.info(f"📊 Coberturas: {metricas_cobertura} | Caché: {cache_disponibilidad.metricas} "
+                                 f"| Vencidas: {metricas['vencidas_descartadas']}")
+            else:
+                respuesta_verificar = cliente_ga.enviar_con_failover(mensaje_verificar, data.get("sede"))
             
             if not respuesta_verificar:
                 logging.error("✗✗✗ FALLO: No se pudo verificar disponibilidad")
                 guardar_operacion_fallida(libro_usuario, "verificar_disponibilidad")
+                reportar_resultado(data, False, "No se pudo verificar disponibilidad")
                 continue
             
             resp_data = json.loads(respuesta_verificar)
+            if resp_data.get("vencida"):
+                descartar_vencida(data, libro_usuario)
+                continue
+            cache_disponibilidad.actualizar(resp_data.get("sede"), libro_usuario.codigo,
+                                            resp_data.get("ejemplares", 0) if resp_data.get("disponible") else 0,
+                                            resp_data.get("timestamp"))
             
             if not resp_data.get("disponible", False):
                 logging.warning(f"⚠ Libro NO disponible: {resp_data.get('mensaje')}")
                 logging.warning(f"⚠ Sede consultada: {resp_data.get('sede', 'desconocida')}")
+                reportar_resultado(data, False, resp_data.get("mensaje", "Libro no disponible"))
                 continue
             
             logging.info(f"✓ Libro DISPONIBLE - Ejemplares: {resp_data.get('ejemplares')} en {resp_data.get('sede')}")
             
-            # PASO 2: Registrar préstamo
+            # PASO 2: Registrar préstamo (si el PS aún lo espera)
+            if vencida(data):
+                descartar_vencida(data, libro_usuario)
+                continue
+
             mensaje_prestamo = {
                 "operacion": "prestamo",
-                "libro_usuario": libro_usuario.to_dict(),
+                "libro_usuario": libro_usuario,
                 "timestamp": time.time()
             }
+            if data.get("deadline") is not None:
+                mensaje_prestamo["deadline"] = data["deadline"]
             
             logging.info("📝 Registrando préstamo...")
-            respuesta_prestamo = enviar_con_failover(mensaje_prestamo)
+            respuesta_prestamo = cliente_ga.enviar_con_failover(mensaje_prestamo, data.get("sede"))
             
             if respuesta_prestamo:
                 resp_prestamo = json.loads(respuesta_prestamo)
+                if resp_prestamo.get("vencida"):
+                    descartar_vencida(data, libro_usuario)
+                    continue
                 if resp_prestamo.get("exito"):
                     logging.info(f"✓✓✓ Préstamo registrado exitosamente: {resp_prestamo.get('mensaje')}")
                 else:
                     logging.warning(f"⚠ Préstamo rechazado: {resp_prestamo.get('mensaje')}")
                     guardar_operacion_fallida(libro_usuario, "prestamo")
+                reportar_resultado(data, resp_prestamo.get("exito", False), resp_prestamo.get("mensaje", ""))
             else:
                 logging.error("✗✗✗ FALLO: No se pudo registrar el préstamo")
                 guardar_operacion_fallida(libro_usuario, "prestamo")
+                reportar_resultado(data, False, "No se pudo registrar el préstamo")
 
         except json.JSONDecodeError as e:
             logging.error(f"✗ Error parseando JSON: {e}")
@@ -9,8 +9,11 @@ import zmq
 import json
 import logging
 import time
+import sys
 from datetime import datetime, timedelta
-from clases import LibroUsuario
+from clases import decodificar_mensaje
+from FailoverGA import ClienteFailover
+from Lotes import AcumuladorLotes
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] Actor_Renovacion: %(message)s")
 
@@ -20,68 +23,25 @@ context = zmq.Context()
 sub_socket = context.socket(zmq.SUB)
 #sub_socket.connect("tcp://10.43.102.40:5556")  # Cambiar según IP del GC
 sub_socket.connect("tcp://localhost:5556")
-sub_socket.setsockopt_string(zmq.SUBSCRIBE, "renovacion")
-logging.info("Suscrito al tópico 'renovacion'")
+# Sede local opcional: el actor solo atiende las operaciones de esa sede
+SEDE_LOCAL = sys.argv[1] if len(sys.argv) > 1 else None
+TOPICO = f"renovacion.{SEDE_LOCAL}" if SEDE_LOCAL else "renovacion"
+sub_socket.setsockopt_string(zmq.SUBSCRIBE, TOPICO)
+logging.info(f"Suscrito al tópico '{TOPICO}'")
 
 # Configuración de GAs (ambas sedes)
 GESTORES = [
-    #{"ip": "10.43.102.40", "puerto": 5557, "nombre": "GA-SedeA"},
-   # {"ip": "10.43.102.41", "puerto": 5559, "nombre": "GA-SedeB"}
-   {"ip": "localhost", "puerto": 5557, "nombre": "GA-SedeA"},
-    {"ip": "localhost", "puerto": 5559, "nombre": "GA-SedeB"}
+    #{"ip": "10.43.102.40", "puerto": 5557, "nombre": "GA-SedeA", "sede": "SedeA", "puerto_heartbeat": 5558},
+   # {"ip": "10.43.102.41", "puerto": 5559, "nombre": "GA-SedeB", "sede": "SedeB", "puerto_heartbeat": 5560}
+   {"ip": "localhost", "puerto": 5557, "nombre": "GA-SedeA", "sede": "SedeA", "puerto_heartbeat": 5558},
+    {"ip": "localhost", "puerto": 5559, "nombre": "GA-SedeB", "sede": "SedeB", "puerto_heartbeat": 5560}
 ]
 
-gestor_actual = 0
-req_sockets = []
-
-# Crear sockets REQ para cada GA
+# Cliente Lazy Pirate compartido por los actores (ver FailoverGA.py)
+cliente_ga = ClienteFailover(context, GESTORES)
 for ga in GESTORES:
-    sock = context.socket(zmq.REQ)
-    sock.connect(f"tcp://{ga['ip']}:{ga['puerto']}")
-    sock.setsockopt(zmq.RCVTIMEO, 5000)  # Timeout 5 segundos
-    req_sockets.append(sock)
     logging.info(f"Conectado a {ga['nombre']} en tcp://{ga['ip']}:{ga['puerto']}")
 
-def enviar_con_failover(mensaje_ga):
-    """
-    Intenta enviar a GA primario, si falla usa el secundario.
-    Implementa failover automático con reintentos.
-    """
-    global gestor_actual
-    
-    intentos = len(GESTORES)
-    
-    for intento in range(intentos):
-        try:
-            logging.info(f"Intento {intento + 1}/{intentos} con {GESTORES[gestor_actual]['nombre']}")
-            
-            # Enviar mensaje
-            req_sockets[gestor_actual].send_string(json.dumps(mensaje_ga))
-            
-            # Esperar respuesta con timeout
-            respuesta = req_sockets[gestor_actual].recv_string()
-            
-            logging.info(f"✓ Respuesta de {GESTORES[gestor_actual]['nombre']}: {respuesta}")
-            return respuesta
-            
-        except zmq.Again:
-            logging.warning(f"✗ {GESTORES[gestor_actual]['nombre']} no responde (timeout), cambiando a failover...")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)  # Espera antes de reintentar
-            
-        except zmq.ZMQError as e:
-            logging.error(f"✗ Error ZMQ con {GESTORES[gestor_actual]['nombre']}: {e}")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)
-            
-        except Exception as e:
-            logging.error(f"✗ Error general con {GESTORES[gestor_actual]['nombre']}: {e}")
-            gestor_actual = (gestor_actual + 1) % len(GESTORES)
-            time.sleep(1)
-    
-    logging.error("✗✗✗ FALLO TOTAL: Todos los gestores de almacenamiento no responden")
-    return None
-
 def guardar_operacion_fallida(libro_usuario, nueva_fecha):
     """Guarda operaciones que no pudieron procesarse para reintentar después"""
     try:
@@ -96,6 +56,30 @@ def guardar_operacion_fallida(libro_usuario, nueva_fecha):
     except Exception as e:
         logging.error(f"Error guardando operación fallida: {e}")
 
+def enviar_lote(sede, lote):
+    """Envía un lote de renovaciones al GA con failover automático"""
+    mensaje_ga = {
+        "operacion": "renovacion_lote",
+        "libros_usuario": lote,
+        "timestamp": time.time()
+    }
+
+    respuesta = cliente_ga.enviar_con_failover(mensaje_ga, sede)
+
+    if not respuesta:
+        logging.error(f"✗✗✗ FALLO: No se pudo procesar el lote de {len(lote)} renovaciones")
+        for libro_usuario in lote:
+            guardar_operacion_fallida(libro_usuario, libro_usuario.fecha_devolucion)
+        return
+
+    resp_data = json.loads(respuesta)
+    logging.info(f"✓✓✓ {resp_data.get('mensaje')}")
+    fallidos = {r['codigo'] for r in resp_data.get("resultados", []) if not r.get("exito")}
+    for libro_usuario in lote:
+        if libro_usuario.codigo in fallidos:
+            logging.warning(f"⚠ Renovación rechazada: {libro_usuario.codigo}")
+            guardar_operacion_fallida(libro_usuario, libro_usuario.fecha_devolucion)
+
 if __name__ == "__main__":
     logging.info("=" * 60)
     logging.info("Actor de Renovación iniciado con TOLERANCIA A FALLOS")
@@ -104,23 +88,30 @@ if __name__ == "__main__":
         logging.info(f"  [{i}] {ga['nombre']} - {ga['ip']}:{ga['puerto']}")
     logging.info("=" * 60)
 
+    # Las renovaciones se agrupan por sede y se envían en lotes al GA
+    lotes = AcumuladorLotes()
+
     while True:
         try:
-            # Recibir mensaje del tópico
-            mensaje = sub_socket.recv_string()
-            logging.info(f"📨 Mensaje recibido: {mensaje[:100]}...")
+            for sede, lote in lotes.listos():
+                enviar_lote(sede, lote)
+
+            # Recibir mensaje del tópico (sin pasar del vencimiento del lote abierto)
+            if not sub_socket.poll(lotes.espera_ms(1000)):
+                continue
+            mensaje = sub_socket.recv()
+            logging.info(f"📨 Mensaje recibido: {mensaje[:100]!r}...")
 
             # Parsear mensaje
-            parts = mensaje.split(" ", 1)
+            parts = mensaje.split(b" ", 1)
             if len(parts) < 2:
-                logging.warning("⚠ Mensaje malformado (sin JSON)")
+                logging.warning("⚠ Mensaje malformado (sin carga)")
                 continue
 
-            topico, json_data = parts
-            data = json.loads(json_data)
-
-            libro_usuario_dict = data.get("libro_usuario", {})
-            libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
+            # El GC publica en JSON o en el codec binario de clases.py
+            topico, cuerpo = parts
+            data = decodificar_mensaje(cuerpo, objetos=True)
+            libro_usuario = data["libro_usuario"]
 
             logging.info(f"📖 Procesando renovación: [{libro_usuario.codigo}] {libro_usuario.titulo}")
 
@@ -136,26 +127,7 @@ if __name__ == "__main__":
             
             logging.info(f"📅 Nueva fecha de devolución: {nueva_fecha}")
 
-            # Preparar mensaje para el GA
-            mensaje_ga = {
-                "operacion": "renovacion",
-                "libro_usuario": libro_usuario.to_dict(),
-                "timestamp": time.time()
-            }
-
-            # Enviar con failover automático
-            respuesta = enviar_con_failover(mensaje_ga)
-            
-            if respuesta:
-                resp_data = json.loads(respuesta)
-                if resp_data.get("exito"):
-                    logging.info(f"✓✓✓ Renovación procesada exitosamente: {resp_data.get('mensaje')}")
-                else:
-                    logging.warning(f"⚠ Renovación rechazada: {resp_data.get('mensaje')}")
-                    guardar_operacion_fallida(libro_usuario, nueva_fecha)
-            else:
-                logging.error("✗✗✗ FALLO: No se pudo procesar la renovación")
-                guardar_operacion_fallida(libro_usuario, nueva_fecha)
+            lotes.agregar(data.get("sede"), libro_usuario)
 
         except json.JSONDecodeError as e:
             logging.error(f"✗ Error parseando JSON: {e}")
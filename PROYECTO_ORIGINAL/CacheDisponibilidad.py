@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+CacheDisponibilidad.py
+Caché LRU acotada de ejemplares disponibles por (sede, código), mantenida
+al día por el feed PUB de cambios de inventario de cada GA. El Actor de
+Préstamo la usa para rechazar sin consultar al GA los libros que se sabe
+que están agotados.
+
+Como PUB/SUB puede perder mensajes, cada entrada caduca a los TTL_ENTRADA
+segundos; una caducada se trata como desconocida y se consulta al GA.
+
+Los cambios del feed y las respuestas de verificar_disponibilidad llegan por
+caminos distintos y pueden cruzarse. Cada entrada guarda el "timestamp" del
+GA (el instante en que leyó o cambió los ejemplares, con su bd_lock tomado) y
+una actualización más vieja que la guardada se ignora.
+"""
+
+import zmq
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRADAS = 10000
+TTL_ENTRADA = 30  # segundos
+
+
+class CacheDisponibilidad:
+    def __init__(self, context, gestores, max_entradas=MAX_ENTRADAS, ttl=TTL_ENTRADA):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # (sede, codigo) -> (ejemplares, instante, timestamp del GA)
+        self._lock = threading.Lock()
+        self.metricas = {'aciertos_agotado': 0, 'consultas': 0, 'cambios_recibidos': 0,
+                         'actualizaciones_viejas': 0}
+
+        self._sub = context.socket(zmq.SUB)
+        self._sub.setsockopt_string(zmq.SUBSCRIBE, "inventario")
+        for ga in gestores:
+            if ga.get('puerto_cambios'):
+                self._sub.connect(f"tcp://{ga['ip']}:{ga['puerto_cambios']}")
+                logging.info(f"Caché suscrita a cambios de {ga['nombre']} en tcp://{ga['ip']}:{ga['puerto_cambios']}")
+        threading.Thread(target=self._escuchar_cambios, daemon=True).start()
+
+    def actualizar(self, sede, codigo, ejemplares, marca_ga=None):
+        """
+        marca_ga: "timestamp" del GA para ese valor. Si es anterior al de la
+        entrada guardada, el valor ya quedó viejo y no se aplica.
+        """
+        if not sede or not codigo:
+            return
+        clave = (sede, codigo)
+        with self._lock:
+            anterior = self._entradas.get(clave)
+            if anterior is not None and marca_ga is not None and anterior[2] is not None and marca_ga < anterior[2]:
+                self.metricas['actualizaciones_viejas'] += 1
+                return
+            self._entradas[clave] = (ejemplares, time.time(), marca_ga)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def ejemplares(self, sede, codigo):
+        """Ejemplares conocidos o None si no hay entrada vigente"""
+        clave = (sede, codigo)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            ejemplares, instante, _ = entrada
+            if time.time() - instante > self.ttl:
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return ejemplares
+
+    def agotado(self, sede, codigo):
+        """True solo si la caché sabe con certeza reciente que no hay ejemplares"""
+        self.metricas['consultas'] += 1
+        if self.ejemplares(sede, codigo) == 0:
+            self.metricas['aciertos_agotado'] += 1
+            return True
+        return False
+
+    def _escuchar_cambios(self):
+        while True:
+            try:
+                _, json_data = self._sub.recv_string().split(" ", 1)
+                cambio = json.loads(json_data)
+                self.actualizar(cambio.get("sede"), cambio.get("codigo"), cambio.get("ejemplares", 0),
+                                cambio.get("timestamp"))
+                self.metricas['cambios_recibidos'] += 1
+            except Exception as e:
+                logging.error(f"Error procesando cambio de inventario: {e}")
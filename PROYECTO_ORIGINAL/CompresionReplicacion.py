@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+CompresionReplicacion.py
+Compresión opcional del canal de replicación entre sedes (GA <-> GA).
+
+Cada mensaje de replicación (una operación o un lote) se comprime como una
+unidad independiente, así que perder uno no afecta a los siguientes. Métodos:
+
+- "ninguna": el JSON tal cual (lo que entienden los GA anteriores).
+- "zlib": deflate sin diccionario.
+- "zlib-dict": deflate con un diccionario compartido armado a partir del
+  catálogo (ARCHIVO_DICCIONARIO): códigos, títulos, autores y las claves JSON
+  de las operaciones, que es casi todo lo que viaja.
+
+Cada GA anuncia en su heartbeat los métodos que acepta y el CRC32 de su
+diccionario; el emisor solo usa "zlib-dict" si el CRC coincide con el suyo.
+Marco en el cable: MAGIA_COMPRESION, método (1 byte), CRC32 del diccionario
+(4 bytes, solo "zlib-dict") y la carga comprimida. Un receptor que no ve la
+magia lo trata como un mensaje normal (JSON o codec binario).
+"""
+
+import json
+import logging
+import struct
+import threading
+import time
+import zlib
+
+from clases import ErrorCodec
+
+MAGIA_COMPRESION = 0xB2
+METODOS = ["ninguna", "zlib", "zlib-dict"]
+METODOS_SOPORTADOS = ["zlib-dict", "zlib", "ninguna"]  # en orden de preferencia
+
+# Catálogo común a ambas sedes del que sale el diccionario
+ARCHIVO_DICCIONARIO = "BD_SedeA.txt"
+TAMANO_DICCIONARIO = 32 * 1024  # deflate solo aprovecha los últimos 32 KB
+NIVEL_ZLIB = 6
+# Por debajo de este tamaño no se intenta comprimir
+MIN_BYTES_COMPRESION = 64
+
+_CRC = struct.Struct("<I")
+
+
+def construir_diccionario(archivo=ARCHIVO_DICCIONARIO):
+    """Diccionario zlib con los libros del catálogo tal como aparecen en el JSON replicado"""
+    fragmentos = []
+    try:
+        with open(archivo, "r", encoding="utf-8") as f:
+            for linea in f:
+                partes = linea.strip().split("|")
+                if len(partes) >= 3:
+                    # json.dumps escapa los acentos igual que al replicar
+                    fragmentos.append(json.dumps({"codigo": partes[0], "titulo": partes[1],
+                                                  "autor": partes[2]})[1:-1])
+    except FileNotFoundError:
+        logging.warning(f"Sin catálogo {archivo}: diccionario solo con la plantilla")
+
+    # Lo más frecuente va al final, donde deflate lo encuentra a menor distancia
+    plantilla = ('{"operacion": "renovacion_lote", "libros_usuario": [{"codigo": "LIB0", '
+                 '{"tipo": "replicacion", "operaciones": [{"operacion": "devolucion_lote", '
+                 '{"tipo": "replicacion", "operacion": {"operacion": "renovacion", '
+                 '{"tipo": "replicacion", "operacion": {"operacion": "devolucion", '
+                 '{"tipo": "replicacion", "operacion": {"operacion": "prestamo", '
+                 '"libro_usuario": {"codigo": "LIB0", "titulo": "", "autor": "", '
+                 '"fecha_prestamo": "", "fecha_devolucion": ""}, "timestamp": ')
+    cola = plantilla.encode("utf-8")
+    catalogo = ", ".join(fragmentos).encode("utf-8")
+    return (catalogo + cola)[-TAMANO_DICCIONARIO:]
+
+
+class CompresorReplicacion:
+    """Comprime y descomprime mensajes de replicación y lleva sus métricas"""
+
+    def __init__(self, metodo_preferido="zlib-dict", archivo_diccionario=ARCHIVO_DICCIONARIO):
+        if metodo_preferido not in METODOS:
+            raise ValueError(f"Método de compresión desconocido: {metodo_preferido}")
+        self.metodo_preferido = metodo_preferido
+        self.diccionario = construir_diccionario(archivo_diccionario)
+        self.crc_diccionario = zlib.crc32(self.diccionario)
+
+        self._lock = threading.Lock()
+        self.metricas = {metodo: {'mensajes': 0, 'bytes_originales': 0, 'bytes_enviados': 0,
+                                  'cpu_compresion_ms': 0.0}
+                         for metodo in METODOS}
+        self.metricas_recepcion = {'mensajes': 0, 'bytes_recibidos': 0, 'bytes_originales': 0,
+                                   'cpu_descompresion_ms': 0.0}
+
+    def anuncio(self):
+        """Lo que se publica en el heartbeat para que la otra sede elija el método"""
+        return {"metodos": METODOS_SOPORTADOS, "diccionario": self.crc_diccionario}
+
+    def elegir_metodo(self, anuncio_remoto):
+        """Mejor método que entienden ambas sedes, sin pasar del preferido"""
+        if not anuncio_remoto:
+            return "ninguna"  # GA anterior: solo JSON
+        remotos = anuncio_remoto.get("metodos", [])
+        for metodo in METODOS_SOPORTADOS[METODOS_SOPORTADOS.index(self.metodo_preferido):]:
+            if metodo not in remotos:
+                continue
+            if metodo == "zlib-dict" and anuncio_remoto.get("diccionario") != self.crc_diccionario:
+                continue
+            return metodo
+        return "ninguna"
+
+    def comprimir(self, carga, metodo):
+        """Marco listo para enviar; si comprimir no ahorra nada se manda la carga tal cual"""
+        inicio = time.thread_time()
+        marco = None
+        if metodo != "ninguna" and len(carga) >= MIN_BYTES_COMPRESION:
+            if metodo == "zlib-dict":
+                compresor = zlib.compressobj(NIVEL_ZLIB, zdict=self.diccionario)
+                cabecera = bytes([MAGIA_COMPRESION, METODOS.index(metodo)]) + _CRC.pack(self.crc_diccionario)
+            else:
+                compresor = zlib.compressobj(NIVEL_ZLIB)
+                cabecera = bytes([MAGIA_COMPRESION, METODOS.index(metodo)])
+            marco = cabecera + compresor.compress(carga) + compresor.flush()
+            if len(marco) >= len(carga):
+                marco = None
+        if marco is None:
+            metodo, marco = "ninguna", carga
+        cpu_ms = (time.thread_time() - inicio) * 1000
+
+        with self._lock:
+            m = self.metricas[metodo]
+            m['mensajes'] += 1
+            m['bytes_originales'] += len(carga)
+            m['bytes_enviados'] += len(marco)
+            m['cpu_compresion_ms'] += cpu_ms
+        return marco
+
+    def descomprimir(self, mensaje):
+        """Carga original de un marco comprimido; los demás mensajes se devuelven igual"""
+        if not es_comprimido(mensaje):
+            return mensaje
+        inicio = time.thread_time()
+        if len(mensaje) < 2 or mensaje[1] >= len(METODOS):
+            raise ErrorCodec("Marco de compresión sin método válido")
+        metodo = METODOS[mensaje[1]]
+        try:
+            if metodo == "zlib-dict":
+                (crc,) = _CRC.unpack_from(mensaje, 2)
+                if crc != self.crc_diccionario:
+                    raise ErrorCodec(f"Diccionario de compresión distinto ({crc:08x})")
+                descompresor = zlib.decompressobj(zdict=self.diccionario)
+                carga = descompresor.decompress(mensaje[2 + _CRC.size:]) + descompresor.flush()
+            elif metodo == "zlib":
+                carga = zlib.decompress(mensaje[2:])
+            else:
+                carga = bytes(mensaje[2:])
+        except (zlib.error, struct.error) as e:
+            raise ErrorCodec(f"Marco de compresión corrupto: {e}")
+
+        with self._lock:
+            r = self.metricas_recepcion
+            r['mensajes'] += 1
+            r['bytes_recibidos'] += len(mensaje)
+            r['bytes_originales'] += len(carga)
+            r['cpu_descompresion_ms'] += (time.thread_time() - inicio) * 1000
+        return carga
+
+    def resumen(self):
+        """Bytes en el cable frente a los originales y CPU gastada, por método"""
+        with self._lock:
+            envio = {}
+            for metodo, m in self.metricas.items():
+                if m['mensajes']:
+                    envio[metodo] = dict(m, cpu_compresion_ms=round(m['cpu_compresion_ms'], 2),
+                                         ratio=round(m['bytes_originales'] / max(1, m['bytes_enviados']), 2))
+            r = self.metricas_recepcion
+            recepcion = dict(r, cpu_descompresion_ms=round(r['cpu_descompresion_ms'], 2))
+        return {'envio': envio, 'recepcion': recepcion}
+
+
+def es_comprimido(mensaje):
+    """True si el mensaje viene en un marco de CompresorReplicacion"""
+    return isinstance(mensaje, (bytes, bytearray, memoryview)) and len(mensaje) > 0 and mensaje[0] == MAGIA_COMPRESION
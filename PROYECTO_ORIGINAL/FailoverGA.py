@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+FailoverGA.py
+Cliente con tolerancia a fallos hacia los Gestores de Almacenamiento,
+compartido por los tres actores (Lazy Pirate):
+- Cada GA se usa con un socket REQ; si no responde a tiempo el socket se
+  cierra y se crea de nuevo (un REQ que quedó esperando respuesta no puede
+  volver a enviar).
+- El timeout de cada GA se adapta a la latencia observada (estilo RTO de TCP)
+  en lugar de un RCVTIMEO fijo de 5 s. Solo para lecturas: una escritura
+  (prestamo, devolucion, lotes) que vence pudo haberse aplicado igual, así que
+  espera TIMEOUT_MAX_MS y no se reenvía a otro GA.
+- Un hilo escucha los heartbeats PUB de cada GA; un GA sin heartbeat durante
+  UMBRAL_HEARTBEAT se salta sin esperar su timeout.
+- SelectorGA elige el GA sano más rápido según la EWMA de latencia y de
+  errores de cada uno; un interruptor de circuito saca de servicio al GA con
+  fallos repetidos y lo reincorpora tras una petición de prueba (semiabierto).
+- Las peticiones de solo lectura (verificar_disponibilidad) pueden cubrirse
+  (hedging): si el GA primario no responde dentro de su p95, se envía la misma
+  petición al siguiente GA y gana la primera respuesta.
+- Las peticiones van en el codec binario de clases.py a los GA que lo anuncian
+  en su heartbeat ("codecs"); al resto, y sin heartbeat, en JSON.
+"""
+
+import zmq
+import json
+import logging
+import threading
+import time
+from collections import deque
+from clases import codificar_mensaje, mensaje_json
+
+TIMEOUT_MIN_MS = 250
+TIMEOUT_MAX_MS = 5000
+# Únicas operaciones que se pueden repetir en otro GA tras un timeout
+OPERACIONES_LECTURA = {"verificar_disponibilidad"}
+UMBRAL_HEARTBEAT = 0.8  # segundos sin heartbeat = GA caído (el GA late cada 0.25 s)
+REINTENTO_SIN_HEARTBEAT = 5  # segundos antes de volver a probar un GA sin heartbeat que falló
+
+# Interruptor de circuito
+FALLOS_PARA_ABRIR = 3       # fallos consecutivos que abren el circuito
+TASA_ERROR_PARA_ABRIR = 0.5  # o EWMA de errores por encima de este valor
+ENFRIAMIENTO_CIRCUITO = 5   # segundos abierto antes de pasar a semiabierto
+ALFA_ERROR = 0.2            # peso de la última muestra en la EWMA de errores
+
+# Se prefiere el GA de la sede mientras no sea más de FACTOR_AFINIDAD veces
+# más lento que el mejor
+FACTOR_AFINIDAD = 3.0
+
+# Hedging: cada petición cubrible suma PRESUPUESTO_COBERTURA tokens (máx.
+# RAFAGA_COBERTURA) y cada cobertura gasta uno, así las coberturas nunca
+# añaden más de ~10% de carga extra
+PRESUPUESTO_COBERTURA = 0.1
+RAFAGA_COBERTURA = 10
+MUESTRAS_P95 = 200
+MIN_MUESTRAS_P95 = 20
+
+
+class Interruptor:
+    """Interruptor de circuito: cerrado -> abierto -> semiabierto -> cerrado"""
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.estado = self.CERRADO
+        self.fallos_consecutivos = 0
+        self.tasa_error = 0.0
+        self.abierto_desde = 0
+        self.prueba_en_curso = False
+
+    def _cambiar(self, estado):
+        if estado != self.estado:
+            logging.warning(f"Circuito de {self.nombre}: {self.estado} -> {estado}")
+            self.estado = estado
+
+    def permite(self):
+        """True si se puede enviar (en semiabierto, solo una prueba a la vez)"""
+        if self.estado == self.ABIERTO and time.time() - self.abierto_desde > ENFRIAMIENTO_CIRCUITO:
+            self._cambiar(self.SEMIABIERTO)
+        if self.estado == self.CERRADO:
+            return True
+        if self.estado == self.SEMIABIERTO:
+            return not self.prueba_en_curso
+        return False
+
+    def iniciar(self):
+        if self.estado == self.SEMIABIERTO:
+            self.prueba_en_curso = True
+
+    def exito(self):
+        self.fallos_consecutivos = 0
+        self.tasa_error = (1 - ALFA_ERROR) * self.tasa_error
+        self.prueba_en_curso = False
+        # Un circuito abierto solo se cierra tras su prueba semiabierta; una
+        # respuesta rezagada de antes de abrirse no cuenta como prueba
+        if self.estado == self.SEMIABIERTO:
+            self._cambiar(self.CERRADO)
+
+    def fallo(self):
+        self.fallos_consecutivos += 1
+        self.tasa_error = (1 - ALFA_ERROR) * self.tasa_error + ALFA_ERROR
+        self.prueba_en_curso = False
+        if (self.estado == self.SEMIABIERTO
+                or self.fallos_consecutivos >= FALLOS_PARA_ABRIR
+                or self.tasa_error > TASA_ERROR_PARA_ABRIR):
+            self.abierto_desde = time.time()
+            self._cambiar(self.ABIERTO)
+
+
+class ConexionGA:
+    """Conexión Lazy Pirate a un GA con timeout adaptativo"""
+
+    def __init__(self, context, ga):
+        self.context = context
+        self.ga = ga
+        self.nombre = ga['nombre']
+        self.socket = None
+
+        # Estimación de latencia (Jacobson/Karels); srtt es la EWMA de latencia
+        self.srtt = None
+        self.rttvar = None
+        self.muestras = deque(maxlen=MUESTRAS_P95)
+        self.interruptor = Interruptor(self.nombre)
+        self._inicio = None
+
+        # Estado de vida
+        self.usa_heartbeat = bool(ga.get('puerto_heartbeat'))
+        self.creado = time.time()
+        self.ultimo_heartbeat = None
+        self.fallo_reciente = False
+        self.instante_fallo = 0
+        self.binario = False  # el GA anunció el codec binario en su heartbeat
+
+        self._crear_socket()
+
+    def _crear_socket(self):
+        if self.socket is not None:
+            self.socket.close()
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(f"tcp://{self.ga['ip']}:{self.ga['puerto']}")
+
+    def timeout_ms(self):
+        if self.srtt is None:
+            return TIMEOUT_MAX_MS
+        return int(min(TIMEOUT_MAX_MS, max(TIMEOUT_MIN_MS, self.srtt + 4 * self.rttvar)))
+
+    def p95_ms(self):
+        """p95 de las últimas latencias (o una estimación si hay pocas muestras)"""
+        if len(self.muestras) < MIN_MUESTRAS_P95:
+            return self.srtt + 2 * self.rttvar if self.srtt is not None else TIMEOUT_MIN_MS
+        ordenadas = sorted(self.muestras)
+        return ordenadas[int(0.95 * (len(ordenadas) - 1))]
+
+    def _registrar_latencia(self, ms):
+        self.muestras.append(ms)
+        if self.srtt is None:
+            self.srtt = ms
+            self.rttvar = ms / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - ms)
+            self.srtt = 0.875 * self.srtt + 0.125 * ms
+
+    def vivo(self):
+        """False si el GA dejó de latir o falló su última petición sin latir después"""
+        if self.usa_heartbeat:
+            referencia = self.ultimo_heartbeat or self.creado
+            if time.time() - referencia > UMBRAL_HEARTBEAT:
+                return False
+            return not self.fallo_reciente
+        return not self.fallo_reciente or time.time() - self.instante_fallo > REINTENTO_SIN_HEARTBEAT
+
+    def heartbeat(self, codecs=()):
+        self.ultimo_heartbeat = time.time()
+        self.fallo_reciente = False
+        self.binario = "binario" in codecs
+
+    def codificar(self, mensaje_ga):
+        """Carga en el formato que entiende este GA"""
+        if self.binario:
+            return codificar_mensaje(mensaje_ga)
+        return mensaje_json(mensaje_ga).encode("utf-8")
+
+    def iniciar_envio(self, cuerpo):
+        self._inicio = time.time()
+        self.interruptor.iniciar()
+        self.socket.send(cuerpo)
+
+    def completar(self):
+        """Lee la respuesta ya disponible y registra la latencia"""
+        respuesta = self.socket.recv_string()
+        self._registrar_latencia((time.time() - self._inicio) * 1000)
+        self.fallo_reciente = False
+        self.interruptor.exito()
+        return respuesta
+
+    def abandonar(self, fallo=True):
+        """
+        Lazy Pirate: descarta el REQ atascado y crea uno nuevo. Con fallo=False
+        (perdedor de una cobertura) no cuenta contra la salud del GA.
+        """
+        self._crear_socket()
+        if fallo:
+            self.fallo_reciente = True
+            self.instante_fallo = time.time()
+            self.interruptor.fallo()
+        else:
+            self.interruptor.prueba_en_curso = False
+
+    def solicitar(self, cuerpo, timeout=None):
+        """Envía y espera respuesta; devuelve None si vence el timeout"""
+        timeout = timeout or self.timeout_ms()
+        try:
+            self.iniciar_envio(cuerpo)
+            if self.socket.poll(timeout, zmq.POLLIN):
+                return self.completar()
+            logging.warning(f"✗ {self.nombre} no responde en {timeout} ms, reconectando socket")
+        except zmq.ZMQError as e:
+            logging.error(f"✗ Error ZMQ con {self.nombre}: {e}")
+
+        self.abandonar()
+        return None
+
+    def puntaje(self):
+        """Menor es mejor: latencia esperada penalizada por la tasa de errores"""
+        if self.srtt is None:
+            return 0.0  # sin muestras: se explora primero
+        return self.srtt * (1 + 4 * self.interruptor.tasa_error)
+
+
+class SelectorGA:
+    """Ordena los GA para cada petición según salud, sede y latencia"""
+
+    def __init__(self, conexiones, gestores):
+        self.conexiones = conexiones
+        self.gestores = gestores
+
+    def indice_sede(self, sede):
+        for i, ga in enumerate(self.gestores):
+            if ga.get('sede') == sede:
+                return i
+        return None
+
+    def orden(self, sede=None):
+        """
+        Lista de índices a intentar: primero una prueba semiabierta (si el GA
+        volvió a latir), luego los GA sanos del más rápido al más lento
+        (con preferencia por el de la sede) y, como último recurso, el resto.
+        Un GA con el circuito abierto no aparece (ni para failover ni como
+        cobertura) hasta que le toca su prueba semiabierta.
+        """
+        pruebas, sanos, resto = [], [], []
+        for i, c in enumerate(self.conexiones):
+            if c.interruptor.estado == Interruptor.CERRADO:
+                (sanos if c.vivo() else resto).append(i)
+            elif c.interruptor.permite():
+                (pruebas if c.vivo() else resto).append(i)
+
+        sanos.sort(key=lambda i: self.conexiones[i].puntaje())
+
+        propio = self.indice_sede(sede)
+        if propio in sanos and sanos[0] != propio:
+            mejor = self.conexiones[sanos[0]].puntaje()
+            if self.conexiones[propio].puntaje() <= FACTOR_AFINIDAD * max(mejor, 1.0):
+                sanos.remove(propio)
+                sanos.insert(0, propio)
+
+        resto.sort(key=lambda i: self.conexiones[i].puntaje())
+        return pruebas + sanos + resto
+
+    def resumen(self):
+        return {c.nombre: {
+            'latencia_ms': round(c.srtt, 2) if c.srtt is not None else None,
+            'tasa_error': round(c.interruptor.tasa_error, 3),
+            'circuito': c.interruptor.estado,
+            'vivo': c.vivo()
+        } for c in self.conexiones}
+
+
+class ClienteFailover:
+    """Failover entre GAs usando ConexionGA, SelectorGA y los heartbeats de cada uno"""
+
+    def __init__(self, context, gestores):
+        self.gestores = gestores
+        self.conexiones = [ConexionGA(context, ga) for ga in gestores]
+        self.selector = SelectorGA(self.conexiones, gestores)
+
+        self.tokens_cobertura = RAFAGA_COBERTURA
+        self.metricas_cobertura = {
+            'peticiones': 0,
+            'coberturas_enviadas': 0,
+            'coberturas_ganadas': 0,
+            'sin_presupuesto': 0
+        }
+
+        self._heartbeat_sub = context.socket(zmq.SUB)
+        self._heartbeat_sub.setsockopt_string(zmq.SUBSCRIBE, "")
+        for ga in gestores:
+            if ga.get('puerto_heartbeat'):
+                self._heartbeat_sub.connect(f"tcp://{ga['ip']}:{ga['puerto_heartbeat']}")
+        threading.Thread(target=self._escuchar_heartbeats, daemon=True).start()
+
+    def _escuchar_heartbeats(self):
+        por_sede = {ga.get('sede'): c for ga, c in zip(self.gestores, self.conexiones)}
+        while True:
+            try:
+                data = json.loads(self._heartbeat_sub.recv_string())
+                conexion = por_sede.get(data.get("sede"))
+                if conexion is not None:
+                    conexion.heartbeat(data.get("codecs", ()))
+            except Exception as e:
+                logging.error(f"Error leyendo heartbeat: {e}")
+
+    def enviar_con_failover(self, mensaje_ga, sede=None, orden=None):
+        """
+        Envía al mejor GA según el selector y, si no responde, a los demás.
+        Devuelve la respuesta (str) o None si ningún GA respondió.
+
+        Las escrituras van a un solo GA con TIMEOUT_MAX_MS: si vencen no se
+        sabe si el GA las aplicó, y reenviarlas a otro las duplicaría. El
+        selector ya deja fuera a los GA caídos antes de enviar; lo que no
+        responda queda en el log de reintentos del actor.
+        """
+        if orden is None:
+            orden = self.selector.orden(sede)
+            if not orden:
+                logging.error("✗✗✗ Ningún GA disponible: todos con el circuito abierto")
+        if not orden:
+            return None
+
+        lectura = mensaje_ga.get("operacion") in OPERACIONES_LECTURA
+        if not lectura:
+            orden = orden[:1]
+
+        for intento, indice in enumerate(orden):
+            conexion = self.conexiones[indice]
+            timeout = conexion.timeout_ms() if lectura else TIMEOUT_MAX_MS
+            logging.info(f"Intento {intento + 1}/{len(orden)} con {conexion.nombre} (timeout {timeout} ms)")
+
+            respuesta = conexion.solicitar(conexion.codificar(mensaje_ga), timeout)
+            if respuesta is not None:
+                logging.info(f"✓ Respuesta de {conexion.nombre}: {respuesta}")
+                return respuesta
+
+        if lectura:
+            logging.error("✗✗✗ FALLO TOTAL: Todos los gestores de almacenamiento no responden")
+        else:
+            logging.error(f"✗✗✗ {mensaje_ga.get('operacion')} sin respuesta de {self.conexiones[orden[0]].nombre}; "
+                          f"no se reenvía a otro GA para no aplicarla dos veces")
+        return None
+
+    def enviar_con_cobertura(self, mensaje_ga, sede=None):
+        """
+        Igual que enviar_con_failover pero, si el primario tarda más que su p95,
+        envía la misma petición al segundo GA y se queda con la primera
+        respuesta; el perdedor se cancela reconstruyendo su socket.
+        Solo para operaciones de lectura: ambos GA pueden llegar a procesarla.
+        """
+        self.metricas_cobertura['peticiones'] += 1
+        self.tokens_cobertura = min(RAFAGA_COBERTURA, self.tokens_cobertura + PRESUPUESTO_COBERTURA)
+
+        orden = self.selector.orden(sede)
+        if len(orden) < 2:
+            return self.enviar_con_failover(mensaje_ga, sede, orden)
+
+        primario = self.conexiones[orden[0]]
+        limite = time.time() + primario.timeout_ms() / 1000
+
+        try:
+            primario.iniciar_envio(primario.codificar(mensaje_ga))
+            if primario.socket.poll(int(primario.p95_ms()) + 1, zmq.POLLIN):
+                return primario.completar()
+        except zmq.ZMQError as e:
+            logging.error(f"✗ Error ZMQ con {primario.nombre}: {e}")
+            primario.abandonar()
+            return self.enviar_con_failover(mensaje_ga, sede, orden[1:])
+
+        secundario = self.conexiones[orden[1]]
+        if self.tokens_cobertura < 1:
+            self.metricas_cobertura['sin_presupuesto'] += 1
+            if primario.socket.poll(max(0, int((limite - time.time()) * 1000)), zmq.POLLIN):
+                return primario.completar()
+            primario.abandonar()
+            return self.enviar_con_failover(mensaje_ga, sede, orden[1:])
+
+        self.tokens_cobertura -= 1
+        self.metricas_cobertura['coberturas_enviadas'] += 1
+        logging.info(f"Cobertura: {primario.nombre} supera su p95, enviando también a {secundario.nombre}")
+
+        try:
+            secundario.iniciar_envio(secundario.codificar(mensaje_ga))
+        except zmq.ZMQError as e:
+            logging.error(f"✗ Error ZMQ con {secundario.nombre}: {e}")
+            secundario.abandonar()
+            if primario.socket.poll(max(0, int((limite - time.time()) * 1000)), zmq.POLLIN):
+                return primario.completar()
+            primario.abandonar()
+            return self.enviar_con_failover(mensaje_ga, sede, orden[2:])
+
+        poller = zmq.Poller()
+        poller.register(primario.socket, zmq.POLLIN)
+        poller.register(secundario.socket, zmq.POLLIN)
+        limite = max(limite, time.time() + secundario.timeout_ms() / 1000)
+
+        while time.time() < limite:
+            socks = dict(poller.poll(max(1, int((limite - time.time()) * 1000))))
+            if primario.socket in socks:
+                secundario.abandonar(fallo=False)
+                return primario.completar()
+            if secundario.socket in socks:
+                self.metricas_cobertura['coberturas_ganadas'] += 1
+                primario.abandonar(fallo=False)
+                return secundario.completar()
+
+        primario.abandonar()
+        secundario.abandonar()
+        return self.enviar_con_failover(mensaje_ga, sede, orden[2:])
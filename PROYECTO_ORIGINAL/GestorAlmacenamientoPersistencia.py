@@ -3,6 +3,9 @@
 GestorAlmacenamiento.py
 Gestor que maneja operaciones sobre la BD con replicación y tolerancia a fallos.
 Cada sede tiene su propio GA que sincroniza con la otra sede.
+La replicación puede ir comprimida (COMPRESION_REPLICACION): el método se
+negocia con lo que la otra sede anuncia en su heartbeat (ver
+CompresionReplicacion.py) y las operaciones pendientes se reenvían en lote.
 """
 
 import zmq
@@ -14,7 +17,8 @@ import shutil
 import os
 import sys
 from datetime import datetime
-from clases import LibroBiblioteca, LibroUsuario
+from clases import LibroBiblioteca, LibroUsuario, CODECS_SOPORTADOS, ErrorCodec, decodificar_mensaje
+from CompresionReplicacion import CompresorReplicacion
 
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] GA-%(sede)s: %(message)s")
 
@@ -29,6 +33,7 @@ SEDE = sys.argv[1]  # "SedeA" o "SedeB"
 if SEDE == "SedeA":
     PUERTO_REP = 5557
     PUERTO_HEARTBEAT = 5558
+    PUERTO_CAMBIOS = 5562
     #IP_SEDE_REMOTA = "10.43.102.41"  # IP de SedeB
     IP_SEDE_REMOTA = "localhost"
     PUERTO_REP_REMOTO = 5559
@@ -39,6 +44,7 @@ if SEDE == "SedeA":
 elif SEDE == "SedeB":
     PUERTO_REP = 5559
     PUERTO_HEARTBEAT = 5560
+    PUERTO_CAMBIOS = 5563
     #IP_SEDE_REMOTA = "10.43.102.40"  # IP de SedeA
     IP_SEDE_REMOTA = "localhost"
     PUERTO_REP_REMOTO = 5557
@@ -57,10 +63,23 @@ estado = {
     'activo': True,
     'sede_remota_activa': True,
     'ultima_respuesta_remota': time.time(),
-    'modo_activo': True  # True = primario, False = respaldo
+    'modo_activo': True,  # True = primario, False = respaldo
+    'compresion_remota': None  # lo que anuncia el heartbeat de la otra sede
 }
 
+# Peticiones cuyo "deadline" ya pasó y se respondieron sin tocar la BD
+metricas = {'vencidas_descartadas': 0}
+
+# Los actores detectan la caída de un GA tras ~3 heartbeats perdidos
+INTERVALO_HEARTBEAT = 0.25  # segundos
+
+# Compresión del canal de replicación: "zlib-dict", "zlib" o "ninguna".
+# Se usa el mejor método que también acepte la otra sede.
+COMPRESION_REPLICACION = "zlib-dict"
+INTERVALO_METRICAS_REPLICACION = 30  # segundos entre resúmenes de bytes/CPU
+
 bd_lock = threading.Lock()
+compresor = CompresorReplicacion(COMPRESION_REPLICACION)
 context = zmq.Context()
 
 # Socket REP para recibir peticiones de los Actores
@@ -73,6 +92,11 @@ heartbeat_pub = context.socket(zmq.PUB)
 heartbeat_pub.bind(f"tcp://*:{PUERTO_HEARTBEAT}")
 logger.info(f"Heartbeat PUB en tcp://*:{PUERTO_HEARTBEAT}")
 
+# Socket PUB con el feed de cambios de inventario (cachés de los actores)
+cambios_pub = context.socket(zmq.PUB)
+cambios_pub.bind(f"tcp://*:{PUERTO_CAMBIOS}")
+logger.info(f"Feed de cambios de inventario PUB en tcp://*:{PUERTO_CAMBIOS}")
+
 # Socket SUB para recibir heartbeats de la sede remota
 heartbeat_sub = context.socket(zmq.SUB)
 heartbeat_sub.connect(f"tcp://{IP_SEDE_REMOTA}:{PUERTO_HEARTBEAT_REMOTO}")
@@ -120,33 +144,56 @@ def guardar_bd(libros):
     except Exception as e:
         logger.error(f"Error guardando BD: {e}")
 
+def publicar_cambio(codigo, libros):
+    """Publica los ejemplares actuales de un libro en el feed de cambios"""
+    try:
+        cambio = {
+            "sede": SEDE,
+            "codigo": codigo,
+            "ejemplares": libros[codigo]['ejemplares'],
+            "timestamp": time.time()
+        }
+        cambios_pub.send_string(f"inventario {json.dumps(cambio)}")
+    except Exception as e:
+        logger.error(f"Error publicando cambio de inventario: {e}")
+
 def replicar_a_sede_remota(operacion_data):
     """
     Replica la operación a la sede remota de forma asíncrona.
     Si falla, guarda en cola para reintentar.
     """
+    enviar_replicacion({"tipo": "replicacion", "operacion": operacion_data}, [operacion_data])
+
+def replicar_lote_a_sede_remota(operaciones):
+    """Replica varias operaciones en un solo mensaje (se comprimen juntas)"""
+    enviar_replicacion({"tipo": "replicacion", "operaciones": operaciones}, operaciones)
+
+def enviar_replicacion(mensaje_replicacion, operaciones):
+    """Envía un mensaje de replicación con el método de compresión negociado"""
     def replicar():
         try:
-            mensaje_replicacion = {
-                "tipo": "replicacion",
-                "operacion": operacion_data
-            }
+            carga = json.dumps(mensaje_replicacion).encode("utf-8")
+            metodo = compresor.elegir_metodo(estado['compresion_remota'])
+            marco = compresor.comprimir(carga, metodo)
             
-            rep_replicacion.send_string(json.dumps(mensaje_replicacion))
+            rep_replicacion.send(marco)
             
             try:
                 respuesta = rep_replicacion.recv_string()
-                logger.info(f"Replicación exitosa a sede remota: {respuesta}")
+                logger.info(f"Replicación exitosa a sede remota ({len(carga)} B -> {len(marco)} B, "
+                            f"{metodo}): {respuesta}")
                 estado['sede_remota_activa'] = True
             except zmq.Again:
                 logger.warning("Timeout en replicación - sede remota no responde")
                 estado['sede_remota_activa'] = False
-                guardar_operacion_pendiente(operacion_data)
+                for operacion_data in operaciones:
+                    guardar_operacion_pendiente(operacion_data)
                 
         except Exception as e:
             logger.error(f"Error replicando a sede remota: {e}")
             estado['sede_remota_activa'] = False
-            guardar_operacion_pendiente(operacion_data)
+            for operacion_data in operaciones:
+                guardar_operacion_pendiente(operacion_data)
     
     # Ejecutar en hilo separado para no bloquear
     thread = threading.Thread(target=replicar)
@@ -176,8 +223,12 @@ def sincronizar_operaciones_pendientes():
         if operaciones:
             logger.info(f"Sincronizando {len(operaciones)} operaciones pendientes")
             
-            for op in operaciones:
-                replicar_a_sede_remota(op)
+            if estado['compresion_remota'] is not None:
+                # La otra sede entiende lotes: un solo mensaje comprimido
+                replicar_lote_a_sede_remota(operaciones)
+            else:
+                for op in operaciones:
+                    replicar_a_sede_remota(op)
             
             # Limpiar archivo de pendientes
             os.remove(archivo_pendientes)
@@ -196,9 +247,17 @@ def crear_backup_local():
     except Exception as e:
         logger.error(f"Error creando backup: {e}")
 
-def registrar_prestamo(libro_usuario):
+def completar_desde_catalogo(libro_usuario, libros):
+    """Los mensajes compactos solo traen el código: título y autor salen del catálogo"""
+    info = libros.get(libro_usuario.codigo)
+    if info is not None:
+        libro_usuario.titulo = libro_usuario.titulo or info['titulo']
+        libro_usuario.autor = libro_usuario.autor or info['autor']
+
+def registrar_prestamo(libro_usuario, libros):
     """Registra un préstamo en BD_prestamos.txt"""
     try:
+        completar_desde_catalogo(libro_usuario, libros)
         with open(BD_PRESTAMOS, 'a', encoding='utf-8') as f:
             f.write(f"{libro_usuario.codigo}|{libro_usuario.titulo}|{libro_usuario.autor}|"
                    f"{libro_usuario.fecha_prestamo}|{libro_usuario.fecha_devolucion}|{datetime.now().isoformat()}\n")
@@ -211,6 +270,7 @@ def procesar_devolucion(libro_usuario, libros):
     if codigo in libros:
         libros[codigo]['ejemplares'] += 1
         guardar_bd(libros)
+        publicar_cambio(codigo, libros)
         
         # Replicar a sede remota
         operacion_data = {
@@ -242,14 +302,71 @@ def procesar_renovacion(libro_usuario, libros):
     except Exception as e:
         return {"exito": False, "mensaje": str(e)}
 
+def procesar_devolucion_lote(libros_usuario, libros):
+    """Aplica un lote de devoluciones con una sola escritura de la BD y una replicación"""
+    resultados = []
+    aplicadas = []
+    for libro_usuario in libros_usuario:
+        codigo = libro_usuario.codigo
+        if codigo in libros:
+            libros[codigo]['ejemplares'] += 1
+            aplicadas.append(libro_usuario)
+            resultados.append({"codigo": codigo, "exito": True, "mensaje": f"Ejemplares: {libros[codigo]['ejemplares']}"})
+        else:
+            resultados.append({"codigo": codigo, "exito": False, "mensaje": "Libro no encontrado en BD"})
+
+    if aplicadas:
+        guardar_bd(libros)
+        for codigo in {l.codigo for l in aplicadas}:
+            publicar_cambio(codigo, libros)
+
+        operacion_data = {
+            "operacion": "devolucion_lote",
+            "libros_usuario": [l.to_dict() for l in aplicadas],
+            "timestamp": time.time()
+        }
+        replicar_a_sede_remota(operacion_data)
+
+    return {
+        "exito": len(aplicadas) == len(libros_usuario),
+        "mensaje": f"Lote de devoluciones en {SEDE}: {len(aplicadas)}/{len(libros_usuario)} registradas",
+        "resultados": resultados
+    }
+
+def procesar_renovacion_lote(libros_usuario, libros):
+    """Registra un lote de renovaciones con una sola escritura y una replicación"""
+    try:
+        ahora = datetime.now().isoformat()
+        with open(BD_PRESTAMOS, 'a', encoding='utf-8') as f:
+            f.writelines(f"RENOVACION|{l.codigo}|{l.fecha_devolucion}|{ahora}\n" for l in libros_usuario)
+
+        operacion_data = {
+            "operacion": "renovacion_lote",
+            "libros_usuario": [l.to_dict() for l in libros_usuario],
+            "timestamp": time.time()
+        }
+        replicar_a_sede_remota(operacion_data)
+
+        resultados = [{"codigo": l.codigo, "exito": True, "mensaje": f"Hasta {l.fecha_devolucion}"} for l in libros_usuario]
+        return {"exito": True, "mensaje": f"Lote de {len(libros_usuario)} renovaciones registrado en {SEDE}", "resultados": resultados}
+    except Exception as e:
+        resultados = [{"codigo": l.codigo, "exito": False, "mensaje": str(e)} for l in libros_usuario]
+        return {"exito": False, "mensaje": str(e), "resultados": resultados}
+
 def verificar_disponibilidad(libro_usuario, libros):
-    """Verifica si hay ejemplares disponibles"""
+    """
+    Verifica si hay ejemplares disponibles. El timestamp (mismo reloj que el
+    feed de cambios) permite a la caché del actor descartar esta respuesta si
+    ya recibió un cambio posterior.
+    """
     codigo = libro_usuario.codigo
     if codigo in libros:
         if libros[codigo]['ejemplares'] > 0:
-            return {"disponible": True, "ejemplares": libros[codigo]['ejemplares'], "sede": SEDE}
+            return {"disponible": True, "ejemplares": libros[codigo]['ejemplares'], "sede": SEDE,
+                    "timestamp": time.time()}
         else:
-            return {"disponible": False, "mensaje": "No hay ejemplares disponibles", "sede": SEDE}
+            return {"disponible": False, "mensaje": "No hay ejemplares disponibles", "sede": SEDE,
+                    "timestamp": time.time()}
     else:
         return {"disponible": False, "mensaje": "Libro no existe en BD", "sede": SEDE}
 
@@ -259,7 +376,8 @@ def procesar_prestamo(libro_usuario, libros):
     if codigo in libros and libros[codigo]['ejemplares'] > 0:
         libros[codigo]['ejemplares'] -= 1
         guardar_bd(libros)
-        registrar_prestamo(libro_usuario)
+        publicar_cambio(codigo, libros)
+        registrar_prestamo(libro_usuario, libros)
         
         # Replicar a sede remota
         operacion_data = {
@@ -277,6 +395,26 @@ def procesar_replicacion(data, libros):
     """Procesa una operación de replicación recibida de la otra sede"""
     try:
         operacion = data.get("operacion")
+
+        if operacion in ("devolucion_lote", "renovacion_lote"):
+            lote = [LibroUsuario.from_dict(d) for d in data.get("libros_usuario", [])]
+            logger.info(f"Aplicando replicación: {operacion} de {len(lote)} libros")
+
+            if operacion == "devolucion_lote":
+                cambiados = [l.codigo for l in lote if l.codigo in libros]
+                for codigo in cambiados:
+                    libros[codigo]['ejemplares'] += 1
+                if cambiados:
+                    guardar_bd(libros)
+                    for codigo in set(cambiados):
+                        publicar_cambio(codigo, libros)
+            else:
+                ahora = datetime.now().isoformat()
+                with open(BD_PRESTAMOS, 'a', encoding='utf-8') as f:
+                    f.writelines(f"RENOVACION_REPLICA|{l.codigo}|{l.fecha_devolucion}|{ahora}\n" for l in lote)
+
+            return {"exito": True, "mensaje": f"Replicación de lote aplicada en {SEDE}"}
+
         libro_usuario_dict = data.get("libro_usuario", {})
         libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
         
@@ -287,6 +425,7 @@ def procesar_replicacion(data, libros):
             if codigo in libros:
                 libros[codigo]['ejemplares'] += 1
                 guardar_bd(libros)
+                publicar_cambio(codigo, libros)
                 
         elif operacion == "renovacion":
             with open(BD_PRESTAMOS, 'a', encoding='utf-8') as f:
@@ -297,7 +436,8 @@ def procesar_replicacion(data, libros):
             if codigo in libros:
                 libros[codigo]['ejemplares'] = max(0, libros[codigo]['ejemplares'] - 1)
                 guardar_bd(libros)
-                registrar_prestamo(libro_usuario)
+                publicar_cambio(codigo, libros)
+                registrar_prestamo(libro_usuario, libros)
         
         return {"exito": True, "mensaje": f"Replicación aplicada en {SEDE}"}
         
@@ -312,10 +452,14 @@ def thread_heartbeat():
             heartbeat_data = {
                 "sede": SEDE,
                 "timestamp": time.time(),
-                "estado": "activo"
+                "estado": "activo",
+                # Los actores solo envían en binario a los GA que lo anuncian
+                "codecs": CODECS_SOPORTADOS,
+                # Métodos de compresión y diccionario para la replicación
+                "compresion": compresor.anuncio()
             }
             heartbeat_pub.send_string(json.dumps(heartbeat_data))
-            time.sleep(2)  # Heartbeat cada 2 segundos
+            time.sleep(INTERVALO_HEARTBEAT)
         except Exception as e:
             logger.error(f"Error enviando heartbeat: {e}")
 
@@ -325,6 +469,7 @@ def thread_monitor_heartbeat():
     
     poller = zmq.Poller()
     poller.register(heartbeat_sub, zmq.POLLIN)
+    ultimas_metricas = time.time()
     
     while estado['activo']:
         try:
@@ -335,6 +480,7 @@ def thread_monitor_heartbeat():
                 data = json.loads(mensaje)
                 
                 estado['ultima_respuesta_remota'] = time.time()
+                estado['compresion_remota'] = data.get("compresion")
                 
                 if not estado['sede_remota_activa']:
                     logger.info(f"Sede remota {data['sede']} recuperada")
@@ -352,6 +498,10 @@ def thread_monitor_heartbeat():
                     estado['modo_activo'] = True
                     crear_backup_local()
             
+            if time.time() - ultimas_metricas > INTERVALO_METRICAS_REPLICACION:
+                logger.info(f"📊 Compresión de replicación: {compresor.resumen()}")
+                ultimas_metricas = time.time()
+            
         except Exception as e:
             logger.error(f"Error monitoreando heartbeat: {e}")
 
@@ -370,12 +520,24 @@ if __name__ == "__main__":
 
     while estado['activo']:
         try:
-            mensaje = rep_socket.recv_string()
-            data = json.loads(mensaje)
+            # Las réplicas de la otra sede pueden llegar comprimidas
+            mensaje = compresor.descomprimir(rep_socket.recv())
+            data = decodificar_mensaje(mensaje, objetos=True)
             
             tipo_mensaje = data.get("tipo", "operacion")
             
-            if tipo_mensaje == "replicacion":
+            if tipo_mensaje == "replicacion" and "operaciones" in data:
+                # Lote de replicaciones (operaciones pendientes de la otra sede)
+                with bd_lock:
+                    resultados = [procesar_replicacion(op, libros) for op in data["operaciones"]]
+                
+                aplicadas = sum(1 for r in resultados if r["exito"])
+                respuesta = {"exito": aplicadas == len(resultados),
+                             "mensaje": f"Replicación de {aplicadas}/{len(resultados)} operaciones aplicada en {SEDE}"}
+                rep_socket.send_string(json.dumps(respuesta))
+                logger.info(f"Replicación procesada: {respuesta}")
+                
+            elif tipo_mensaje == "replicacion":
                 # Es una replicación de la otra sede
                 operacion_data = data.get("operacion", {})
                 
@@ -385,11 +547,33 @@ if __name__ == "__main__":
                 rep_socket.send_string(json.dumps(respuesta))
                 logger.info(f"Replicación procesada: {respuesta}")
                 
+            elif data.get("deadline") is not None and time.time() > data["deadline"]:
+                # El cliente ya no espera el resultado: no gastar lock ni disco
+                metricas['vencidas_descartadas'] += 1
+                logger.warning(f"Petición vencida descartada: {data.get('operacion')} "
+                               f"(total: {metricas['vencidas_descartadas']})")
+                rep_socket.send_string(json.dumps({"exito": False, "vencida": True, "mensaje": "Petición vencida"}))
+
+            elif data.get("operacion") in ("devolucion_lote", "renovacion_lote"):
+                # Lote de operaciones de un Actor: un solo lock y una sola escritura
+                operacion = data.get("operacion")
+                lote = data.get("libros_usuario", [])
+
+                logger.info(f"Lote recibido: {operacion} de {len(lote)} libros")
+
+                with bd_lock:
+                    if operacion == "devolucion_lote":
+                        respuesta = procesar_devolucion_lote(lote, libros)
+                    else:
+                        respuesta = procesar_renovacion_lote(lote, libros)
+
+                rep_socket.send_string(json.dumps(respuesta))
+                logger.info(f"Respuesta enviada: {respuesta['mensaje']}")
+
             else:
                 # Es una operación normal de un Actor
                 operacion = data.get("operacion")
-                libro_usuario_dict = data.get("libro_usuario", {})
-                libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
+                libro_usuario = data["libro_usuario"]
 
                 logger.info(f"Operación recibida: {operacion} para libro {libro_usuario.codigo}")
 
@@ -408,9 +592,9 @@ if __name__ == "__main__":
                 rep_socket.send_string(json.dumps(respuesta))
                 logger.info(f"Respuesta enviada: {respuesta}")
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parseando JSON: {e}")
-            rep_socket.send_string(json.dumps({"exito": False, "mensaje": "JSON inválido"}))
+        except (json.JSONDecodeError, UnicodeDecodeError, ErrorCodec) as e:
+            logger.error(f"Error decodificando mensaje: {e}")
+            rep_socket.send_string(json.dumps({"exito": False, "mensaje": "Mensaje inválido"}))
         except Exception as e:
             logger.error(f"Error procesando petición: {e}")
             rep_socket.send_string(json.dumps({"exito": False, "mensaje": str(e)}))
\ No newline at end of file
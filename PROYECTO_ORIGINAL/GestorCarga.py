@@ -2,85 +2,248 @@
 """
 GestorCarga.py
 Gestor de Carga que recibe peticiones de PS y:
-- Publica en tópicos (PUB/SUB) las operaciones de devoluciones y renovaciones.
-- Atiende préstamos de manera síncrona (REQ/REP).
+- Publica en tópicos (PUB/SUB) las operaciones de devoluciones y renovaciones,
+  con un tópico por sede (p. ej. 'devolucion.SedeB').
+- Atiende préstamos de manera síncrona: el PS espera el resultado real que
+  reporta el Actor de Préstamo por el canal de resultados.
+- Limita la tasa de cada cliente y reparte el servicio entre clientes con una
+  cola justa ponderada; dentro de cada cliente los préstamos pasan antes que
+  devoluciones y renovaciones, con envejecimiento para que nada se quede sin
+  atender (ver ControlTrafico.py y limites_clientes.json).
+- Descarta sin atender las peticiones cuyo "deadline" (fijado por el PS) ya
+  pasó: el PS dejó de esperarlas.
+- Acepta peticiones en JSON o en el codec binario de clases.py (el PS lo
+  negocia con la operación "codecs") y publica a los actores en
+  CODEC_PUBLICACION; los actores reconocen ambos formatos.
 """
 
 import zmq
 import json
 import logging
-from clases import LibroUsuario
+import time
+import uuid
+from clases import LibroUsuario, CODECS_SOPORTADOS, ErrorCodec, codificar_mensaje, decodificar_mensaje
+from ControlTrafico import PlanificadorJusto
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s: %(message)s")
 
-context = zmq.Context()
-#publisher = context.socket(zmq.PUB)
-#publisher.bind("tcp://*:5556")
+# Si es False, el préstamo se confirma al PS apenas se publica (modo anterior)
+PRESTAMO_SINCRONO = True
+TIMEOUT_PRESTAMO = 10  # Segundos máximos esperando el resultado del Actor
+
+# Límites por cliente (identidad del PS); el archivo se recarga si cambia
+ARCHIVO_LIMITES = "limites_clientes.json"
+INTERVALO_RECARGA = 2  # segundos
+INTERVALO_METRICAS = 10  # segundos entre resúmenes de espera por operación
 
+# Formato de lo que se publica a los actores: "binario" o "json"
+CODEC_PUBLICACION = "binario"
 
-# Socket REP para PS -> GC (préstamos, devoluciones, renovaciones)
-rep_socket = context.socket(zmq.REP)
-rep_socket.bind("tcp://*:5555")
-logging.info("Socket REP escuchando en tcp://*:5555")
+context = zmq.Context()
+
+# Socket ROUTER para PS -> GC (préstamos, devoluciones, renovaciones).
+# Los PS usan REQ; el ROUTER permite tener varios préstamos en curso y
+# responder a cada PS por su identidad cuando llega el resultado.
+router_socket = context.socket(zmq.ROUTER)
+router_socket.bind("tcp://*:5555")
+logging.info("Socket ROUTER escuchando en tcp://*:5555")
 
 # Socket PUB para GC -> Actores (devoluciones y renovaciones)
 pub_socket = context.socket(zmq.PUB)
 pub_socket.bind("tcp://*:5556")
 logging.info("Socket PUB escuchando en tcp://*:5556 (para actores)")
 
+# Socket PULL para Actores -> GC (resultado real de los préstamos)
+resultados_socket = context.socket(zmq.PULL)
+resultados_socket.bind("tcp://*:5561")
+logging.info("Socket PULL de resultados escuchando en tcp://*:5561")
+
+# correlation_id -> {'identidad': ..., 'inicio': ..., 'vence': ...}
+prestamos_pendientes = {}
+
+metricas = {'vencidas_descartadas': 0}
+
+def topico(operacion, data):
+    """Tópico por sede (p. ej. 'prestamo.SedeB') para que atiendan los actores locales"""
+    sede = data.get("sede")
+    return f"{operacion}.{sede}" if sede else operacion
+
+def clase_operacion(data):
+    """Clase de prioridad de la petición: su operación si es un texto"""
+    operacion = data.get("operacion")
+    return operacion if isinstance(operacion, str) else None
+
+def responder(identidad, texto):
+    """Envía una respuesta al PS identificado (sobre con delimitador de REQ)"""
+    router_socket.send_multipart([identidad, b"", texto.encode("utf-8")])
+
+def publicar(operacion, data):
+    """Publica la petición a los actores: '<tópico> <carga>'"""
+    if CODEC_PUBLICACION == "binario":
+        pub_socket.send(f"{topico(operacion, data)} ".encode("utf-8") + codificar_mensaje(data))
+    else:
+        pub_socket.send_string(f"{topico(operacion, data)} {json.dumps(data)}")
+
+def vencida(data):
+    """True si el PS ya dejó de esperar la respuesta de esta petición"""
+    deadline = data.get("deadline")
+    return deadline is not None and time.time() > deadline
+
+def procesar_peticion(identidad, data):
+    """Procesa una petición ya decodificada del PS y responde o la deja pendiente"""
+    if vencida(data):
+        metricas['vencidas_descartadas'] += 1
+        logging.warning("Petición vencida descartada (%s), total: %d",
+                        data.get("operacion"), metricas['vencidas_descartadas'])
+        responder(identidad, "Error: petición vencida")
+        return
+
+    operacion = data.get("operacion")
+    libro_usuario_dict = data.get("libro_usuario", {})
+
+    # Convertir a objeto de dominio
+    libro_usuario = None
+    try:
+        libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
+    except Exception:
+        pass
+
+    # --- Procesar operación ---
+    if operacion == "devolucion":
+        logging.info("Petición de devolución recibida para libro: %s", libro_usuario_dict)
+        # Responder ACK inmediato al PS; ya confirmada, el actor debe hacerla
+        # aunque venza, así que no se propaga el deadline
+        responder(identidad, "Devolución enviada al Actor")
+        data.pop("deadline", None)
+        # Publicar en tópico devolucion
+        publicar(operacion, data)
+
+    elif operacion == "renovacion":
+        logging.info("Petición de renovación recibida para libro: %s", libro_usuario_dict)
+        responder(identidad, "Renovación enviada al Actor")
+        data.pop("deadline", None)
+        publicar(operacion, data)
+
+    elif operacion == "prestamo":
+        logging.info("Petición de préstamo recibida para libro: %s", libro_usuario_dict)
+
+        if PRESTAMO_SINCRONO:
+            # El PS queda esperando hasta que el Actor reporte el resultado
+            correlation_id = uuid.uuid4().hex
+            data["correlation_id"] = correlation_id
+            inicio = time.time()
+            prestamos_pendientes[correlation_id] = {
+                'identidad': identidad,
+                'inicio': inicio,
+                'vence': min(inicio + TIMEOUT_PRESTAMO, data.get("deadline") or float("inf"))
+            }
+        else:
+            responder(identidad, "Préstamo procesado en el GC (asíncrono)")
+
+        # Publicar el mensaje a los Actores
+        publicar(operacion, data)
+    elif operacion == "codecs":
+        # Negociación de formato: el PS usa el binario solo si aparece aquí
+        responder(identidad, json.dumps({"codecs": CODECS_SOPORTADOS}))
+    else:
+        logging.warning("Operación desconocida: %s", operacion)
+        responder(identidad, "Operación desconocida")
+
+def procesar_resultado(mensaje):
+    """Enruta al PS que espera el resultado de un préstamo reportado por el Actor"""
+    data = json.loads(mensaje)
+    correlation_id = data.get("correlation_id")
+    pendiente = prestamos_pendientes.pop(correlation_id, None)
+
+    if pendiente is None:
+        # Ya expiró o otro Actor reportó primero
+        logging.warning("Resultado sin préstamo pendiente: %s", correlation_id)
+        return
+
+    duracion = time.time() - pendiente['inicio']
+    if data.get("exito"):
+        texto = f"Préstamo exitoso: {data.get('mensaje')}"
+    else:
+        texto = f"Préstamo rechazado: {data.get('mensaje')}"
+
+    logging.info("Resultado de préstamo %s en %.2f ms: %s", correlation_id, duracion * 1000, texto)
+    responder(pendiente['identidad'], texto)
+
+def expirar_prestamos_pendientes():
+    """Responde con timeout a los préstamos cuyo Actor no ha reportado a tiempo"""
+    ahora = time.time()
+    expirados = [cid for cid, p in prestamos_pendientes.items() if ahora > p['vence']]
+
+    for correlation_id in expirados:
+        pendiente = prestamos_pendientes.pop(correlation_id)
+        logging.warning("Préstamo %s sin resultado tras %.1fs", correlation_id, ahora - pendiente['inicio'])
+        responder(pendiente['identidad'], "Préstamo sin respuesta del Actor (timeout)")
+
 if __name__ == "__main__":
     logging.info("Gestor de Carga iniciado. Esperando mensajes de PS...")
+    logging.info("Modo de préstamo: %s", "síncrono" if PRESTAMO_SINCRONO else "asíncrono")
+
+    planificador = PlanificadorJusto(ARCHIVO_LIMITES)
+    ultima_recarga = time.time()
+    ultimas_metricas = time.time()
+
+    poller = zmq.Poller()
+    poller.register(router_socket, zmq.POLLIN)
+    poller.register(resultados_socket, zmq.POLLIN)
 
     while True:
         try:
-            mensaje = rep_socket.recv_string()
-            logging.info("Mensaje recibido del PS: %s", mensaje)
+            socks = dict(poller.poll(planificador.espera_ms(500)))
+
+            if router_socket in socks:
+                identidad, _, cuerpo = router_socket.recv_multipart()
+                try:
+                    data = decodificar_mensaje(cuerpo)
+                    if not isinstance(data, dict):
+                        raise ErrorCodec(f"La petición no es un objeto ({type(data).__name__})")
+                    logging.info("Mensaje recibido del PS: %s", data)
+                except (json.JSONDecodeError, UnicodeDecodeError, ErrorCodec) as e:
+                    logging.error("Error decodificando mensaje: %s", e)
+                    responder(identidad, "Error: formato de mensaje no soportado")
+                    data = None
+
+                # La operación decide la clase de prioridad dentro del cliente
+                if data is not None and not planificador.encolar(identidad, data, clase_operacion(data)):
+                    logging.warning("Cola del cliente %s llena, petición rechazada", identidad)
+                    responder(identidad, "Error: límite de peticiones del cliente excedido")
 
-            try:
-                data = json.loads(mensaje)
-                operacion = data.get("operacion")
-                libro_usuario_dict = data.get("libro_usuario", {})
+            # Atender en orden justo las peticiones de clientes con tokens
+            siguiente = planificador.siguiente()
+            while siguiente is not None:
+                identidad, data = siguiente
+                try:
+                    procesar_peticion(identidad, data)
+                except Exception as e:
+                    logging.error("Error procesando mensaje: %s", e)
+                    try:
+                        responder(identidad, "Error interno en el GC")
+                    except Exception:
+                        pass
+                siguiente = planificador.siguiente()
 
-                # Convertir a objeto de dominio
-                libro_usuario = None
+            if resultados_socket in socks:
                 try:
-                    libro_usuario = LibroUsuario.from_dict(libro_usuario_dict)
-                except Exception:
-                    pass
-
-                # --- Procesar operación ---
-                if operacion == "devolucion":
-                    logging.info("Petición de devolución recibida para libro: %s", libro_usuario_dict)
-                    # Responder ACK inmediato al PS
-                    rep_socket.send_string("Devolución enviada al Actor")
-                    # Publicar en tópico devolucion
-                    pub_socket.send_string(f"devolucion {json.dumps(data)}")
-
-                elif operacion == "renovacion":
-                    logging.info("Petición de renovación recibida para libro: %s", libro_usuario_dict)
-                    rep_socket.send_string("Renovación enviada al Actor")
-                    pub_socket.send_string(f"renovacion {json.dumps(data)}")
-                    
-                elif operacion == "prestamo":
-                     logging.info("Petición de préstamo recibida para libro: %s", libro_usuario_dict)
-    
-                    # Responder al PS inmediatamente
-                     rep_socket.send_string("Préstamo procesado en el GC (síncrono)")
-
-                    # Publicar el mensaje a los Actores
-                     pub_socket.send_string(f"prestamo {json.dumps(data)}")
-                else:
-                    logging.warning("Operación desconocida: %s", operacion)
-                    rep_socket.send_string("Operación desconocida")
-
-            except json.JSONDecodeError as e:
-                logging.error("Error parseando JSON: %s", e)
-                rep_socket.send_string("Error: mensaje no es JSON válido")
+                    procesar_resultado(resultados_socket.recv_string())
+                except Exception as e:
+                    logging.error("Error procesando resultado de préstamo: %s", e)
+
+            expirar_prestamos_pendientes()
+
+            if time.time() - ultima_recarga > INTERVALO_RECARGA:
+                planificador.recargar_si_cambio()
+                planificador.limpiar_inactivos()
+                ultima_recarga = time.time()
+
+            if time.time() - ultimas_metricas > INTERVALO_METRICAS:
+                logging.info("Espera en cola por operación: %s | Vencidas descartadas: %d",
+                             planificador.metricas_espera.resumen(), metricas['vencidas_descartadas'])
+                ultimas_metricas = time.time()
 
         except Exception as e:
-            logging.error("Error procesando mensaje: %s", e)
-            try:
-                rep_socket.send_string("Error interno en el GC")
-            except Exception:
-                pass
+            logging.error("Error en el bucle del GC: %s", e)
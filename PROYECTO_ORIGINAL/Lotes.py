@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Lotes.py
+Acumulador de operaciones por clave (la sede) para enviarlas al GA en un
+solo mensaje cuando se juntan max_items o pasan max_ms desde la primera.
+"""
+
+import time
+
+LOTE_MAX_ITEMS = 50
+LOTE_MAX_MS = 50
+
+
+class AcumuladorLotes:
+    def __init__(self, max_items=LOTE_MAX_ITEMS, max_ms=LOTE_MAX_MS):
+        self.max_items = max_items
+        self.max_ms = max_ms
+        self._lotes = {}  # clave -> (instante del primer item, [items])
+
+    def agregar(self, clave, item):
+        if clave not in self._lotes:
+            self._lotes[clave] = (time.time(), [])
+        self._lotes[clave][1].append(item)
+
+    def listos(self, forzar=False):
+        """Extrae los lotes llenos o vencidos como lista de (clave, items)"""
+        ahora = time.time()
+        listos = [clave for clave, (inicio, items) in self._lotes.items()
+                  if forzar or len(items) >= self.max_items or (ahora - inicio) * 1000 >= self.max_ms]
+        return [(clave, self._lotes.pop(clave)[1]) for clave in listos]
+
+    def espera_ms(self, por_defecto):
+        """Milisegundos hasta que venza el lote más antiguo"""
+        if not self._lotes:
+            return por_defecto
+        mas_antiguo = min(inicio for inicio, _ in self._lotes.values())
+        return max(0, int(self.max_ms - (time.time() - mas_antiguo) * 1000))
@@ -10,32 +10,136 @@ import time
 import json
 import sys
 import csv
+import gzip
+import queue
+import atexit
 from datetime import datetime
-from clases import LibroUsuario
+from clases import LibroUsuario, codificar_mensaje
+from Histograma import Histograma
 
 GC_ADDRESS = "tcp://localhost:5555"
 
+ARGUMENTOS = [a for a in sys.argv[1:] if not a.startswith("--")]
+
+# Identidad opcional del cliente (el GC aplica límites por identidad)
+ID_CLIENTE = ARGUMENTOS[1] if len(ARGUMENTOS) > 1 else None
+
+# --streaming: lee el archivo línea a línea y reparte las peticiones entre
+# HILOS_STREAMING hilos por una cola acotada, en vez de leerlo entero y crear
+# un hilo por línea. La memoria no depende del tamaño del archivo y el envío
+# empieza con la primera línea. Los archivos .gz se leen en ambos modos.
+MODO_STREAMING = "--streaming" in sys.argv
+HILOS_STREAMING = 32
+TAMANO_COLA_STREAMING = 1000
+
+# Si es False las peticiones van siempre en JSON; si es True se usa el codec
+# binario de clases.py cuando el GC lo anuncia (ver negociar_codec)
+USAR_CODEC_BINARIO = True
+
 context = zmq.Context()
-socket = context.socket(zmq.REQ)
-socket.connect(GC_ADDRESS)
+
+def crear_socket():
+    sock = context.socket(zmq.REQ)
+    if ID_CLIENTE:
+        sock.setsockopt_string(zmq.IDENTITY, ID_CLIENTE)
+    sock.connect(GC_ADDRESS)
+    return sock
+
+socket = crear_socket()
+codec_gc = "json"
 
 lock = threading.Lock()
 
+# Tiempo máximo que el PS espera una respuesta. Viaja en cada petición como
+# "deadline" para que GC, actores y GA no trabajen en peticiones abandonadas
+TIMEOUT_RESPUESTA = 15  # segundos
+
 # Archivo para guardar tiempos
 ARCHIVO_TIEMPOS = "resultados_tiempos.csv"
+# Histograma de tiempos de respuesta (se puede combinar con el de otros PS:
+# python Histograma.py histograma_tiempos.json otro.json)
+ARCHIVO_HISTOGRAMA = "histograma_tiempos.json"
+# Las filas se acumulan en memoria y un hilo las escribe cada INTERVALO_VOLCADO
+# segundos (o antes si hay TAMANO_LOTE_METRICAS), fuera del camino medido
+INTERVALO_VOLCADO = 1.0  # segundos
+TAMANO_LOTE_METRICAS = 5000
+
+# Modo compacto: las peticiones solo llevan código, fechas y operación; el GA
+# completa título y autor desde su catálogo. Los nombres que muestra el PS
+# salen del archivo de peticiones o, si faltan, del catálogo local.
+MODO_COMPACTO = True
+ARCHIVO_CATALOGO = "BD_SedeA.txt"
+catalogo_local = None
 
 # Contadores y métricas
 metricas = {
     'total_peticiones': 0,
     'peticiones_exitosas': 0,
     'peticiones_fallidas': 0,
-    'tiempos_respuesta': [],
+    'tiempos_respuesta': Histograma(),  # memoria fija aunque haya millones
     'inicio_experimento': None,
     'fin_experimento': None
 }
 
 metricas_lock = threading.Lock()
 
+class EscritorMetricas:
+    """Vuelca al CSV por lotes, desde un hilo propio, las filas que agregan los hilos de envío"""
+
+    def __init__(self, archivo, intervalo=INTERVALO_VOLCADO, tamano_lote=TAMANO_LOTE_METRICAS):
+        self.archivo = archivo
+        self.intervalo = intervalo
+        self.tamano_lote = tamano_lote
+        self._filas = []
+        self._lock = threading.Lock()
+        self._lote_listo = threading.Event()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+        # También se vuelca lo pendiente si el PS termina antes de tiempo
+        atexit.register(self.cerrar)
+
+    def agregar(self, fila):
+        with self._lock:
+            self._filas.append(fila)
+            lleno = len(self._filas) >= self.tamano_lote
+        if lleno:
+            self._lote_listo.set()
+
+    def _volcar(self):
+        with self._lock:
+            filas, self._filas = self._filas, []
+        if not filas:
+            return
+        try:
+            with open(self.archivo, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                # Formatear aquí y no en el hilo que mide
+                writer.writerows([datetime.fromtimestamp(t).isoformat(), operacion, codigo, titulo, sede,
+                                  f"{tiempo_respuesta * 1000:.2f}", exito]
+                                 for t, operacion, codigo, titulo, sede, tiempo_respuesta, exito in filas)
+        except Exception as e:
+            print(f"[PS] Error guardando métricas: {e}")
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            self._lote_listo.wait(self.intervalo)
+            self._lote_listo.clear()
+            self._volcar()
+
+    def cerrar(self):
+        """Detiene el hilo y escribe las filas que falten"""
+        self._parar.set()
+        self._lote_listo.set()
+        if self._hilo is not None and self._hilo is not threading.current_thread():
+            self._hilo.join()
+        self._volcar()
+
+escritor_metricas = EscritorMetricas(ARCHIVO_TIEMPOS)
+
 def inicializar_archivo_csv():
     """Inicializa el archivo CSV con encabezados"""
     try:
@@ -45,27 +149,115 @@ def inicializar_archivo_csv():
         print(f"[PS] Archivo {ARCHIVO_TIEMPOS} inicializado")
     except Exception as e:
         print(f"[PS] Error inicializando CSV: {e}")
+    escritor_metricas.iniciar()
 
 def guardar_metrica(operacion, codigo, titulo, sede, tiempo_respuesta, exito):
-    """Guarda una métrica en el archivo CSV"""
+    """Encola una métrica para el CSV (la escribe EscritorMetricas)"""
+    escritor_metricas.agregar((time.time(), operacion, codigo, titulo, sede, tiempo_respuesta, exito))
+
+def resolver_libro(codigo, titulo, autor):
+    """Completa título y autor vacíos con el catálogo local (cargado en el primer uso)"""
+    global catalogo_local
+    if titulo and autor:
+        return titulo, autor
+    if catalogo_local is None:
+        catalogo_local = {}
+        try:
+            with open(ARCHIVO_CATALOGO, "r", encoding="utf-8") as f:
+                for linea in f:
+                    partes = linea.strip().split("|")
+                    if len(partes) >= 3:
+                        catalogo_local[partes[0]] = (partes[1], partes[2])
+        except FileNotFoundError:
+            print(f"[PS] Catálogo {ARCHIVO_CATALOGO} no encontrado")
+    titulo_cat, autor_cat = catalogo_local.get(codigo, ("", ""))
+    return titulo or titulo_cat, autor or autor_cat
+
+def negociar_codec():
+    """Pregunta al GC qué formatos acepta; un GC anterior no entiende la consulta y se sigue con JSON"""
+    global socket, codec_gc
+    if not USAR_CODEC_BINARIO:
+        return
+    socket.send_string(json.dumps({"operacion": "codecs"}))
+    if not socket.poll(TIMEOUT_RESPUESTA * 1000):
+        # REQ sin respuesta no puede volver a enviar: se recrea
+        socket.close(linger=0)
+        socket = crear_socket()
+        print("[PS] El GC no respondió la negociación, se usará JSON")
+        return
     try:
-        with open(ARCHIVO_TIEMPOS, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            timestamp = datetime.now().isoformat()
-            tiempo_ms = tiempo_respuesta * 1000  # Convertir a milisegundos
-            writer.writerow([timestamp, operacion, codigo, titulo, sede, f"{tiempo_ms:.2f}", exito])
-    except Exception as e:
-        print(f"[PS] Error guardando métrica: {e}")
+        codecs = json.loads(socket.recv_string()).get("codecs", [])
+    except (ValueError, AttributeError):
+        codecs = []
+    if "binario" in codecs:
+        codec_gc = "binario"
+    print(f"[PS] Formato de peticiones: {codec_gc}")
+
+def abrir_peticiones(nombre_archivo):
+    """Abre el archivo de peticiones como texto, descomprimiendo si es gzip"""
+    with open(nombre_archivo, "rb") as f:
+        comprimido = f.read(2) == b"\x1f\x8b"
+    if comprimido:
+        return gzip.open(nombre_archivo, "rt", encoding="utf-8")
+    return open(nombre_archivo, "r", encoding="utf-8")
+
+def leer_peticiones(lineas):
+    """Genera (operacion, isbn, titulo, autor, sede) a medida que se leen las líneas"""
+    for line in lineas:
+        parts = line.strip().split(",")
+        if len(parts) != 5:
+            print(f"[PS] Línea malformada: {line}")
+            continue
+
+        tipo, isbn, titulo, autor, sede = parts
+        if tipo.upper() not in ("DEVOLUCION", "RENOVACION", "PRESTAMO"):
+            print(f"[PS] Tipo desconocido: {tipo}")
+            continue
+
+        titulo, autor = resolver_libro(isbn, titulo, autor)
+        yield tipo.lower(), isbn, titulo, autor, sede
+
+def despachar_streaming(peticiones):
+    """Reparte las peticiones entre HILOS_STREAMING hilos; la cola acotada frena la lectura"""
+    cola = queue.Queue(maxsize=TAMANO_COLA_STREAMING)
+
+    def trabajador():
+        while True:
+            peticion = cola.get()
+            if peticion is None:
+                return
+            enviar_peticion(*peticion)
+
+    hilos = [threading.Thread(target=trabajador, daemon=True) for _ in range(HILOS_STREAMING)]
+    for t in hilos:
+        t.start()
+
+    total = 0
+    for peticion in peticiones:
+        cola.put(peticion)
+        total += 1
+
+    for _ in hilos:
+        cola.put(None)
+    for t in hilos:
+        t.join()
+    return total
 
 def enviar_peticion(operacion, codigo, titulo, autor, sede):
     """Envía una petición y mide el tiempo de respuesta"""
     with lock:
-        libroUsuario = LibroUsuario(codigo, titulo, autor)
+        if MODO_COMPACTO:
+            libroUsuario = LibroUsuario(codigo)
+        else:
+            libroUsuario = LibroUsuario(codigo, titulo, autor)
 
+        ahora = time.time()
         mensaje = {
             "operacion": operacion.lower(),
-            "libro_usuario": libroUsuario.to_dict(),
-            "timestamp": time.time()
+            "libro_usuario": libroUsuario.to_dict(compacto=MODO_COMPACTO),
+            "sede": sede,
+            "timestamp": ahora,
+            "deadline": ahora + TIMEOUT_RESPUESTA
         }
 
         print(f"[PS] Enviando {operacion.upper()} -> {codigo} ({sede})")
@@ -75,9 +267,12 @@ def enviar_peticion(operacion, codigo, titulo, autor, sede):
         exito = False
         
         try:
-            socket.send_string(json.dumps(mensaje))
+            if codec_gc == "binario":
+                socket.send(codificar_mensaje(mensaje))
+            else:
+                socket.send_string(json.dumps(mensaje))
 
-            if socket.poll(15000):  # Timeout 15 segundos
+            if socket.poll(TIMEOUT_RESPUESTA * 1000):
                 respuesta = socket.recv_string()
                 
                 # FIN DE MEDICIÓN
@@ -90,7 +285,7 @@ def enviar_peticion(operacion, codigo, titulo, autor, sede):
                 with metricas_lock:
                     metricas['total_peticiones'] += 1
                     metricas['peticiones_exitosas'] += 1
-                    metricas['tiempos_respuesta'].append(tiempo_respuesta)
+                    metricas['tiempos_respuesta'].registrar(tiempo_respuesta)
                 
                 # Guardar en CSV
                 guardar_metrica(operacion, codigo, titulo, sede, tiempo_respuesta, True)
@@ -131,24 +326,15 @@ def calcular_estadisticas():
         print(f"Peticiones exitosas: {exitosas}")
         print(f"Peticiones fallidas: {fallidas}")
         
-        if tiempos:
-            promedio = sum(tiempos) / len(tiempos)
-            promedio_ms = promedio * 1000
-            
-            # Calcular desviación estándar
-            varianza = sum((t - promedio) ** 2 for t in tiempos) / len(tiempos)
-            desv_std = varianza ** 0.5
-            desv_std_ms = desv_std * 1000
-            
-            # Calcular min y max
-            min_tiempo = min(tiempos) * 1000
-            max_tiempo = max(tiempos) * 1000
-            
+        if tiempos.total:
             print(f"\nTIEMPOS DE RESPUESTA:")
-            print(f"  - Promedio: {promedio_ms:.2f} ms")
-            print(f"  - Desv. Estándar: {desv_std_ms:.2f} ms")
-            print(f"  - Mínimo: {min_tiempo:.2f} ms")
-            print(f"  - Máximo: {max_tiempo:.2f} ms")
+            print(f"  - Promedio: {tiempos.media() * 1000:.2f} ms")
+            print(f"  - Desv. Estándar: {tiempos.desviacion() * 1000:.2f} ms")
+            print(f"  - Mínimo: {tiempos.minimo * 1000:.2f} ms")
+            print(f"  - Máximo: {tiempos.maximo * 1000:.2f} ms")
+            for p in (50, 90, 99, 99.9):
+                print(f"  - p{p:g}: {tiempos.percentil(p) * 1000:.2f} ms")
+            tiempos.guardar(ARCHIVO_HISTOGRAMA)
         
         if metricas['inicio_experimento'] and metricas['fin_experimento']:
             duracion_total = metricas['fin_experimento'] - metricas['inicio_experimento']
@@ -159,63 +345,60 @@ def calcular_estadisticas():
                 print(f"Throughput: {throughput:.2f} peticiones/segundo")
         
         print("=" * 60)
-        print(f"Resultados guardados en: {ARCHIVO_TIEMPOS}")
+        print(f"Resultados guardados en: {ARCHIVO_TIEMPOS} y {ARCHIVO_HISTOGRAMA}")
         print("=" * 60 + "\n")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python PS_Medicion.py archivo.txt")
+    if not ARGUMENTOS:
+        print("Uso: python PS_Medicion.py archivo.txt[.gz] [id_cliente] [--streaming]")
         sys.exit(1)
 
-    nombre_archivo = sys.argv[1]
+    nombre_archivo = ARGUMENTOS[0]
     print(f"[PS] Archivo de peticiones: {nombre_archivo}")
     
     # Inicializar archivo CSV
     inicializar_archivo_csv()
+    negociar_codec()
 
     try:
-        with open(nombre_archivo, "r", encoding="utf-8") as f:
-            lineas = f.readlines()
+        archivo = abrir_peticiones(nombre_archivo)
     except FileNotFoundError:
         print(f"[PS] Archivo {nombre_archivo} no encontrado")
         sys.exit(1)
 
-    print(f"[PS] Total de peticiones a procesar: {len(lineas)}")
-    print("[PS] Iniciando experimento...\n")
-    
-    # Marcar inicio del experimento
-    metricas['inicio_experimento'] = time.time()
-    
-    threads = []
-    for line in lineas:
-        parts = line.strip().split(",")
-        if len(parts) != 5:
-            print(f"[PS] Línea malformada: {line}")
-            continue
-
-        tipo, isbn, titulo, autor, sede = parts
+    if MODO_STREAMING:
+        print(f"[PS] Modo streaming: {HILOS_STREAMING} hilos, cola de {TAMANO_COLA_STREAMING}")
+        print("[PS] Iniciando experimento...\n")
+        metricas['inicio_experimento'] = time.time()
 
-        if tipo.upper() == "DEVOLUCION":
-            t = threading.Thread(target=enviar_peticion, args=("devolucion", isbn, titulo, autor, sede))
-        elif tipo.upper() == "RENOVACION":
-            t = threading.Thread(target=enviar_peticion, args=("renovacion", isbn, titulo, autor, sede))
-        elif tipo.upper() == "PRESTAMO":
-            t = threading.Thread(target=enviar_peticion, args=("prestamo", isbn, titulo, autor, sede))
-        else:
-            print(f"[PS] Tipo desconocido: {tipo}")
-            continue
+        with archivo:
+            total = despachar_streaming(leer_peticiones(archivo))
+        print(f"[PS] Total de peticiones procesadas: {total}")
+    else:
+        with archivo:
+            lineas = archivo.readlines()
 
-        threads.append(t)
-        t.start()
+        print(f"[PS] Total de peticiones a procesar: {len(lineas)}")
+        print("[PS] Iniciando experimento...\n")
+        
+        # Marcar inicio del experimento
+        metricas['inicio_experimento'] = time.time()
+        
+        threads = []
+        for peticion in leer_peticiones(lineas):
+            t = threading.Thread(target=enviar_peticion, args=peticion)
+            threads.append(t)
+            t.start()
 
-    print("[PS] Esperando a que finalicen todas las peticiones...\n")
-    
-    # Esperar a que terminen todos los hilos
-    for t in threads:
-        t.join()
+        print("[PS] Esperando a que finalicen todas las peticiones...\n")
+        
+        # Esperar a que terminen todos los hilos
+        for t in threads:
+            t.join()
 
     # Marcar fin del experimento
     metricas['fin_experimento'] = time.time()
+    escritor_metricas.cerrar()
     
     print("\n[PS] Todas las peticiones procesadas")
     
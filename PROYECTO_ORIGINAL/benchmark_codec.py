@@ -0,0 +1,119 @@
+"""
+benchmark_codec.py
+Compara JSON con el codec binario de clases.py en los mensajes que viajan
+por cada salto: tamaño en bytes y tiempo de codificar/decodificar.
+Los libros se toman de BD_SedeA.txt (títulos y autores reales). La
+petición compacta es la del modo MODO_COMPACTO del PS (sin título ni autor).
+
+Uso: python benchmark_codec.py [repeticiones]
+Resultados en benchmark_codec.csv.
+"""
+
+import csv
+import json
+import sys
+import time
+import timeit
+
+from clases import (LibroBiblioteca, LibroUsuario, Mensaje, Respuesta,
+                    codificar_mensaje, decodificar_mensaje)
+
+ARCHIVO_BD = "BD_SedeA.txt"
+ARCHIVO_RESULTADOS = "benchmark_codec.csv"
+TAMANO_LOTE = 50  # devoluciones por lote (como Lotes.py)
+
+
+def cargar_libros():
+    libros = []
+    with open(ARCHIVO_BD, "r", encoding="utf-8") as f:
+        for linea in f:
+            partes = linea.strip().split("|")
+            if len(partes) == 5:
+                libros.append(LibroBiblioteca(partes[0], partes[1], partes[2], int(partes[3]), partes[4]))
+    return libros
+
+
+def casos(libros):
+    """(nombre, objeto, json->bytes, bytes->objeto, binario->bytes, bytes->objeto)"""
+    libro = libros[0]
+    libro_usuario = LibroUsuario(libro.codigo, libro.titulo, libro.autor)
+    ahora = time.time()
+    peticion = {
+        "operacion": "prestamo",
+        "libro_usuario": libro_usuario.to_dict(),
+        "sede": "SedeA",
+        "timestamp": ahora,
+        "deadline": ahora + 15,
+        "correlation_id": "9f1c2e4b7a0d4c55b1f8e2a3c6d7e8f9"
+    }
+    # Modo compacto del PS: solo código, fechas y operación
+    peticion_compacta = dict(peticion, libro_usuario=LibroUsuario(libro.codigo).to_dict(compacto=True))
+    lote = {
+        "operacion": "devolucion_lote",
+        "libros_usuario": [LibroUsuario(l.codigo, l.titulo, l.autor).to_dict()
+                           for l in (libros * TAMANO_LOTE)[:TAMANO_LOTE]]
+    }
+    mensaje = Mensaje("PRESTAMO", libro, "usuario-42", "SedeA", {"origen": "PS"})
+    respuesta = Respuesta(True, "Préstamo registrado", {"codigo": libro.codigo})
+
+    def por_json(clase):
+        return (lambda o: json.dumps(o.to_dict()).encode("utf-8"),
+                lambda b: clase.from_dict(json.loads(b)))
+
+    def por_bytes(clase):
+        return (lambda o: o.to_bytes(), clase.from_bytes)
+
+    def peticion_json():
+        return (lambda m: json.dumps(m).encode("utf-8"), json.loads)
+
+    def peticion_binaria():
+        return (codificar_mensaje, decodificar_mensaje)
+
+    return [
+        ("LibroUsuario", libro_usuario, *por_json(LibroUsuario), *por_bytes(LibroUsuario)),
+        ("LibroBiblioteca", libro, *por_json(LibroBiblioteca), *por_bytes(LibroBiblioteca)),
+        ("Mensaje", mensaje, *por_json(Mensaje), *por_bytes(Mensaje)),
+        ("Respuesta", respuesta, *por_json(Respuesta), *por_bytes(Respuesta)),
+        ("peticion PS->GC->Actor", peticion, *peticion_json(), *peticion_binaria()),
+        ("peticion compacta", peticion_compacta, *peticion_json(), *peticion_binaria()),
+        (f"lote de {TAMANO_LOTE} Actor->GA", lote, *peticion_json(), *peticion_binaria()),
+    ]
+
+
+def medir_us(funcion, argumento, repeticiones):
+    """Mejor de 3 rondas, en microsegundos por llamada"""
+    tiempos = timeit.repeat(lambda: funcion(argumento), number=repeticiones, repeat=3)
+    return min(tiempos) / repeticiones * 1e6
+
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    libros = cargar_libros()
+
+    resultados = []
+    print(f"{'mensaje':<24} | {'JSON B':>7} | {'bin B':>6} | {'ratio':>5} | "
+          f"{'cod JSON':>8} | {'cod bin':>8} | {'dec JSON':>8} | {'dec bin':>8}  (µs)")
+    for nombre, objeto, cod_json, dec_json, cod_bin, dec_bin in casos(libros):
+        n = max(1, repeticiones // 20) if nombre.startswith("lote") else repeticiones
+        carga_json = cod_json(objeto)
+        carga_bin = cod_bin(objeto)
+        r = {
+            "mensaje": nombre,
+            "bytes_json": len(carga_json),
+            "bytes_binario": len(carga_bin),
+            "ratio": round(len(carga_json) / len(carga_bin), 2),
+            "codificar_json_us": round(medir_us(cod_json, objeto, n), 2),
+            "codificar_binario_us": round(medir_us(cod_bin, objeto, n), 2),
+            "decodificar_json_us": round(medir_us(dec_json, carga_json, n), 2),
+            "decodificar_binario_us": round(medir_us(dec_bin, carga_bin, n), 2),
+        }
+        resultados.append(r)
+        print(f"{nombre:<24} | {r['bytes_json']:>7} | {r['bytes_binario']:>6} | {r['ratio']:>5} | "
+              f"{r['codificar_json_us']:>8} | {r['codificar_binario_us']:>8} | "
+              f"{r['decodificar_json_us']:>8} | {r['decodificar_binario_us']:>8}")
+
+    with open(ARCHIVO_RESULTADOS, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(resultados[0].keys()))
+        writer.writeheader()
+        writer.writerows(resultados)
+    print(f"Resultados guardados en {ARCHIVO_RESULTADOS}")
@@ -2,8 +2,11 @@ import zmq
 import threading
 import json
 import time
+import struct
 from datetime import datetime, timedelta
 class LibroBiblioteca:
+    __slots__ = ('codigo', 'titulo', 'autor', 'ejemplares_disponibles', 'sede')
+
     def __init__(self, codigo, titulo="", autor="", ejemplares_disponibles=0, sede=""):
         self.codigo = codigo
         self.titulo = titulo
@@ -30,22 +33,79 @@ class LibroBiblioteca:
             sede=data.get('sede', '')
         )
 
+    def _escribir(self, partes):
+        _escribir_texto(partes, self.codigo)
+        _escribir_texto(partes, self.titulo)
+        _escribir_texto(partes, self.autor)
+        partes.append(_empaquetar(_ENTERO, self.ejemplares_disponibles))
+        _escribir_texto(partes, self.sede)
+
+    @classmethod
+    def _leer(cls, buf, pos):
+        codigo, pos = _leer_texto(buf, pos)
+        titulo, pos = _leer_texto(buf, pos)
+        autor, pos = _leer_texto(buf, pos)
+        (ejemplares,) = _ENTERO.unpack_from(buf, pos)
+        sede, pos = _leer_texto(buf, pos + _ENTERO.size)
+        return cls(codigo, titulo, autor, ejemplares, sede), pos
+
+    def to_bytes(self):
+        partes = [_CABECERA.pack(MAGIA_CODEC, VERSION_CODEC, TIPO_LIBRO_BIBLIOTECA)]
+        self._escribir(partes)
+        return b"".join(partes)
+
+    @classmethod
+    def from_bytes(cls, buf):
+        return _decodificar(buf, TIPO_LIBRO_BIBLIOTECA, cls._leer)
+
 class LibroUsuario:
+    __slots__ = ('codigo', 'titulo', 'autor', '_fecha_prestamo', '_fecha_devolucion')
+
     def __init__(self, codigo, titulo="", autor="", fecha_prestamo=None, fecha_devolucion=None):
         self.codigo = codigo
         self.titulo = titulo
         self.autor = autor
-        self.fecha_prestamo = fecha_prestamo or datetime.now().isoformat()
-        self.fecha_devolucion = fecha_devolucion or (datetime.now() + timedelta(weeks=2)).isoformat()
+        # Las fechas por defecto se calculan en el primer acceso: from_dict y
+        # el codec casi siempre traen ambas y no hace falta llamar a now()
+        self._fecha_prestamo = fecha_prestamo
+        self._fecha_devolucion = fecha_devolucion
+
+    @property
+    def fecha_prestamo(self):
+        if not self._fecha_prestamo:
+            self._fecha_prestamo = datetime.now().isoformat()
+        return self._fecha_prestamo
+
+    @fecha_prestamo.setter
+    def fecha_prestamo(self, valor):
+        self._fecha_prestamo = valor
+
+    @property
+    def fecha_devolucion(self):
+        if not self._fecha_devolucion:
+            self._fecha_devolucion = (datetime.now() + timedelta(weeks=2)).isoformat()
+        return self._fecha_devolucion
+
+    @fecha_devolucion.setter
+    def fecha_devolucion(self, valor):
+        self._fecha_devolucion = valor
     
-    def to_dict(self):
-        return {
+    def to_dict(self, compacto=False):
+        """compacto=True omite título y autor vacíos: el GA los toma de su catálogo"""
+        data = {
             'codigo': self.codigo,
             'titulo': self.titulo,
             'autor': self.autor,
-            'fecha_prestamo': self.fecha_prestamo,
-            'fecha_devolucion': self.fecha_devolucion
+            # Leer los slots evita la propiedad cuando la fecha ya está puesta
+            'fecha_prestamo': self._fecha_prestamo or self.fecha_prestamo,
+            'fecha_devolucion': self._fecha_devolucion or self.fecha_devolucion
         }
+        if compacto:
+            if not self.titulo:
+                del data['titulo']
+            if not self.autor:
+                del data['autor']
+        return data
     
     @classmethod
     def from_dict(cls, data):
@@ -57,8 +117,29 @@ class LibroUsuario:
             fecha_devolucion=data.get('fecha_devolucion')
         )
 
+    def _escribir(self, partes):
+        _escribir_campos_libro_usuario(partes, self.codigo, self.titulo, self.autor,
+                                       self._fecha_prestamo or self.fecha_prestamo,
+                                       self._fecha_devolucion or self.fecha_devolucion)
+
+    @classmethod
+    def _leer(cls, buf, pos):
+        campos, pos = _leer_campos_libro_usuario(buf, pos)
+        return cls(*campos), pos
+
+    def to_bytes(self):
+        partes = [_CABECERA.pack(MAGIA_CODEC, VERSION_CODEC, TIPO_LIBRO_USUARIO)]
+        self._escribir(partes)
+        return b"".join(partes)
+
+    @classmethod
+    def from_bytes(cls, buf):
+        return _decodificar(buf, TIPO_LIBRO_USUARIO, cls._leer)
+
 
 class Mensaje:
+    __slots__ = ('tipo', 'libro', 'usuario', 'sede', 'timestamp', 'datos_adicionales')
+
     def __init__(self, tipo, libro, usuario, sede, datos_adicionales=None):
         self.tipo = tipo  # "PRESTAMO", "DEVOLUCION", "RENOVACION"
         self.libro = libro
@@ -88,7 +169,35 @@ class Mensaje:
             datos_adicionales=data.get('datos_adicionales', {})
         )
 
+    def to_bytes(self):
+        partes = [_CABECERA.pack(MAGIA_CODEC, VERSION_CODEC, TIPO_MENSAJE)]
+        _escribir_texto(partes, self.tipo)
+        self.libro._escribir(partes)
+        _escribir_texto(partes, self.usuario)
+        _escribir_texto(partes, self.sede)
+        _escribir_texto(partes, self.timestamp)
+        _escribir_json(partes, self.datos_adicionales)
+        return b"".join(partes)
+
+    @classmethod
+    def _leer(cls, buf, pos):
+        tipo, pos = _leer_texto(buf, pos)
+        libro, pos = LibroBiblioteca._leer(buf, pos)
+        usuario, pos = _leer_texto(buf, pos)
+        sede, pos = _leer_texto(buf, pos)
+        timestamp, pos = _leer_texto(buf, pos)
+        datos_adicionales, pos = _leer_json(buf, pos)
+        mensaje = cls(tipo, libro, usuario, sede, datos_adicionales)
+        mensaje.timestamp = timestamp
+        return mensaje, pos
+
+    @classmethod
+    def from_bytes(cls, buf):
+        return _decodificar(buf, TIPO_MENSAJE, cls._leer)
+
 class Respuesta:
+    __slots__ = ('exito', 'mensaje', 'datos', 'timestamp')
+
     def __init__(self, exito, mensaje, datos=None):
         self.exito = exito
         self.mensaje = mensaje
@@ -110,3 +219,360 @@ class Respuesta:
             mensaje=data['mensaje'],
             datos=data.get('datos', {})
         )
+
+    def to_bytes(self):
+        partes = [_CABECERA.pack(MAGIA_CODEC, VERSION_CODEC, TIPO_RESPUESTA),
+                  b"\x01" if self.exito else b"\x00"]
+        _escribir_texto(partes, self.mensaje)
+        _escribir_json(partes, self.datos)
+        _escribir_texto(partes, self.timestamp)
+        return b"".join(partes)
+
+    @classmethod
+    def _leer(cls, buf, pos):
+        exito = buf[pos] == 1
+        mensaje, pos = _leer_texto(buf, pos + 1)
+        datos, pos = _leer_json(buf, pos)
+        timestamp, pos = _leer_texto(buf, pos)
+        respuesta = cls(exito, mensaje, datos)
+        respuesta.timestamp = timestamp
+        return respuesta, pos
+
+    @classmethod
+    def from_bytes(cls, buf):
+        return _decodificar(buf, TIPO_RESPUESTA, cls._leer)
+
+
+# ---------------------------------------------------------------------------
+# Codec binario de mensajes
+# ---------------------------------------------------------------------------
+# Formato versionado para las peticiones que viajan PS -> GC -> Actor -> GA.
+# Cada carga empieza con MAGIA_CODEC, VERSION_CODEC y el tipo; un receptor que
+# no ve la magia la trata como JSON, así conviven emisores de ambos formatos.
+# Textos: longitud <H + UTF-8. Fechas ISO sin zona: 11 bytes empaquetados
+# (las demás viajan como texto). La operación viaja como entero (OPERACIONES).
+
+MAGIA_CODEC = 0xB1
+VERSION_CODEC = 1
+CODECS_SOPORTADOS = ["json", "binario"]
+
+TIPO_LIBRO_BIBLIOTECA = 1
+TIPO_LIBRO_USUARIO = 2
+TIPO_MENSAJE = 3
+TIPO_RESPUESTA = 4
+TIPO_PETICION = 5
+
+# El índice es el código en el cable; añadir siempre al final
+OPERACIONES = ["prestamo", "devolucion", "renovacion", "verificar_disponibilidad",
+               "devolucion_lote", "renovacion_lote", "codecs"]
+_CODIGO_OPERACION = {op: i for i, op in enumerate(OPERACIONES)}
+_OPERACION_TEXTO = 0xFF  # operación fuera de la tabla: viaja como texto
+_SIN_OPERACION = 0xFE
+
+_CABECERA = struct.Struct("<BBB")
+_LONGITUD = struct.Struct("<H")
+_LONGITUD_LARGA = struct.Struct("<I")
+_FECHA = struct.Struct("<HBBBBBI")
+_REAL = struct.Struct("<d")
+_ENTERO = struct.Struct("<i")
+_PRESENCIA = struct.Struct("<BH")
+_MAX_TEXTO = 0xFFFF  # bytes UTF-8 de un texto con longitud _LONGITUD
+
+# Campos opcionales de una petición, en el orden en que viajan
+_CAMPOS_PETICION = ("sede", "correlation_id", "timestamp", "deadline", "libro_usuario", "libros_usuario")
+_CLAVES_PETICION = {"operacion", *_CAMPOS_PETICION}
+_BIT_EXTRAS = 1 << len(_CAMPOS_PETICION)  # resto de claves, como JSON
+_CAMPOS_LIBRO_USUARIO = ("codigo", "titulo", "autor", "fecha_prestamo", "fecha_devolucion")
+
+
+class ErrorCodec(ValueError):
+    """Carga binaria corrupta, truncada o de una versión desconocida"""
+
+
+def es_binario(cuerpo):
+    """True si la carga está en el formato binario (si no, es JSON)"""
+    return isinstance(cuerpo, (bytes, bytearray, memoryview)) and len(cuerpo) > 0 and cuerpo[0] == MAGIA_CODEC
+
+
+def _empaquetar(estructura, *valores):
+    """struct.pack que falla con ErrorCodec (tipo o rango inválido)"""
+    try:
+        return estructura.pack(*valores)
+    except (struct.error, OverflowError) as e:
+        raise ErrorCodec(f"Valor no codificable: {e}") from e
+
+
+def _texto_codificable(valor):
+    """True si el valor cabe como texto con _LONGITUD (los ASCII cortos sin codificar)"""
+    if not isinstance(valor, str):
+        return False
+    if valor.isascii():
+        return len(valor) <= _MAX_TEXTO
+    try:
+        return len(valor.encode("utf-8")) <= _MAX_TEXTO
+    except UnicodeEncodeError:
+        return False  # surrogates sueltos: solo los acepta el JSON de extras
+
+
+def _escribir_texto(partes, texto):
+    if not isinstance(texto, str):
+        raise ErrorCodec(f"Se esperaba texto y llegó {type(texto).__name__}")
+    try:
+        datos = texto.encode("utf-8")
+    except UnicodeEncodeError as e:
+        raise ErrorCodec(f"Texto no representable en UTF-8: {e}") from e
+    if len(datos) > _MAX_TEXTO:
+        raise ErrorCodec(f"Texto de {len(datos)} bytes, el máximo es {_MAX_TEXTO}")
+    partes.append(_LONGITUD.pack(len(datos)))
+    partes.append(datos)
+
+
+def _leer_texto(buf, pos):
+    (n,) = _LONGITUD.unpack_from(buf, pos)
+    pos += 2
+    return buf[pos:pos + n].decode("utf-8"), pos + n
+
+
+def _escribir_json(partes, valor):
+    try:
+        datos = json.dumps(valor).encode("utf-8")
+    except (TypeError, ValueError) as e:
+        raise ErrorCodec(f"Valor no serializable a JSON: {e}") from e
+    partes.append(_LONGITUD_LARGA.pack(len(datos)))
+    partes.append(datos)
+
+
+def _leer_json(buf, pos):
+    (n,) = _LONGITUD_LARGA.unpack_from(buf, pos)
+    pos += 4
+    return json.loads(buf[pos:pos + n]), pos + n
+
+
+def _escribir_fecha(partes, fecha):
+    """0 = sin fecha, 1 = empaquetada, 2 = texto (con zona u otro formato)"""
+    if fecha is None:
+        partes.append(b"\x00")
+        return
+    if not isinstance(fecha, str):
+        raise ErrorCodec(f"Fecha de tipo {type(fecha).__name__}, se esperaba texto ISO")
+    try:
+        d = datetime.fromisoformat(fecha)
+        empaquetable = d.tzinfo is None and d.isoformat() == fecha
+    except ValueError:
+        empaquetable = False
+    if empaquetable:
+        partes.append(b"\x01")
+        partes.append(_FECHA.pack(d.year, d.month, d.day, d.hour, d.minute, d.second, d.microsecond))
+    else:
+        partes.append(b"\x02")
+        _escribir_texto(partes, fecha)
+
+
+def _leer_fecha(buf, pos):
+    marca = buf[pos]
+    pos += 1
+    if marca == 0:
+        return None, pos
+    if marca == 1:
+        valores = _FECHA.unpack_from(buf, pos)
+        return datetime(*valores).isoformat(), pos + _FECHA.size
+    return _leer_texto(buf, pos)
+
+
+def _escribir_real(partes, valor):
+    partes.append(_empaquetar(_REAL, valor))
+
+
+def _leer_real(buf, pos):
+    return _REAL.unpack_from(buf, pos)[0], pos + _REAL.size
+
+
+def _comprobar_cabecera(buf, tipo):
+    if len(buf) < _CABECERA.size:
+        raise ErrorCodec("Carga binaria truncada")
+    magia, version, tipo_recibido = _CABECERA.unpack_from(buf, 0)
+    if magia != MAGIA_CODEC:
+        raise ErrorCodec("La carga no está en formato binario")
+    if version != VERSION_CODEC:
+        raise ErrorCodec(f"Versión de codec no soportada: {version}")
+    if tipo_recibido != tipo:
+        raise ErrorCodec(f"Tipo de mensaje inesperado: {tipo_recibido}")
+    return _CABECERA.size
+
+
+def _decodificar(buf, tipo, leer):
+    """Comprueba la cabecera y traduce los errores de lectura a ErrorCodec"""
+    if not isinstance(buf, bytes):
+        buf = bytes(buf)
+    pos = _comprobar_cabecera(buf, tipo)
+    try:
+        valor, pos = leer(buf, pos)
+    except (struct.error, IndexError, ValueError, OverflowError) as e:
+        raise ErrorCodec(f"Carga binaria corrupta: {e}") from e
+    if pos != len(buf):
+        raise ErrorCodec("Bytes sobrantes tras el mensaje")
+    return valor
+
+
+def _escribir_campos_libro_usuario(partes, codigo, titulo, autor, fecha_prestamo, fecha_devolucion):
+    _escribir_texto(partes, codigo)
+    _escribir_texto(partes, titulo)
+    _escribir_texto(partes, autor)
+    _escribir_fecha(partes, fecha_prestamo)
+    _escribir_fecha(partes, fecha_devolucion)
+
+
+def _leer_campos_libro_usuario(buf, pos):
+    codigo, pos = _leer_texto(buf, pos)
+    titulo, pos = _leer_texto(buf, pos)
+    autor, pos = _leer_texto(buf, pos)
+    fecha_prestamo, pos = _leer_fecha(buf, pos)
+    fecha_devolucion, pos = _leer_fecha(buf, pos)
+    return (codigo, titulo, autor, fecha_prestamo, fecha_devolucion), pos
+
+
+def _libro_usuario_codificable(valor):
+    """LibroUsuario o dict de LibroUsuario.to_dict(): los que tienen layout propio"""
+    if isinstance(valor, LibroUsuario):
+        return True
+    if not isinstance(valor, dict) or not isinstance(valor.get("codigo"), str):
+        return False
+    for clave, campo in valor.items():
+        if clave not in _CAMPOS_LIBRO_USUARIO:
+            return False
+        if not (_texto_codificable(campo) or campo is None and clave.startswith("fecha_")):
+            return False
+    return True
+
+
+def _escribir_libro_usuario(partes, d):
+    if isinstance(d, LibroUsuario):
+        d._escribir(partes)
+        return
+    _escribir_campos_libro_usuario(partes, d["codigo"], d.get("titulo", ""), d.get("autor", ""),
+                                   d.get("fecha_prestamo"), d.get("fecha_devolucion"))
+
+
+def _leer_libro_usuario(buf, pos):
+    campos, pos = _leer_campos_libro_usuario(buf, pos)
+    return dict(zip(_CAMPOS_LIBRO_USUARIO, campos)), pos
+
+
+def _es_numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def codificar_mensaje(mensaje):
+    """
+    Petición (dict) -> bytes en formato binario. Los campos conocidos viajan
+    con layout fijo; el resto de claves (o valores de otro tipo, o textos de
+    más de _MAX_TEXTO bytes) como JSON. libro_usuario/libros_usuario pueden
+    ser LibroUsuario: se escriben sin pasar por to_dict(), y si un texto suyo
+    no cabe se lanza ErrorCodec.
+    """
+    partes = [_CABECERA.pack(MAGIA_CODEC, VERSION_CODEC, TIPO_PETICION), None]
+    extras = {k: v for k, v in mensaje.items() if k not in _CLAVES_PETICION}
+
+    operacion = mensaje.get("operacion")
+    if operacion in _CODIGO_OPERACION:
+        codigo = _CODIGO_OPERACION[operacion]
+    elif _texto_codificable(operacion):
+        codigo = _OPERACION_TEXTO
+        _escribir_texto(partes, operacion)
+    else:
+        codigo = _SIN_OPERACION
+        if "operacion" in mensaje:
+            extras["operacion"] = operacion
+
+    presentes = 0
+    for bit, campo in enumerate(_CAMPOS_PETICION):
+        if campo not in mensaje:
+            continue
+        valor = mensaje[campo]
+        if campo in ("sede", "correlation_id") and _texto_codificable(valor):
+            _escribir_texto(partes, valor)
+        elif campo in ("timestamp", "deadline") and _es_numero(valor):
+            _escribir_real(partes, valor)
+        elif campo == "libro_usuario" and _libro_usuario_codificable(valor):
+            _escribir_libro_usuario(partes, valor)
+        elif campo == "libros_usuario" and isinstance(valor, list) and len(valor) <= 0xFFFF \
+                and all(_libro_usuario_codificable(d) for d in valor):
+            partes.append(_LONGITUD.pack(len(valor)))
+            for d in valor:
+                _escribir_libro_usuario(partes, d)
+        else:
+            extras[campo] = valor
+            continue
+        presentes |= 1 << bit
+
+    if extras:
+        presentes |= _BIT_EXTRAS
+        _escribir_json(partes, extras)
+
+    partes[1] = _PRESENCIA.pack(codigo, presentes)
+    return b"".join(partes)
+
+
+def _leer_peticion(buf, pos, leer_libro=_leer_libro_usuario):
+    codigo, presentes = _PRESENCIA.unpack_from(buf, pos)
+    pos += _PRESENCIA.size
+    mensaje = {}
+    if codigo == _OPERACION_TEXTO:
+        mensaje["operacion"], pos = _leer_texto(buf, pos)
+    elif codigo != _SIN_OPERACION:
+        mensaje["operacion"] = OPERACIONES[codigo]
+
+    for bit, campo in enumerate(_CAMPOS_PETICION):
+        if not presentes & (1 << bit):
+            continue
+        if campo in ("sede", "correlation_id"):
+            mensaje[campo], pos = _leer_texto(buf, pos)
+        elif campo in ("timestamp", "deadline"):
+            mensaje[campo], pos = _leer_real(buf, pos)
+        elif campo == "libro_usuario":
+            mensaje[campo], pos = leer_libro(buf, pos)
+        else:
+            (n,) = _LONGITUD.unpack_from(buf, pos)
+            pos += _LONGITUD.size
+            lote = []
+            for _ in range(n):
+                libro, pos = leer_libro(buf, pos)
+                lote.append(libro)
+            mensaje[campo] = lote
+
+    if presentes & _BIT_EXTRAS:
+        extras, pos = _leer_json(buf, pos)
+        mensaje.update(extras)
+    return mensaje, pos
+
+
+def _leer_peticion_objetos(buf, pos):
+    return _leer_peticion(buf, pos, LibroUsuario._leer)
+
+
+def decodificar_mensaje(cuerpo, objetos=False):
+    """
+    Petición en binario o JSON (bytes o str) -> dict; ErrorCodec si el binario
+    es inválido. Con objetos=True libro_usuario/libros_usuario llegan como
+    LibroUsuario, leídos del binario sin dict intermedio.
+    """
+    if es_binario(cuerpo):
+        return _decodificar(cuerpo, TIPO_PETICION, _leer_peticion_objetos if objetos else _leer_peticion)
+    mensaje = json.loads(cuerpo)
+    if objetos:
+        if isinstance(mensaje.get("libro_usuario"), dict):
+            mensaje["libro_usuario"] = LibroUsuario.from_dict(mensaje["libro_usuario"])
+        if isinstance(mensaje.get("libros_usuario"), list):
+            mensaje["libros_usuario"] = [LibroUsuario.from_dict(d) for d in mensaje["libros_usuario"]]
+    return mensaje
+
+
+def mensaje_json(mensaje):
+    """Petición -> texto JSON; acepta objetos de dominio en los valores (vía to_dict)"""
+    return json.dumps(mensaje, default=_a_dict)
+
+
+def _a_dict(objeto):
+    if hasattr(objeto, "to_dict"):
+        return objeto.to_dict()
+    raise TypeError(f"{type(objeto).__name__} no es serializable a JSON")